@@ -1,5 +1,9 @@
 const loadOperationIdBtn = document.getElementById("load-operation-id");
 const operationIdEl = document.getElementById("operation-id");
+const streamStatusEl = document.getElementById("stream-status");
+
+// Operations as last reported by the server, in the executive's order.
+let operations = [];
 
 loadOperationIdBtn.addEventListener("click", async () => {
 operationIdEl.textContent = await fetchLatestOperationId();
@@ -7,7 +11,7 @@ operationIdEl.textContent = await fetchLatestOperationId();
 
 async function fetchLatestOperationId() {
     try {
-        const res = await fetch("api/executive/operations");
+        const res = await fetch("api/executive/operations?page_size=1&fields=name");
         const s = await res.json();
         if(Array.isArray(s.operations) && s.operations.length > 0) {
         return s.operations[0].name;
@@ -19,3 +23,49 @@ async function fetchLatestOperationId() {
         return "(error, see console for details)";
     }
 }
+
+function showLatestOperation() {
+    operationIdEl.textContent =
+        operations.length > 0 ? operations[0].name : "No operation ID found";
+}
+
+// The server polls the executive once for all clients and pushes a snapshot
+// on connect, then diffs when operations change. EventSource reconnects on
+// its own, and every reconnect starts with a fresh snapshot.
+function streamOperations() {
+    const source = new EventSource("api/executive/operations/stream");
+
+    source.addEventListener("open", () => {
+        streamStatusEl.textContent = "live";
+    });
+
+    source.addEventListener("error", () => {
+        streamStatusEl.textContent = "reconnecting";
+    });
+
+    source.addEventListener("snapshot", (event) => {
+        operations = JSON.parse(event.data);
+        showLatestOperation();
+    });
+
+    source.addEventListener("diff", (event) => {
+        const diff = JSON.parse(event.data);
+        // Rebuilt in the server's order, so that new operations land where
+        // the executive lists them.
+        const byName = new Map(operations.map((op) => [op.name, op]));
+        for (const name of diff.removed) {
+            byName.delete(name);
+        }
+        for (const op of diff.upserted) {
+            byName.set(op.name, op);
+        }
+        operations = diff.order.map((name) => byName.get(name)).filter(Boolean);
+        showLatestOperation();
+    });
+}
+
+if (window.EventSource) {
+    streamOperations();
+} else {
+    streamStatusEl.textContent = "unavailable, use the button";
+}
@@ -1,11 +1,26 @@
 """This script works as the binary for the HMI server."""
 #!/usr/bin/env python3
 
+import argparse
+import collections
+import concurrent.futures
+from concurrent.futures import Future, ThreadPoolExecutor
+import gzip
+import hashlib
+import json
 import logging
+import mimetypes
+import queue
 import sys
+import threading
+import time
+import urllib.parse
 from intrinsic.resources.proto import runtime_context_pb2
 from intrinsic.executive.proto import executive_service_pb2_grpc
 from google.longrunning.operations_pb2 import ListOperationsRequest  # type: ignore
+from google.longrunning.operations_pb2 import ListOperationsResponse  # type: ignore
+from google.longrunning.operations_pb2 import Operation  # type: ignore
+from google.protobuf import field_mask_pb2
 from google.protobuf import json_format
 import grpc
 from http.server import HTTPServer, SimpleHTTPRequestHandler
@@ -15,14 +30,466 @@ logger = logging.getLogger(__name__)
 
 GRPC_INGRESS_ADDRESS = "istio-ingressgateway.app-ingress.svc.cluster.local:80"
 
+FRONTEND_DIRECTORY = pathlib.Path(__file__).parent.resolve() / "frontend"
+# index.html is revalidated on every load, so that a new version takes effect
+# right away; the files it references may be reused for a few minutes.
+HTML_CACHE_CONTROL = "no-cache"
+ASSET_CACHE_CONTROL = "public, max-age=300"
+# How often the debug mode checks the frontend files for changes.
+ASSET_POLL_SECONDS = 0.5
+
+# Requests handled at the same time. Further connections wait for a thread.
+MAX_WORKERS = 16
+# Executive calls in flight at the same time, so that slow executive calls
+# cannot take every worker and stall static files.
+MAX_BACKEND_CALLS = 4
+# How long a request waits for an executive call slot before it gets a 503.
+BACKEND_WAIT_SECONDS = 10.0
+# How long to wait for the executive when (re)connecting.
+CONNECT_TIMEOUT_SECONDS = 10.0
+# Deadline of an executive call.
+RPC_TIMEOUT_SECONDS = 10.0
+# How long an executive response is served from the cache. Many screens
+# polling the same endpoint then cause one executive call per interval.
+RESPONSE_TTL_SECONDS = 1.0
+# Responses cached at the same time. Every distinct query is cached on its
+# own, so without a bound clients could grow the cache at will.
+MAX_CACHED_RESPONSES = 256
+# Clients of the operations stream at the same time. Each holds a thread of
+# its own on top of MAX_WORKERS.
+MAX_STREAM_CLIENTS = 32
+# How long a browser turned away because of MAX_STREAM_CLIENTS waits before
+# it tries to connect to the stream again.
+STREAM_RETRY_MILLISECONDS = 10000
+# How often the operations stream polls the executive.
+STREAM_POLL_SECONDS = 1.0
+# How often an idle operations stream sends a comment, so that clients that
+# went away are noticed.
+STREAM_KEEPALIVE_SECONDS = 15.0
+# Events a stream client may fall behind before it is disconnected. The
+# browser then reconnects and starts over from a snapshot.
+MAX_QUEUED_STREAM_EVENTS = 64
+# Operations per page of /api/executive/operations, unless the client asks
+# for another page size, and the largest page size a client may ask for.
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Operation fields returned unless the client asks for others with `fields`.
+# The metadata can be large and is left out.
+DEFAULT_OPERATION_FIELDS = ("name", "done", "error", "response")
+# Operation fields of the operations stream. The metadata is included, since
+# that is where a running operation reports its progress.
+STREAM_OPERATION_FIELDS = ("name", "metadata", "done", "error", "response")
+
 def get_runtime_context():
     with open('/etc/intrinsic/runtime_config.pb', 'rb') as fin:
         return runtime_context_pb2.RuntimeContext.FromString(fin.read())
 
 def create_executive_stub(connect_timeout: float):
+  """Returns an executive stub and the channel it uses."""
   channel = grpc.insecure_channel(GRPC_INGRESS_ADDRESS)
-  grpc.channel_ready_future(channel).result(timeout=connect_timeout)
-  return executive_service_pb2_grpc.ExecutiveServiceStub(channel)
+  ready = grpc.channel_ready_future(channel)
+  try:
+    ready.result(timeout=connect_timeout)
+  except grpc.FutureTimeoutError:
+    ready.cancel()
+    channel.close()
+    raise
+  return executive_service_pb2_grpc.ExecutiveServiceStub(channel), channel
+
+class ExecutiveBusyError(Exception):
+  """Raised when no executive call slot frees up in time."""
+
+
+class ExecutiveClient:
+  """Long-lived executive connection with a short-lived response cache.
+
+  The stub is created on first use and kept. It is recreated when a call
+  fails with UNAVAILABLE, in addition to gRPC's own reconnects, so that a
+  channel that is stuck on a stale connection is replaced. The replaced
+  channel is closed. `stub_factory` returns a stub and its channel.
+
+  Responses are cached as JSON for `ttl_seconds`, keyed by the request. At
+  most `max_responses` are kept; beyond that the oldest are dropped.
+  Concurrent requests for the same key share one executive call. At most
+  `max_calls` executive calls run at once; a call that cannot start within
+  `wait_seconds` raises ExecutiveBusyError. Every call has a deadline of
+  `rpc_timeout_seconds`. Requests that share a call wait for it at most
+  `wait_seconds` too, and then raise ExecutiveBusyError.
+  """
+
+  def __init__(
+      self,
+      stub_factory=create_executive_stub,
+      max_calls=MAX_BACKEND_CALLS,
+      wait_seconds=BACKEND_WAIT_SECONDS,
+      ttl_seconds=RESPONSE_TTL_SECONDS,
+      max_responses=MAX_CACHED_RESPONSES,
+      connect_timeout_seconds=CONNECT_TIMEOUT_SECONDS,
+      rpc_timeout_seconds=RPC_TIMEOUT_SECONDS,
+      clock=time.monotonic,
+  ):
+    self._stub_factory = stub_factory
+    self._stub = None
+    self._channel = None
+    self._stub_lock = threading.Lock()
+    self._call_slots = threading.BoundedSemaphore(max_calls)
+    self._wait_seconds = wait_seconds
+    self._ttl_seconds = ttl_seconds
+    self._max_responses = max_responses
+    self._connect_timeout_seconds = connect_timeout_seconds
+    self._rpc_timeout_seconds = rpc_timeout_seconds
+    self._clock = clock
+    self._lock = threading.Lock()
+    # Key -> (time fetched, JSON), oldest first.
+    self._responses = collections.OrderedDict()
+    # Key -> Future of the call in flight.
+    self._in_flight = {}
+
+  def list_operations_json(
+      self,
+      request: ListOperationsRequest,
+      fields=DEFAULT_OPERATION_FIELDS,
+  ) -> str:
+    """Returns the operations matching `request` as JSON.
+
+    Only the operation `fields` and the next page token are included.
+    """
+    fields = tuple(sorted(fields))
+    return self._get(
+        ("ListOperations", request.SerializeToString(deterministic=True), fields),
+        lambda: self._list_operations(request, fields),
+    )
+
+  def _list_operations(self, request, fields):
+    response_proto = self._call(
+        lambda stub: stub.ListOperations(
+            request=request, timeout=self._rpc_timeout_seconds
+        )
+    )
+    mask = field_mask_pb2.FieldMask(paths=fields)
+    projected = ListOperationsResponse(
+        next_page_token=response_proto.next_page_token
+    )
+    for operation in response_proto.operations:
+      mask.MergeMessage(operation, projected.operations.add())
+    logging.info('Listed %d operations', len(projected.operations))
+    return json_format.MessageToJson(projected)
+
+  def _get(self, key, fetch):
+    with self._lock:
+      self._evict_expired()
+      cached = self._responses.get(key)
+      if cached is not None:
+        return cached[1]
+      flight = self._in_flight.get(key)
+      leader = flight is None
+      if leader:
+        flight = self._in_flight[key] = Future()
+    if not leader:
+      try:
+        return flight.result(timeout=self._wait_seconds)
+      except concurrent.futures.TimeoutError:
+        raise ExecutiveBusyError(
+            "Timed out waiting for an executive call in flight"
+        ) from None
+
+    try:
+      value = fetch()
+    except BaseException as e:
+      with self._lock:
+        del self._in_flight[key]
+      flight.set_exception(e)
+      raise
+    with self._lock:
+      # Re-added at the end, so that the oldest entry stays first.
+      self._responses.pop(key, None)
+      self._responses[key] = (self._clock(), value)
+      while len(self._responses) > self._max_responses:
+        self._responses.popitem(last=False)
+      del self._in_flight[key]
+    flight.set_result(value)
+    return value
+
+  def _evict_expired(self):
+    """Drops the cached responses older than the TTL. Needs `_lock`."""
+    now = self._clock()
+    while self._responses:
+      fetched, _ = next(iter(self._responses.values()))
+      if now - fetched < self._ttl_seconds:
+        break
+      self._responses.popitem(last=False)
+
+  def _call(self, rpc):
+    if not self._call_slots.acquire(timeout=self._wait_seconds):
+      raise ExecutiveBusyError("Too many executive requests in flight")
+    try:
+      stub = self._get_stub()
+      try:
+        return rpc(stub)
+      except grpc.RpcError as e:
+        if e.code() == grpc.StatusCode.UNAVAILABLE:
+          logging.warning("Executive unavailable, reconnecting on next call")
+          channel = None
+          with self._stub_lock:
+            if self._stub is stub:
+              channel = self._channel
+              self._stub = self._channel = None
+          if channel is not None:
+            channel.close()
+        raise
+    finally:
+      self._call_slots.release()
+
+  def _get_stub(self):
+    with self._stub_lock:
+      if self._stub is not None:
+        return self._stub
+    # Connecting may take the whole connect timeout; calls that find a stub
+    # must not wait for it.
+    stub, channel = self._stub_factory(self._connect_timeout_seconds)
+    with self._stub_lock:
+      if self._stub is None:
+        self._stub, self._channel = stub, channel
+        return stub
+      current = self._stub
+    # Another call connected meanwhile.
+    channel.close()
+    return current
+
+
+class _StreamClient:
+
+  def __init__(self):
+    self.events = queue.Queue(maxsize=MAX_QUEUED_STREAM_EVENTS)
+    self.dropped = False
+
+  def send(self, event):
+    """Queues `event`, or drops the client if it is too far behind."""
+    try:
+      self.events.put_nowait(event)
+    except queue.Full:
+      self.dropped = True
+
+
+class OperationsBroadcaster:
+  """Polls the executive once for all stream clients and fans out changes.
+
+  A client first gets a "snapshot" event with all operations, with the
+  STREAM_OPERATION_FIELDS of each. After that it gets a "diff" event with the
+  operations that were added or changed, the names of those that were removed
+  and the names of all operations in the executive's order, sent only when
+  something, or the order, changed. Every poll reads all pages of the
+  operations. The poll loop runs while at least one client is connected.
+  """
+
+  def __init__(
+      self,
+      executive,
+      max_clients=MAX_STREAM_CLIENTS,
+      interval_seconds=STREAM_POLL_SECONDS,
+  ):
+    self._executive = executive
+    self._max_clients = max_clients
+    self._interval_seconds = interval_seconds
+    self._lock = threading.Lock()
+    self._clients = set()
+    # Operation name -> operation as a JSON object, as of the last poll.
+    self._operations = None
+    self._thread = None
+    self._closed = threading.Event()
+
+  def subscribe(self):
+    """Returns a new client, or None if there are too many already."""
+    with self._lock:
+      if self._closed.is_set() or len(self._clients) >= self._max_clients:
+        return None
+      client = _StreamClient()
+      if self._operations is not None:
+        client.send(("snapshot", list(self._operations.values())))
+      self._clients.add(client)
+      if self._thread is None:
+        self._thread = threading.Thread(
+            target=self._run, name="operations-stream", daemon=True
+        )
+        self._thread.start()
+      return client
+
+  def unsubscribe(self, client):
+    with self._lock:
+      self._clients.discard(client)
+
+  def close(self):
+    """Stops polling and ends every stream."""
+    self._closed.set()
+    with self._lock:
+      clients = list(self._clients)
+      self._clients.clear()
+    for client in clients:
+      client.send(None)
+
+  def _run(self):
+    try:
+      while not self._closed.is_set():
+        with self._lock:
+          if not self._clients:
+            self._thread = None
+            self._operations = None
+            return
+        try:
+          self._publish(self._list_all_operations())
+        except Exception:  # pylint: disable=broad-except
+          # Keep polling; a bad response must not end every stream.
+          logging.exception("Failed to poll operations for the stream")
+        self._closed.wait(self._interval_seconds)
+    finally:
+      # If the thread dies anyway, the next subscriber starts a new one.
+      with self._lock:
+        if self._thread is threading.current_thread():
+          self._thread = None
+
+  def _list_all_operations(self):
+    operations = []
+    page_token = ""
+    while True:
+      response = json.loads(
+          self._executive.list_operations_json(
+              ListOperationsRequest(
+                  page_size=MAX_PAGE_SIZE, page_token=page_token
+              ),
+              STREAM_OPERATION_FIELDS,
+          )
+      )
+      operations.extend(response.get("operations", []))
+      page_token = response.get("nextPageToken", "")
+      if not page_token:
+        return operations
+
+  def _publish(self, operations):
+    current = {operation["name"]: operation for operation in operations}
+    with self._lock:
+      previous = self._operations
+      self._operations = current
+      if previous is None:
+        event = ("snapshot", operations)
+      else:
+        upserted = [
+            operation for name, operation in current.items()
+            if previous.get(name) != operation
+        ]
+        removed = [name for name in previous if name not in current]
+        if not upserted and not removed and list(previous) == list(current):
+          return
+        event = (
+            "diff",
+            {"upserted": upserted, "removed": removed, "order": list(current)},
+        )
+      for client in list(self._clients):
+        client.send(event)
+        if client.dropped:
+          self._clients.discard(client)
+
+
+class Asset:
+  """A frontend file held in memory, with its compressed variant.
+
+  Only gzip is offered. Every browser supports it, and it needs nothing
+  beyond the standard library in the image.
+  """
+
+  def __init__(self, body, content_type):
+    self.content_type = content_type
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    # Content encoding -> (strong ETag, body). Each variant has its own ETag,
+    # as a strong ETag promises byte-identical bodies.
+    self.variants = {"identity": (f'"{digest}"', body)}
+    compressed = gzip.compress(body, compresslevel=9, mtime=0)
+    if len(compressed) < len(body):
+      self.variants["gzip"] = (f'"{digest}-gzip"', compressed)
+
+  def etags(self):
+    return {etag for etag, _ in self.variants.values()}
+
+  def select(self, accept_encoding):
+    """Returns (encoding, ETag, body) of the best variant the client accepts."""
+    if "gzip" in _accepted_encodings(accept_encoding) and "gzip" in self.variants:
+      return ("gzip", *self.variants["gzip"])
+    return ("identity", *self.variants["identity"])
+
+
+def _accepted_encodings(accept_encoding):
+  accepted = set()
+  for item in (accept_encoding or "").split(","):
+    name, _, params = item.strip().partition(";")
+    params = params.replace(" ", "")
+    if name and params not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+      accepted.add(name.lower())
+  return accepted
+
+
+class StaticAssets:
+  """The frontend files, read and compressed once and served from memory."""
+
+  def __init__(self, directory=FRONTEND_DIRECTORY):
+    self.directory = pathlib.Path(directory)
+    self._assets = {}
+    self.reload()
+
+  def reload(self):
+    assets = {}
+    for path in sorted(self.directory.rglob("*")):
+      if not path.is_file():
+        continue
+      content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+      url_path = "/" + path.relative_to(self.directory).as_posix()
+      assets[url_path] = Asset(path.read_bytes(), content_type)
+    if "/index.html" in assets:
+      assets["/"] = assets["/index.html"]
+    # Swapped as a whole, so that requests never see a partial reload.
+    self._assets = assets
+    logging.info("Loaded %d frontend files from %s", len(assets), self.directory)
+
+  def get(self, url_path):
+    return self._assets.get(url_path)
+
+  def modification_times(self):
+    return {
+        path: path.stat().st_mtime_ns
+        for path in self.directory.rglob("*")
+        if path.is_file()
+    }
+
+
+class AssetWatcher:
+  """Reloads `assets` when a frontend file changes. Meant for debugging."""
+
+  def __init__(self, assets, interval_seconds=ASSET_POLL_SECONDS):
+    self._assets = assets
+    self._interval_seconds = interval_seconds
+    self._mtimes = assets.modification_times()
+    self._stopped = threading.Event()
+
+  def poll(self):
+    """Reloads the assets if files changed since the last poll."""
+    mtimes = self._assets.modification_times()
+    if mtimes == self._mtimes:
+      return False
+    self._mtimes = mtimes
+    self._assets.reload()
+    return True
+
+  def start(self):
+    threading.Thread(target=self._run, name="asset-watcher", daemon=True).start()
+
+  def stop(self):
+    self._stopped.set()
+
+  def _run(self):
+    while not self._stopped.wait(self._interval_seconds):
+      try:
+        self.poll()
+      except OSError:
+        logging.exception("Failed to reload the frontend files")
+
 
 class MyHandler(SimpleHTTPRequestHandler):
   """Handler for the HMI server."""
@@ -31,55 +498,239 @@ class MyHandler(SimpleHTTPRequestHandler):
       *args,
       **kwargs,
   ):
-    # Resolve PWD to create frontend_directory.
-    self.frontend_directory = str(pathlib.Path(__file__).parent.resolve()) + "/frontend"
-    logging.info(f"Root Direcory: {self.frontend_directory}")
-    super().__init__(*args, directory=self.frontend_directory, **kwargs)
+    super().__init__(*args, directory=str(FRONTEND_DIRECTORY), **kwargs)
 
   def do_GET(self):
 
-    if self.path == "/":
-      # Serving of HTML file.
-      self.path='/index.html'
-      with open(self.frontend_directory + self.path, "r") as f:
-        file_content = f.read()
-      self.send_response(200)
-      self.send_header("Content-type", "text/html")
+    if self.path.startswith('/api/'):
+      self._handle_api()
+    else:
+      # Frontend files are served from memory.
+      self._send_asset(include_body=True)
+
+  def do_HEAD(self):
+    self._send_asset(include_body=False)
+
+  def _send_asset(self, include_body):
+    url_path = urllib.parse.urlsplit(self.path).path
+    asset = self.server.assets.get(url_path)
+    if asset is None:
+      self.send_error(404, "File not found")
+      return
+    encoding, etag, body = asset.select(self.headers.get('Accept-Encoding'))
+    cache_control = (
+        HTML_CACHE_CONTROL if asset.content_type == "text/html"
+        else ASSET_CACHE_CONTROL
+    )
+    if _etag_matches(self.headers.get('If-None-Match'), asset.etags()):
+      self.send_response(304)
+      self.send_header('ETag', etag)
+      self.send_header('Cache-Control', cache_control)
+      self.send_header('Vary', 'Accept-Encoding')
       self.end_headers()
-      self.wfile.write(bytes(file_content, encoding="utf-8")) 
-    
-    elif self.path == '/api/executive/operations':
-      # Lists all active operations in the executive.
-      executive = create_executive_stub(60)
-      response_proto = executive.ListOperations(request=ListOperationsRequest())
-      for operation in response_proto.operations:
-        operation.ClearField('metadata')
-      response_json = json_format.MessageToJson(response_proto)
-      logging.info('Operations in the executive: %s', response_json)
+      return
+    self.send_response(200)
+    self.send_header('Content-type', asset.content_type)
+    self.send_header('Content-Length', str(len(body)))
+    self.send_header('ETag', etag)
+    self.send_header('Cache-Control', cache_control)
+    self.send_header('Vary', 'Accept-Encoding')
+    if encoding != "identity":
+      self.send_header('Content-Encoding', encoding)
+    self.end_headers()
+    if include_body:
+      self.wfile.write(body)
+
+  def _handle_api(self):
+    url = urllib.parse.urlsplit(self.path)
+
+    if url.path == '/api/executive/operations':
+      # Lists the operations in the executive, a page at a time.
+      try:
+        request, fields = parse_operations_query(url.query)
+      except ValueError as e:
+        self.send_error(400, str(e))
+        return
+      try:
+        response_json = self.server.executive.list_operations_json(
+            request, fields
+        )
+      except ExecutiveBusyError as e:
+        self.send_error(503, str(e))
+        return
+      except (grpc.RpcError, grpc.FutureTimeoutError):
+        logging.exception("Failed to list operations")
+        self.send_error(502, "Executive unavailable")
+        return
       self.send_response(200)
       self.send_header('Content-type', 'application/json')
       self.end_headers()
       self.wfile.write(response_json.encode())
 
+    elif url.path == '/api/executive/operations/stream':
+      # Streams changes of the operations as server-sent events.
+      self._stream_operations()
+
     else:
-      # Serve other static files as usual.
-      super().do_GET()
+      self.send_error(404, "Unknown API")
+
+  def _stream_operations(self):
+    broadcaster = self.server.broadcaster
+    client = broadcaster.subscribe()
+    if client is None:
+      # An error status would make EventSource give up for good. An empty
+      # stream with a retry delay makes it come back later instead.
+      self.send_response(200)
+      self.send_header('Content-type', 'text/event-stream')
+      self.send_header('Cache-Control', 'no-cache')
+      self.end_headers()
+      self.wfile.write(
+          f": too many operation streams\nretry: {STREAM_RETRY_MILLISECONDS}\n\n"
+          .encode()
+      )
+      return
+    try:
+      self.send_response(200)
+      self.send_header('Content-type', 'text/event-stream')
+      self.send_header('Cache-Control', 'no-cache')
+      self.end_headers()
+      while not client.dropped:
+        try:
+          event = client.events.get(timeout=STREAM_KEEPALIVE_SECONDS)
+        except queue.Empty:
+          self.wfile.write(b": keepalive\n\n")
+        else:
+          if event is None:
+            break
+          kind, data = event
+          self.wfile.write(f"event: {kind}\ndata: {json.dumps(data)}\n\n".encode())
+        self.wfile.flush()
+    except (BrokenPipeError, ConnectionResetError):
+      logging.info("Operations stream client disconnected")
+    finally:
+      broadcaster.unsubscribe(client)
+
+
+def parse_operations_query(query):
+  """Returns the ListOperationsRequest and the fields for a query string.
+
+  Understands `page_size`, `page_token`, `filter` (passed to the executive as
+  is, e.g. a name filter) and `fields`, a comma-separated list of Operation
+  fields to return.
+
+  Raises:
+    ValueError: If a parameter is unknown or invalid.
+  """
+  params = urllib.parse.parse_qs(query, keep_blank_values=True)
+  unknown = set(params) - {"page_size", "page_token", "filter", "fields"}
+  if unknown:
+    raise ValueError(f"Unknown query parameters: {', '.join(sorted(unknown))}")
+
+  def single(name, default):
+    values = params.get(name)
+    if not values:
+      return default
+    if len(values) > 1:
+      raise ValueError(f"{name} given more than once")
+    return values[0]
+
+  page_size = single("page_size", str(DEFAULT_PAGE_SIZE))
+  if not page_size.isdigit() or not 0 < int(page_size) <= MAX_PAGE_SIZE:
+    raise ValueError(f"page_size must be between 1 and {MAX_PAGE_SIZE}")
+  request = ListOperationsRequest(
+      page_size=int(page_size),
+      page_token=single("page_token", ""),
+      filter=single("filter", ""),
+  )
+
+  fields = single("fields", None)
+  if fields is None:
+    return request, DEFAULT_OPERATION_FIELDS
+  fields = tuple(f.strip() for f in fields.split(",") if f.strip())
+  mask = field_mask_pb2.FieldMask(paths=fields)
+  if not fields or not mask.IsValidForDescriptor(Operation.DESCRIPTOR):
+    raise ValueError("fields must be a list of Operation fields")
+  return request, fields
+
+
+def _etag_matches(if_none_match, etags):
+  if not if_none_match:
+    return False
+  if if_none_match.strip() == "*":
+    return True
+  for candidate in if_none_match.split(","):
+    candidate = candidate.strip()
+    if candidate.startswith("W/"):
+      candidate = candidate[2:]
+    if candidate in etags:
+      return True
+  return False
+
+
+class BoundedThreadingHTTPServer(HTTPServer):
+  """HTTPServer that handles requests on a bounded pool of threads.
+
+  Unlike ThreadingHTTPServer, which starts a thread per connection, at most
+  `max_workers` requests plus `max_stream_clients` operation streams are
+  handled at once. Executive calls go through `executive`, which limits how
+  many of them run at once.
+  """
+
+  def __init__(
+      self,
+      server_address,
+      RequestHandlerClass,
+      max_workers=MAX_WORKERS,
+      executive=None,
+      max_stream_clients=MAX_STREAM_CLIENTS,
+      assets=None,
+  ):
+    super().__init__(server_address, RequestHandlerClass)
+    self.assets = assets or StaticAssets()
+    # Streams hold their thread for as long as the client is connected.
+    self._pool = ThreadPoolExecutor(
+        max_workers=max_workers + max_stream_clients, thread_name_prefix="http"
+    )
+    self.executive = executive or ExecutiveClient()
+    self.broadcaster = OperationsBroadcaster(self.executive, max_stream_clients)
+
+  def process_request(self, request, client_address):
+    self._pool.submit(self._process_request_thread, request, client_address)
+
+  def _process_request_thread(self, request, client_address):
+    try:
+      self.finish_request(request, client_address)
+    except Exception:
+      self.handle_error(request, client_address)
+    finally:
+      self.shutdown_request(request)
+
+  def server_close(self):
+    super().server_close()
+    self.broadcaster.close()
+    self._pool.shutdown(wait=True)
 
 
-def main():
+def main(debug=False):
     context = get_runtime_context()
     http_port = context.http_port
     logging.info(f" HTTP port provided by runtime context: {http_port}")
 
     logging.info(f" Creating HTTP server.")
-    http_server = HTTPServer(
+    http_server = BoundedThreadingHTTPServer(
       server_address=("", http_port),
       RequestHandlerClass=MyHandler
     )
+    if debug:
+      logging.info(f" Reloading frontend files on change.")
+      AssetWatcher(http_server.assets).start()
     logging.info(f" Starting HTTP server.")
     http_server.serve_forever()
 
 
 if __name__ == '__main__':
     logging.basicConfig(stream=sys.stderr, level=logging.INFO)
-    main()
+    parser = argparse.ArgumentParser(description="HMI server.")
+    parser.add_argument('--debug', action='store_true',
+                        help='Reload the frontend files when they change.')
+    main(parser.parse_args().debug)
@@ -0,0 +1,610 @@
+import gzip
+import json
+import os
+import pathlib
+import tempfile
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+
+from google.longrunning import operations_pb2
+from google.protobuf import wrappers_pb2
+import grpc
+
+from services.hmi_python import server
+
+
+class FakeExecutive:
+  """ExecutiveServiceStub whose ListOperations takes `delay` seconds.
+
+  It also stands in for the stub's channel.
+  """
+
+  def __init__(self, delay):
+    self.delay = delay
+    self.calls = 0
+    self.in_flight = 0
+    self.max_in_flight = 0
+    self.error = None
+    self.operations = [operations_pb2.Operation(name="operation_1")]
+    self.next_page_token = ""
+    self.requests = []
+    self.timeouts = []
+    self.closes = 0
+    self._lock = threading.Lock()
+
+  def close(self):
+    self.closes += 1
+
+  def ListOperations(self, request, timeout=None):
+    self.requests.append(request)
+    self.timeouts.append(timeout)
+    if self.error is not None:
+      raise self.error
+    with self._lock:
+      self.calls += 1
+      self.in_flight += 1
+      self.max_in_flight = max(self.max_in_flight, self.in_flight)
+    time.sleep(self.delay)
+    with self._lock:
+      self.in_flight -= 1
+    return operations_pb2.ListOperationsResponse(
+        operations=self.operations, next_page_token=self.next_page_token
+    )
+
+
+class UnavailableError(grpc.RpcError):
+
+  def code(self):
+    return grpc.StatusCode.UNAVAILABLE
+
+
+class FakeClock:
+
+  def __init__(self):
+    self.now = 0.0
+
+  def __call__(self):
+    return self.now
+
+
+class ServerLoadTest(unittest.TestCase):
+
+  def start_server(
+      self,
+      executive,
+      max_workers=server.MAX_WORKERS,
+      max_stream_clients=server.MAX_STREAM_CLIENTS,
+      **kwargs,
+  ):
+    self.client = server.ExecutiveClient(
+        stub_factory=lambda timeout: (executive, executive), **kwargs
+    )
+    http_server = server.BoundedThreadingHTTPServer(
+        ("localhost", 0),
+        server.MyHandler,
+        max_workers=max_workers,
+        executive=self.client,
+    )
+    http_server.broadcaster = server.OperationsBroadcaster(
+        self.client, max_stream_clients, interval_seconds=0.05
+    )
+    thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+    thread.start()
+
+    def stop():
+      http_server.shutdown()
+      http_server.server_close()
+      thread.join()
+
+    self.addCleanup(stop)
+    return f"http://localhost:{http_server.server_address[1]}"
+
+  def get(self, url):
+    start = time.monotonic()
+    with urllib.request.urlopen(url, timeout=30) as response:
+      response.read()
+      return response.status, time.monotonic() - start
+
+  def test_static_latency_stays_flat_while_executive_is_slow(self):
+    executive = FakeExecutive(delay=1.0)
+    base_url = self.start_server(executive, max_workers=8, max_calls=2)
+
+    _, idle_latency = self.get(base_url + "/script.js")
+
+    slow_calls = [
+        threading.Thread(
+            target=self.get, args=(base_url + "/api/executive/operations",)
+        )
+        for _ in range(6)
+    ]
+    for t in slow_calls:
+      t.start()
+    time.sleep(0.1)
+
+    latencies = []
+    for _ in range(20):
+      status, latency = self.get(base_url + "/script.js")
+      self.assertEqual(status, 200)
+      latencies.append(latency)
+    for t in slow_calls:
+      t.join()
+
+    # Every executive call takes a second; a static file served behind one
+    # would take at least as long.
+    self.assertLess(max(latencies), idle_latency + 0.25)
+
+  def test_rejects_executive_calls_beyond_the_limit(self):
+    executive = FakeExecutive(delay=0.5)
+    base_url = self.start_server(executive, max_calls=1, wait_seconds=0.05)
+
+    # A different request, so that it is not shared with the one below.
+    blocker = threading.Thread(
+        target=self.client.list_operations_json,
+        args=(operations_pb2.ListOperationsRequest(page_size=1),),
+    )
+    blocker.start()
+    time.sleep(0.1)
+    with self.assertRaises(urllib.error.HTTPError) as e:
+      self.get(base_url + "/api/executive/operations")
+    blocker.join()
+
+    self.assertEqual(e.exception.code, 503)
+
+  def test_concurrent_requests_share_one_call(self):
+    executive = FakeExecutive(delay=0.5)
+    base_url = self.start_server(executive)
+
+    bodies = []
+
+    def fetch():
+      with urllib.request.urlopen(
+          base_url + "/api/executive/operations", timeout=30
+      ) as response:
+        bodies.append(response.read())
+
+    threads = [threading.Thread(target=fetch) for _ in range(5)]
+    for t in threads:
+      t.start()
+    for t in threads:
+      t.join()
+
+    self.assertEqual(executive.calls, 1)
+    self.assertEqual(len(bodies), 5)
+    self.assertEqual(len(set(bodies)), 1)
+    self.assertIn(b"operation_1", bodies[0])
+
+
+  def test_streams_operation_changes_to_all_clients(self):
+    executive = FakeExecutive(delay=0)
+    base_url = self.start_server(executive, ttl_seconds=0)
+
+    streams = [
+        urllib.request.urlopen(
+            base_url + "/api/executive/operations/stream", timeout=30
+        )
+        for _ in range(3)
+    ]
+    for stream in streams:
+      self.addCleanup(stream.close)
+      self.assertEqual(stream.headers["Content-Type"], "text/event-stream")
+      kind, operations = read_event(stream)
+      self.assertEqual(kind, "snapshot")
+      self.assertEqual([o["name"] for o in operations], ["operation_1"])
+
+    executive.operations = [
+        operations_pb2.Operation(name="operation_1", done=True),
+        operations_pb2.Operation(name="operation_2"),
+    ]
+    for stream in streams:
+      kind, diff = read_event(stream)
+      self.assertEqual(kind, "diff")
+      self.assertEqual(
+          diff["upserted"],
+          [{"name": "operation_1", "done": True}, {"name": "operation_2"}],
+      )
+      self.assertEqual(diff["removed"], [])
+      self.assertEqual(diff["order"], ["operation_1", "operation_2"])
+
+    executive.operations = [operations_pb2.Operation(name="operation_2")]
+    for stream in streams:
+      self.assertEqual(
+          read_event(stream),
+          (
+              "diff",
+              {"upserted": [], "removed": ["operation_1"], "order": ["operation_2"]},
+          ),
+      )
+
+    pollers = [t for t in threading.enumerate() if t.name == "operations-stream"]
+    self.assertEqual(len(pollers), 1)
+
+  def test_stream_survives_a_bad_poll(self):
+    executive = FakeExecutive(delay=0)
+    # Without a name the operation cannot be published.
+    executive.operations = [operations_pb2.Operation()]
+    base_url = self.start_server(executive, ttl_seconds=0)
+
+    stream = urllib.request.urlopen(
+        base_url + "/api/executive/operations/stream", timeout=30
+    )
+    self.addCleanup(stream.close)
+    deadline = time.monotonic() + 5
+    with self.assertLogs(level="ERROR") as log_output:
+      while not log_output.records and time.monotonic() < deadline:
+        time.sleep(0.01)
+    executive.operations = [operations_pb2.Operation(name="operation_1")]
+
+    kind, operations = read_event(stream)
+    self.assertEqual(kind, "snapshot")
+    self.assertEqual(operations, [{"name": "operation_1"}])
+
+
+  def test_turned_away_stream_clients_retry_later(self):
+    executive = FakeExecutive(delay=0)
+    base_url = self.start_server(executive, max_stream_clients=1)
+    url = base_url + "/api/executive/operations/stream"
+
+    stream = urllib.request.urlopen(url, timeout=30)
+    self.addCleanup(stream.close)
+    self.assertEqual(read_event(stream)[0], "snapshot")
+
+    with urllib.request.urlopen(url, timeout=30) as turned_away:
+      self.assertEqual(turned_away.status, 200)
+      self.assertEqual(turned_away.headers["Content-Type"], "text/event-stream")
+      body = turned_away.read().decode()
+    self.assertIn(f"retry: {server.STREAM_RETRY_MILLISECONDS}\n", body)
+    self.assertNotIn("event:", body)
+
+
+class PagedExecutive(FakeExecutive):
+  """FakeExecutive that returns one operation per page."""
+
+  def ListOperations(self, request, timeout=None):
+    self.requests.append(request)
+    index = int(request.page_token or 0)
+    next_index = index + 1
+    return operations_pb2.ListOperationsResponse(
+        operations=self.operations[index:next_index],
+        next_page_token=(
+            str(next_index) if next_index < len(self.operations) else ""
+        ),
+    )
+
+
+class OperationsBroadcasterTest(unittest.TestCase):
+
+  def test_polls_every_page_and_streams_metadata_changes(self):
+    executive = PagedExecutive(delay=0)
+    executive.operations = [
+        operations_pb2.Operation(name="operation_1"),
+        operations_pb2.Operation(name="operation_2"),
+    ]
+    broadcaster = server.OperationsBroadcaster(
+        server.ExecutiveClient(
+            stub_factory=lambda timeout: (executive, executive), ttl_seconds=0
+        ),
+        interval_seconds=0.01,
+    )
+    self.addCleanup(broadcaster.close)
+    client = broadcaster.subscribe()
+
+    kind, operations = client.events.get(timeout=5)
+    self.assertEqual(kind, "snapshot")
+    self.assertEqual(
+        [o["name"] for o in operations], ["operation_1", "operation_2"]
+    )
+
+    executive.operations[1].metadata.Pack(wrappers_pb2.StringValue(value="50%"))
+    kind, diff = client.events.get(timeout=5)
+    self.assertEqual(kind, "diff")
+    self.assertEqual([o["name"] for o in diff["upserted"]], ["operation_2"])
+    self.assertIn("metadata", diff["upserted"][0])
+
+
+def read_event(stream):
+  """Reads the next server-sent event, skipping comments."""
+  fields = {}
+  while True:
+    raw = stream.readline()
+    if not raw:
+      raise EOFError("Stream ended")
+    line = raw.decode().rstrip("\n")
+    if not line:
+      if fields:
+        return fields["event"], json.loads(fields["data"])
+      continue
+    if line.startswith(":"):
+      continue
+    name, _, value = line.partition(": ")
+    fields[name] = value
+
+
+class OperationsQueryTest(unittest.TestCase):
+
+  def setUp(self):
+    self.executive = FakeExecutive(delay=0)
+    self.executive.operations = [
+        operations_pb2.Operation(name="operation_1", done=True),
+        operations_pb2.Operation(name="operation_2"),
+    ]
+    self.executive.operations[0].metadata.value = b"x" * 1000
+    self.executive.next_page_token = "page_2"
+    http_server = server.BoundedThreadingHTTPServer(
+        ("localhost", 0),
+        server.MyHandler,
+        executive=server.ExecutiveClient(
+            stub_factory=lambda timeout: (self.executive, self.executive)
+        ),
+    )
+    thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+    thread.start()
+    self.addCleanup(thread.join)
+    self.addCleanup(http_server.server_close)
+    self.addCleanup(http_server.shutdown)
+    self.base_url = f"http://localhost:{http_server.server_address[1]}"
+
+  def get_json(self, query):
+    url = self.base_url + "/api/executive/operations" + query
+    try:
+      with urllib.request.urlopen(url, timeout=30) as response:
+        return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+      return e.code, None
+
+  def test_defaults_leave_out_metadata(self):
+    status, body = self.get_json("")
+    self.assertEqual(status, 200)
+    self.assertEqual(
+        body,
+        {
+            "operations": [
+                {"name": "operation_1", "done": True},
+                {"name": "operation_2"},
+            ],
+            "nextPageToken": "page_2",
+        },
+    )
+    self.assertEqual(
+        self.executive.requests[-1],
+        operations_pb2.ListOperationsRequest(page_size=server.DEFAULT_PAGE_SIZE),
+    )
+
+  def test_passes_paging_and_filter_and_projects_fields(self):
+    status, body = self.get_json(
+        "?page_size=2&page_token=page_1&filter=name%3Dop*&fields=name"
+    )
+    self.assertEqual(status, 200)
+    self.assertEqual(
+        body["operations"], [{"name": "operation_1"}, {"name": "operation_2"}]
+    )
+    self.assertEqual(
+        self.executive.requests[-1],
+        operations_pb2.ListOperationsRequest(
+            page_size=2, page_token="page_1", filter="name=op*"
+        ),
+    )
+
+  def test_caches_per_query(self):
+    self.get_json("?fields=name")
+    self.get_json("?fields=name")
+    self.get_json("?fields=name,done")
+    self.get_json("?page_size=1&fields=name")
+    self.assertEqual(len(self.executive.requests), 3)
+
+  def test_rejects_invalid_queries(self):
+    for query in (
+        "?page_size=0",
+        "?page_size=abc",
+        f"?page_size={server.MAX_PAGE_SIZE + 1}",
+        "?fields=name,owner",
+        "?fields=",
+        "?sort=name",
+    ):
+      with self.subTest(query=query):
+        self.assertEqual(self.get_json(query)[0], 400)
+    self.assertEqual(self.executive.requests, [])
+
+
+class StaticAssetsTest(unittest.TestCase):
+
+  def setUp(self):
+    executive = FakeExecutive(delay=0)
+    http_server = server.BoundedThreadingHTTPServer(
+        ("localhost", 0),
+        server.MyHandler,
+        executive=server.ExecutiveClient(stub_factory=lambda timeout: (executive, executive)),
+    )
+    thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+    thread.start()
+    self.addCleanup(thread.join)
+    self.addCleanup(http_server.server_close)
+    self.addCleanup(http_server.shutdown)
+    self.base_url = f"http://localhost:{http_server.server_address[1]}"
+
+  def get(self, path, headers=None):
+    request = urllib.request.Request(self.base_url + path, headers=headers or {})
+    try:
+      with urllib.request.urlopen(request, timeout=30) as response:
+        return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+      return e.code, e.headers, e.read()
+
+  def test_serves_index_compressed_with_etag(self):
+    index = (server.FRONTEND_DIRECTORY / "index.html").read_bytes()
+
+    status, headers, body = self.get("/", {"Accept-Encoding": "gzip"})
+    self.assertEqual(status, 200)
+    self.assertEqual(headers["Content-Encoding"], "gzip")
+    self.assertEqual(headers["Cache-Control"], server.HTML_CACHE_CONTROL)
+    self.assertEqual(gzip.decompress(body), index)
+
+    status, headers, body = self.get("/index.html", {"Accept-Encoding": "br"})
+    self.assertEqual(status, 200)
+    self.assertIsNone(headers["Content-Encoding"])
+    self.assertEqual(body, index)
+
+  def test_not_modified_for_matching_etag(self):
+    _, headers, _ = self.get("/script.js", {"Accept-Encoding": "gzip"})
+    etag = headers["ETag"]
+    self.assertEqual(headers["Cache-Control"], server.ASSET_CACHE_CONTROL)
+
+    status, headers, body = self.get(
+        "/script.js", {"Accept-Encoding": "gzip", "If-None-Match": etag}
+    )
+    self.assertEqual(status, 304)
+    self.assertEqual(headers["ETag"], etag)
+    self.assertEqual(body, b"")
+
+    status, _, _ = self.get("/script.js", {"If-None-Match": '"stale"'})
+    self.assertEqual(status, 200)
+
+  def test_unknown_file_is_not_found(self):
+    status, _, _ = self.get("/missing.js")
+    self.assertEqual(status, 404)
+
+  def test_watcher_reloads_changed_files(self):
+    directory = pathlib.Path(tempfile.mkdtemp())
+    script = directory / "script.js"
+    script.write_text("let a = 1;")
+    assets = server.StaticAssets(directory)
+    watcher = server.AssetWatcher(assets)
+
+    self.assertFalse(watcher.poll())
+    script.write_text("let a = 2;")
+    # Make the change visible on file systems with coarse timestamps.
+    os.utime(script, ns=(0, script.stat().st_mtime_ns + 10**9))
+    self.assertTrue(watcher.poll())
+    _, _, body = assets.get("/script.js").select("")
+    self.assertEqual(body, b"let a = 2;")
+
+
+class ExecutiveClientTest(unittest.TestCase):
+
+  def test_caches_responses_for_ttl(self):
+    executive = FakeExecutive(delay=0)
+    clock = FakeClock()
+    client = server.ExecutiveClient(
+        stub_factory=lambda timeout: (executive, executive), ttl_seconds=1.0, clock=clock
+    )
+    request = operations_pb2.ListOperationsRequest()
+
+    client.list_operations_json(request)
+    clock.now += 0.5
+    client.list_operations_json(request)
+    self.assertEqual(executive.calls, 1)
+
+    clock.now += 1.0
+    client.list_operations_json(request)
+    self.assertEqual(executive.calls, 2)
+
+  def test_evicts_expired_responses(self):
+    executive = FakeExecutive(delay=0)
+    clock = FakeClock()
+    client = server.ExecutiveClient(
+        stub_factory=lambda timeout: (executive, executive), ttl_seconds=1.0, clock=clock
+    )
+
+    for page_size in range(1, 4):
+      client.list_operations_json(
+          operations_pb2.ListOperationsRequest(page_size=page_size)
+      )
+    self.assertEqual(len(client._responses), 3)
+
+    clock.now += 1.0
+    client.list_operations_json(operations_pb2.ListOperationsRequest())
+    self.assertEqual(len(client._responses), 1)
+
+  def test_bounds_cached_responses(self):
+    executive = FakeExecutive(delay=0)
+    client = server.ExecutiveClient(
+        stub_factory=lambda timeout: (executive, executive), max_responses=2
+    )
+
+    for page_size in range(1, 5):
+      client.list_operations_json(
+          operations_pb2.ListOperationsRequest(page_size=page_size)
+      )
+    self.assertEqual(len(client._responses), 2)
+
+    # The newest responses are the ones kept.
+    client.list_operations_json(operations_pb2.ListOperationsRequest(page_size=4))
+    self.assertEqual(executive.calls, 4)
+    client.list_operations_json(operations_pb2.ListOperationsRequest(page_size=1))
+    self.assertEqual(executive.calls, 5)
+
+  def test_shared_calls_are_bounded_in_time(self):
+    executive = FakeExecutive(delay=1.0)
+    client = server.ExecutiveClient(
+        stub_factory=lambda timeout: (executive, executive),
+        wait_seconds=0.05,
+        rpc_timeout_seconds=0.1,
+    )
+    request = operations_pb2.ListOperationsRequest()
+    leader = threading.Thread(target=client.list_operations_json, args=(request,))
+    leader.start()
+    time.sleep(0.05)
+
+    start = time.monotonic()
+    with self.assertRaises(server.ExecutiveBusyError):
+      client.list_operations_json(request)
+    self.assertLess(time.monotonic() - start, 0.5)
+    leader.join()
+    self.assertEqual(executive.timeouts, [0.1])
+
+  def test_reconnects_after_unavailable(self):
+    executive = FakeExecutive(delay=0)
+    stubs = []
+
+    def stub_factory(timeout):
+      stubs.append(executive)
+      return executive, executive
+
+    client = server.ExecutiveClient(stub_factory=stub_factory, ttl_seconds=0)
+    request = operations_pb2.ListOperationsRequest()
+    client.list_operations_json(request)
+    client.list_operations_json(request)
+    self.assertEqual(len(stubs), 1)
+
+    executive.error = UnavailableError()
+    with self.assertRaises(grpc.RpcError):
+      client.list_operations_json(request)
+    executive.error = None
+
+    self.assertEqual(executive.closes, 1)
+
+    client.list_operations_json(request)
+    self.assertEqual(len(stubs), 2)
+
+  def test_connects_without_holding_the_stub_lock(self):
+    connecting = threading.Barrier(2, timeout=5)
+    executives = []
+
+    def stub_factory(timeout):
+      # Both calls only get past this if neither blocks the other.
+      connecting.wait()
+      executive = FakeExecutive(delay=0)
+      executives.append(executive)
+      return executive, executive
+
+    client = server.ExecutiveClient(stub_factory=stub_factory, ttl_seconds=0)
+    callers = [
+        threading.Thread(
+            target=client.list_operations_json,
+            args=(operations_pb2.ListOperationsRequest(page_size=size),),
+        )
+        for size in (1, 2)
+    ]
+    for caller in callers:
+      caller.start()
+    for caller in callers:
+      caller.join()
+
+    # The stub that lost the race had its channel closed.
+    self.assertEqual(sorted(e.closes for e in executives), [0, 1])
+
+
+if __name__ == '__main__':
+  unittest.main()
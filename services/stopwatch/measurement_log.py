@@ -0,0 +1,150 @@
+"""Append-only log of stopwatch events in a memory-mapped ring file.
+
+The file starts with a header slot followed by `capacity` fixed-size record
+slots. Record number `sequence` lives in slot `sequence % capacity`, so once
+the ring is full the oldest records are overwritten. Every record carries a
+CRC, and a slot that fails it is ignored on recovery. A record is written
+with a single copy into the mapping, so the page cache holds it as soon as
+`append` returns and it survives a crash of the process. Use `flush` to also
+survive a crash of the machine.
+"""
+
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+START = 1
+STOP = 2
+LAP = 3
+
+# Longest stopwatch name that fits into a record, in UTF-8 bytes.
+MAX_NAME_BYTES = 96
+
+_MAGIC = b'STPWLOG1'
+# sequence, crc, kind, name length, wall time, value, name.
+_RECORD = struct.Struct('<QIBB2xdd96s')
+_HEADER = struct.Struct('<8sQ')
+RECORD_SIZE = _RECORD.size
+
+
+class Record:
+  """One logged event.
+
+  `value` is the time elapsed since the start for STOP records, the lap time
+  for LAP records and zero for START records. `wall_time` is in seconds since
+  the epoch, so it stays meaningful across restarts.
+  """
+
+  __slots__ = ('sequence', 'kind', 'name', 'wall_time', 'value')
+
+  def __init__(self, sequence, kind, name, wall_time, value):
+    self.sequence = sequence
+    self.kind = kind
+    self.name = name
+    self.wall_time = wall_time
+    self.value = value
+
+
+class MeasurementLog:
+  """A fixed-size ring of records backed by a memory-mapped file."""
+
+  def __init__(self, path, capacity):
+    if capacity < 1:
+        raise ValueError(f'Capacity must be at least 1, got {capacity}')
+    size = RECORD_SIZE * (capacity + 1)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        existing_size = os.fstat(fd).st_size
+        if existing_size != size:
+            # A log of another capacity cannot be reinterpreted; start over.
+            os.ftruncate(fd, 0)
+            os.ftruncate(fd, size)
+        self._map = mmap.mmap(fd, size)
+    finally:
+        os.close(fd)
+
+    magic, stored_capacity = _HEADER.unpack_from(self._map, 0)
+    if magic != _MAGIC or stored_capacity != capacity:
+        self._map[:] = bytes(size)
+        _HEADER.pack_into(self._map, 0, _MAGIC, capacity)
+
+    self.capacity = capacity
+    self._lock = threading.Lock()
+    self._next_sequence = 1
+    for record in self._scan():
+        self._next_sequence = max(self._next_sequence, record.sequence + 1)
+
+  def append(self, kind, name, value=0.0, wall_time=None):
+    """Appends a record and returns its sequence number."""
+    encoded = name.encode('utf-8')
+    if len(encoded) > MAX_NAME_BYTES:
+        raise ValueError(f'Name {name!r} is longer than {MAX_NAME_BYTES} bytes')
+    if wall_time is None:
+        wall_time = time.time()
+    with self._lock:
+        sequence = self._next_sequence
+        self._next_sequence += 1
+        self._map[self._offset(sequence):self._offset(sequence) + RECORD_SIZE] = (
+            _pack(sequence, kind, encoded, wall_time, value)
+        )
+    return sequence
+
+  def read(self, after_sequence=0, limit=None):
+    """Yields retained records with a larger sequence number, oldest first.
+
+    Records are read one at a time, so the log is never loaded as a whole.
+    Records that are overwritten while iterating are skipped.
+    """
+    with self._lock:
+        last = self._next_sequence - 1
+    sequence = max(after_sequence + 1, last - self.capacity + 1, 1)
+    count = 0
+    while sequence <= last and (limit is None or count < limit):
+        with self._lock:
+            record = self._read_slot(self._offset(sequence))
+        if record is not None and record.sequence == sequence:
+            count += 1
+            yield record
+        sequence += 1
+
+  def records(self):
+    """Returns all retained records ordered by sequence number."""
+    return sorted(self._scan(), key=lambda record: record.sequence)
+
+  def flush(self):
+    self._map.flush()
+
+  def close(self):
+    self._map.close()
+
+  def _offset(self, sequence):
+    return RECORD_SIZE * (1 + sequence % self.capacity)
+
+  def _scan(self):
+    for slot in range(self.capacity):
+        record = self._read_slot(RECORD_SIZE * (1 + slot))
+        if record is not None:
+            yield record
+
+  def _read_slot(self, offset):
+    data = self._map[offset:offset + RECORD_SIZE]
+    sequence, crc, kind, name_len, wall_time, value, name = _RECORD.unpack(data)
+    if sequence == 0 or crc != _crc(data) or name_len > MAX_NAME_BYTES:
+        return None
+    return Record(sequence, kind, name[:name_len].decode('utf-8'), wall_time, value)
+
+
+def _crc(data):
+    # Everything but the CRC field itself.
+    return zlib.crc32(data[12:], zlib.crc32(data[:8]))
+
+
+def _pack(sequence, kind, encoded_name, wall_time, value):
+    data = bytearray(
+        _RECORD.pack(sequence, 0, kind, len(encoded_name), wall_time, value, encoded_name)
+    )
+    struct.pack_into('<I', data, 8, _crc(data))
+    return bytes(data)
@@ -1,13 +1,23 @@
 #!/usr/bin/env python3
 
+import asyncio
 from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import heapq
+import itertools
 import logging
+import math
+import os
+import queue
+import signal
 import sys
+import threading
 import time
 
 import grpc
 from intrinsic.resources.proto import runtime_context_pb2
 
+from services.stopwatch import measurement_log
 from services.stopwatch import stopwatch_service_pb2 as stopwatch_proto
 from services.stopwatch import stopwatch_service_pb2_grpc as stopwatch_grpc
 
@@ -15,10 +25,469 @@ from services.stopwatch import stopwatch_service_pb2_grpc as stopwatch_grpc
 logger = logging.getLogger(__name__)
 
 
-class StopwatchServicer(stopwatch_grpc.StopwatchServiceServicer):
+_DEFAULT_SHUTDOWN_GRACE_SECONDS = 5.0
+_DEFAULT_MEASUREMENT_LOG_CAPACITY = 65536
+
+# Update interval bounds of WatchElapsed, in seconds.
+_DEFAULT_WATCH_INTERVAL_SECONDS = 0.1
+_MIN_WATCH_INTERVAL_SECONDS = 0.01
+# Events queued for a WatchElapsed client beyond this are dropped.
+_MAX_QUEUED_WATCH_EVENTS = 64
+# Share of the threaded server's workers that WatchElapsed streams may hold.
+# Each stream blocks a worker for its whole lifetime; the rest stay free for
+# Start, Stop and the other short RPCs.
+_WATCH_WORKER_SHARE = 0.5
+
+# Number of lock stripes of the stopwatch registry. RPCs for stopwatches in
+# different stripes never wait on each other.
+_NUM_STRIPES = 16
+
+
+# Measurements are kept in a ring of slots, each covering a fixed span of time,
+# so statistics over any window up to the retention merge a few slots.
+_STATS_SLOT_SECONDS = 10.0
+_STATS_NUM_SLOTS = 360
+
+# Log histogram buckets: bucket i holds values in
+# [_HISTOGRAM_MIN_VALUE * _HISTOGRAM_GROWTH**i,
+#  _HISTOGRAM_MIN_VALUE * _HISTOGRAM_GROWTH**(i + 1)).
+_HISTOGRAM_MIN_VALUE = 1e-4
+_HISTOGRAM_GROWTH = 2 ** (1 / 16)
+_HISTOGRAM_NUM_BUCKETS = 16 * 30
+
+
+class StopwatchError(Exception):
+  """Raised when a stopwatch operation is not valid in its current state."""
+
+
+class Stopwatch:
+  """A running stopwatch and the laps recorded on it."""
+
+  def __init__(self, start_time):
+    self.start_time = start_time
+    self.last_lap_time = start_time
+    self.lap_times = []
+
+
+def _bucket_index(value):
+    if value <= _HISTOGRAM_MIN_VALUE:
+        return 0
+    index = int(math.log(value / _HISTOGRAM_MIN_VALUE) / math.log(_HISTOGRAM_GROWTH))
+    return min(index, _HISTOGRAM_NUM_BUCKETS - 1)
+
+
+def _bucket_value(index):
+    """Returns the geometric midpoint of a bucket."""
+    return _HISTOGRAM_MIN_VALUE * _HISTOGRAM_GROWTH ** (index + 0.5)
+
+
+class _StatsSlot:
+  """Summary of the measurements of one time slot."""
+
+  def __init__(self, epoch):
+    self.epoch = epoch
+    self.count = 0
+    self.total = 0.0
+    self.min = math.inf
+    self.max = -math.inf
+    # Sparse histogram from bucket index to count.
+    self.buckets = {}
+
+
+class CycleTimeStats:
+  """Sliding-window histogram of the times measured by one stopwatch.
+
+  Memory is bounded by the number of slots times the number of buckets,
+  independently of how many measurements are recorded. Not thread-safe;
+  the registry guards it with the lock of its stripe.
+  """
 
   def __init__(self):
-     self._start_time = None
+    self._slots = [None] * _STATS_NUM_SLOTS
+
+  def record(self, value, now):
+    epoch = int(now // _STATS_SLOT_SECONDS)
+    index = epoch % _STATS_NUM_SLOTS
+    slot = self._slots[index]
+    if slot is None or slot.epoch != epoch:
+        slot = self._slots[index] = _StatsSlot(epoch)
+    slot.count += 1
+    slot.total += value
+    slot.min = min(slot.min, value)
+    slot.max = max(slot.max, value)
+    bucket = _bucket_index(value)
+    slot.buckets[bucket] = slot.buckets.get(bucket, 0) + 1
+
+  def summarize(self, window_seconds, now, response):
+    """Fills `response` with statistics over the last `window_seconds`."""
+    num_slots = _STATS_NUM_SLOTS
+    if window_seconds > 0:
+        num_slots = min(num_slots, math.ceil(window_seconds / _STATS_SLOT_SECONDS))
+    response.window_seconds = num_slots * _STATS_SLOT_SECONDS
+    current_epoch = int(now // _STATS_SLOT_SECONDS)
+
+    count = 0
+    total = 0.0
+    low = math.inf
+    high = -math.inf
+    buckets = {}
+    for slot in self._slots:
+        if slot is None or current_epoch - slot.epoch >= num_slots:
+            continue
+        count += slot.count
+        total += slot.total
+        low = min(low, slot.min)
+        high = max(high, slot.max)
+        for bucket, bucket_count in slot.buckets.items():
+            buckets[bucket] = buckets.get(bucket, 0) + bucket_count
+    if count == 0:
+        return
+
+    response.count = count
+    response.mean = total / count
+    response.min = low
+    response.max = high
+    percentiles = [(0.5, "p50"), (0.9, "p90"), (0.99, "p99")]
+    seen = 0
+    for bucket in sorted(buckets):
+        seen += buckets[bucket]
+        while percentiles and seen >= percentiles[0][0] * count:
+            _, field = percentiles.pop(0)
+            # The bucket midpoint can lie outside the observed range.
+            setattr(response, field, min(high, max(low, _bucket_value(bucket))))
+        if not percentiles:
+            break
+
+
+class StopwatchRegistry:
+  """Thread-safe map from name to running stopwatch.
+
+  Names are spread over a fixed number of stripes, each a dict guarded by its
+  own lock, so lookups are O(1) and concurrent RPCs only contend when their
+  names share a stripe. The statistics of every stopwatch that was ever
+  stopped live in the same stripe as the stopwatch.
+
+  With a measurement log every start, lap and stop is appended to it, and
+  the running stopwatches and statistics are restored from it on creation.
+  """
+
+  def __init__(self, num_stripes=_NUM_STRIPES, log=None):
+    self._stripes = [(threading.Lock(), {}, {}) for _ in range(num_stripes)]
+    self._listeners = []
+    self.log = log
+    if log is not None:
+        self._recover()
+
+  def _recover(self):
+    """Replays the measurement log.
+
+    The log holds wall-clock times, which are mapped to this process's
+    monotonic clock. A running stopwatch whose start record was already
+    overwritten in the ring cannot be restored.
+    """
+    offset = time.monotonic() - time.time()
+    for record in self.log.records():
+        _, stopwatches, stats = self._stripe(record.name)
+        now = record.wall_time + offset
+        if record.kind == measurement_log.START:
+            stopwatches[record.name] = Stopwatch(now)
+        elif record.kind == measurement_log.LAP:
+            stopwatch = stopwatches.get(record.name)
+            if stopwatch is not None:
+                stopwatch.last_lap_time = now
+                stopwatch.lap_times.append(record.value)
+        elif record.kind == measurement_log.STOP:
+            stopwatches.pop(record.name, None)
+            name_stats = stats.get(record.name)
+            if name_stats is None:
+                name_stats = stats[record.name] = CycleTimeStats()
+            name_stats.record(record.value, now)
+    running = sum(len(stopwatches) for _, stopwatches, _ in self._stripes)
+    logging.info(f"Recovered {running} running stopwatch(es) from the measurement log")
+
+  def _append(self, kind, name, value=0.0):
+    if self.log is not None:
+        self.log.append(kind, name, value)
+
+  def _stripe(self, name):
+    return self._stripes[hash(name) % len(self._stripes)]
+
+  def add_listener(self, listener):
+    """Calls listener(kind, name, seconds) after every start, lap and stop.
+
+    `kind` is one of the measurement_log record kinds and `seconds` the value
+    such a record holds. Listeners run on the thread of the RPC, outside of
+    the stripe lock.
+    """
+    self._listeners.append(listener)
+
+  def _notify(self, kind, name, value=0.0):
+    for listener in self._listeners:
+        listener(kind, name, value)
+
+  @contextlib.contextmanager
+  def _locked(self, names):
+    """Holds the stripe locks of all `names`.
+
+    Locks are always taken in stripe order, so two batches can never wait
+    on each other in a cycle.
+    """
+    indices = sorted({hash(name) % len(self._stripes) for name in names})
+    with contextlib.ExitStack() as stack:
+        for index in indices:
+            stack.enter_context(self._stripes[index][0])
+        yield
+
+  def start(self, name, now):
+    lock, stopwatches, _ = self._stripe(name)
+    with lock:
+        self._start_locked(name, now, stopwatches)
+    self._notify(measurement_log.START, name)
+
+  def start_many(self, names, now):
+    """Starts all `names` at the same time `now`.
+
+    All stripe locks involved are held for the whole batch, so no other
+    call sees only part of it applied. Returns an error message, or None on
+    success, per name.
+    """
+    errors = []
+    with self._locked(names):
+        for name in names:
+            _, stopwatches, _ = self._stripe(name)
+            try:
+                self._start_locked(name, now, stopwatches)
+                errors.append(None)
+            except StopwatchError as e:
+                errors.append(str(e))
+    for name, error in zip(names, errors):
+        if error is None:
+            self._notify(measurement_log.START, name)
+    return errors
+
+  def _start_locked(self, name, now, stopwatches):
+    if name in stopwatches:
+        raise StopwatchError(
+            f"Cannot start stopwatch {name!r} because it is already started"
+        )
+    if (
+        self.log is not None
+        and len(name.encode('utf-8')) > measurement_log.MAX_NAME_BYTES
+    ):
+        raise StopwatchError(
+            f"Cannot start stopwatch {name!r} because its name is longer than "
+            f"{measurement_log.MAX_NAME_BYTES} bytes"
+        )
+    self._append(measurement_log.START, name)
+    stopwatches[name] = Stopwatch(now)
+
+  def lap(self, name, now):
+    """Records a lap and returns (lap time, time elapsed) in seconds."""
+    lock, stopwatches, _ = self._stripe(name)
+    with lock:
+        stopwatch = stopwatches.get(name)
+        if stopwatch is None:
+            raise StopwatchError(
+                f"Cannot record a lap on stopwatch {name!r} because it is not started"
+            )
+        lap_time = now - stopwatch.last_lap_time
+        self._append(measurement_log.LAP, name, lap_time)
+        stopwatch.last_lap_time = now
+        stopwatch.lap_times.append(lap_time)
+        time_elapsed = now - stopwatch.start_time
+    self._notify(measurement_log.LAP, name, lap_time)
+    return lap_time, time_elapsed
+
+  def stop(self, name, now):
+    """Removes the stopwatch and returns (time elapsed, lap times) in seconds."""
+    lock, stopwatches, stats = self._stripe(name)
+    with lock:
+        time_elapsed, lap_times = self._stop_locked(name, now, stopwatches, stats)
+    self._notify(measurement_log.STOP, name, time_elapsed)
+    return time_elapsed, lap_times
+
+  def stop_many(self, names, now):
+    """Stops all `names` at the same time `now`, atomically like start_many.
+
+    Returns (time elapsed, lap times, error message) per name; the error is
+    None on success.
+    """
+    results = []
+    with self._locked(names):
+        for name in names:
+            _, stopwatches, stats = self._stripe(name)
+            try:
+                time_elapsed, lap_times = self._stop_locked(
+                    name, now, stopwatches, stats
+                )
+                results.append((time_elapsed, lap_times, None))
+            except StopwatchError as e:
+                results.append((0.0, [], str(e)))
+    for name, (time_elapsed, _, error) in zip(names, results):
+        if error is None:
+            self._notify(measurement_log.STOP, name, time_elapsed)
+    return results
+
+  def _stop_locked(self, name, now, stopwatches, stats):
+    stopwatch = stopwatches.pop(name, None)
+    if stopwatch is None:
+        raise StopwatchError(
+            f"Cannot stop stopwatch {name!r} because it is not started"
+        )
+    time_elapsed = now - stopwatch.start_time
+    self._append(measurement_log.STOP, name, time_elapsed)
+    name_stats = stats.get(name)
+    if name_stats is None:
+        name_stats = stats[name] = CycleTimeStats()
+    name_stats.record(time_elapsed, now)
+    return time_elapsed, stopwatch.lap_times
+
+  def elapsed(self, name, now):
+    """Returns the seconds since `name` was started, or None if it is stopped."""
+    lock, stopwatches, _ = self._stripe(name)
+    with lock:
+        stopwatch = stopwatches.get(name)
+        return None if stopwatch is None else now - stopwatch.start_time
+
+  def get_stats(self, name, window_seconds, now, response):
+    """Fills `response` with the statistics of `name`."""
+    lock, _, stats = self._stripe(name)
+    with lock:
+        name_stats = stats.get(name)
+        if name_stats is None:
+            name_stats = CycleTimeStats()
+        name_stats.summarize(window_seconds, now, response)
+
+
+class _Watcher:
+  """A WatchElapsed client, fed by calling `deliver` with ElapsedEvents."""
+
+  def __init__(self, name, interval, deliver):
+    self.name = name
+    self.interval = interval
+    self.deliver = deliver
+    self.active = True
+
+
+class ElapsedTicker:
+  """Sends elapsed times of running stopwatches to all watchers.
+
+  A single thread serves every watcher from a heap ordered by the time of
+  its next update, so the cost is one heap operation per update instead of
+  a thread or timer per watcher. Start, lap and stop events are forwarded
+  to the watchers of the stopwatch as they happen.
+  """
+
+  _STATE_EVENTS = {
+      measurement_log.START: stopwatch_proto.ElapsedEvent.KIND_STARTED,
+      measurement_log.LAP: stopwatch_proto.ElapsedEvent.KIND_LAP,
+      measurement_log.STOP: stopwatch_proto.ElapsedEvent.KIND_STOPPED,
+  }
+
+  def __init__(self, registry):
+    self._registry = registry
+    self._condition = threading.Condition()
+    # Entries of (due time, tie breaker, watcher).
+    self._heap = []
+    self._counter = itertools.count()
+    self._watchers = {}
+    self._thread = None
+    registry.add_listener(self._on_change)
+
+  def add(self, name, interval, deliver):
+    """Registers a watcher and sends it the current state."""
+    interval = max(interval or _DEFAULT_WATCH_INTERVAL_SECONDS, _MIN_WATCH_INTERVAL_SECONDS)
+    watcher = _Watcher(name, interval, deliver)
+    now = time.monotonic()
+    elapsed = self._registry.elapsed(name, now)
+    deliver(stopwatch_proto.ElapsedEvent(
+        kind=stopwatch_proto.ElapsedEvent.KIND_TICK,
+        running=elapsed is not None,
+        time_elapsed=elapsed or 0.0,
+    ))
+    with self._condition:
+        self._watchers.setdefault(name, set()).add(watcher)
+        heapq.heappush(self._heap, (now + interval, next(self._counter), watcher))
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name='stopwatch_ticker', daemon=True
+            )
+            self._thread.start()
+        self._condition.notify()
+    return watcher
+
+  def remove(self, watcher):
+    with self._condition:
+        watcher.active = False
+        watchers = self._watchers.get(watcher.name)
+        if watchers is not None:
+            watchers.discard(watcher)
+            if not watchers:
+                del self._watchers[watcher.name]
+    # Its heap entry is dropped when it comes due.
+
+  def _on_change(self, kind, name, value):
+    with self._condition:
+        watchers = list(self._watchers.get(name, ()))
+    if not watchers:
+        return
+    event = stopwatch_proto.ElapsedEvent(
+        kind=self._STATE_EVENTS[kind],
+        running=kind != measurement_log.STOP,
+        time_elapsed=value if kind == measurement_log.STOP else 0.0,
+    )
+    if kind == measurement_log.LAP:
+        event.time_elapsed = self._registry.elapsed(name, time.monotonic()) or 0.0
+        event.lap_time = value
+    for watcher in watchers:
+        watcher.deliver(event)
+
+  def _run(self):
+    while True:
+        with self._condition:
+            while not self._heap or self._heap[0][0] > time.monotonic():
+                timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                self._condition.wait(timeout)
+            due = []
+            now = time.monotonic()
+            while self._heap and self._heap[0][0] <= now:
+                due_time, _, watcher = heapq.heappop(self._heap)
+                if not watcher.active:
+                    continue
+                due.append(watcher)
+                # Skip updates rather than bunching them after a stall.
+                next_time = max(due_time + watcher.interval, now)
+                heapq.heappush(self._heap, (next_time, next(self._counter), watcher))
+        for watcher in due:
+            elapsed = self._registry.elapsed(watcher.name, now)
+            if elapsed is None:
+                continue
+            watcher.deliver(stopwatch_proto.ElapsedEvent(
+                kind=stopwatch_proto.ElapsedEvent.KIND_TICK,
+                running=True,
+                time_elapsed=elapsed,
+            ))
+
+
+class StopwatchServicer(stopwatch_grpc.StopwatchServiceServicer):
+
+  def __init__(self, log=None, max_watchers=None):
+    """Creates the servicer.
+
+    Args:
+      log: Optional MeasurementLog that keeps the measurements.
+      max_watchers: Maximum number of concurrent WatchElapsed streams. Further
+        streams fail with RESOURCE_EXHAUSTED. None means no limit.
+    """
+    self._registry = StopwatchRegistry(log=log)
+    self.ticker = ElapsedTicker(self._registry)
+    self._watch_slots = (
+        None if max_watchers is None else threading.Semaphore(max_watchers)
+    )
+
+  @property
+  def log(self):
+    return self._registry.log
 
   def Start(
       self,
@@ -26,14 +495,16 @@ class StopwatchServicer(stopwatch_grpc.StopwatchServiceServicer):
       context: grpc.ServicerContext,
   ) -> stopwatch_proto.StartResponse:
     response = stopwatch_proto.StartResponse()
-    if self._start_time is None:
-        self._start_time = time.monotonic()
-        logging.info(f"Starting stopwatch {self._start_time}")
-        response.success = True
-    else:
+    now = time.monotonic()
+    try:
+        self._registry.start(request.name, now)
+    except StopwatchError as e:
         response.success = False
-        response.error = "Cannot start stopwatch because it is already started"
+        response.error = str(e)
         logging.error(response.error)
+        return response
+    logging.info(f"Starting stopwatch {request.name!r} at {now}")
+    response.success = True
     return response
 
   def Stop(
@@ -42,51 +513,335 @@ class StopwatchServicer(stopwatch_grpc.StopwatchServiceServicer):
       context: grpc.ServicerContext,
   ) -> stopwatch_proto.StopResponse:
     response = stopwatch_proto.StopResponse()
-    if self._start_time is not None:
-        response.time_elapsed = time.monotonic() - self._start_time
-        self._start_time = None
-        logging.info(f"Stopping stopwatch {response.time_elapsed}")
-        response.success = True
-    else:
+    try:
+        time_elapsed, lap_times = self._registry.stop(request.name, time.monotonic())
+    except StopwatchError as e:
+        response.success = False
+        response.error = str(e)
+        logging.error(response.error)
+        return response
+    response.time_elapsed = time_elapsed
+    response.lap_times.extend(lap_times)
+    logging.info(f"Stopping stopwatch {request.name!r} {response.time_elapsed}")
+    response.success = True
+    return response
+
+  def StartMany(
+      self,
+      request: stopwatch_proto.StartManyRequest,
+      context: grpc.ServicerContext,
+  ) -> stopwatch_proto.StartManyResponse:
+    response = stopwatch_proto.StartManyResponse()
+    now = time.monotonic()
+    errors = self._registry.start_many(list(request.names), now)
+    for name, error in zip(request.names, errors):
+        if error is None:
+            response.results.add(success=True)
+        else:
+            response.results.add(success=False, error=error)
+            logging.error(error)
+    logging.info(f"Starting {len(request.names)} stopwatch(es) at {now}")
+    return response
+
+  def StopMany(
+      self,
+      request: stopwatch_proto.StopManyRequest,
+      context: grpc.ServicerContext,
+  ) -> stopwatch_proto.StopManyResponse:
+    response = stopwatch_proto.StopManyResponse()
+    results = self._registry.stop_many(list(request.names), time.monotonic())
+    for time_elapsed, lap_times, error in results:
+        if error is None:
+            response.results.add(
+                success=True, time_elapsed=time_elapsed, lap_times=lap_times
+            )
+        else:
+            response.results.add(success=False, error=error)
+            logging.error(error)
+    logging.info(f"Stopping {len(request.names)} stopwatch(es)")
+    return response
+
+  def Lap(
+      self,
+      request: stopwatch_proto.LapRequest,
+      context: grpc.ServicerContext,
+  ) -> stopwatch_proto.LapResponse:
+    response = stopwatch_proto.LapResponse()
+    try:
+        lap_time, time_elapsed = self._registry.lap(request.name, time.monotonic())
+    except StopwatchError as e:
         response.success = False
-        response.error = "Cannot stop stopwatch because it is not started"
+        response.error = str(e)
         logging.error(response.error)
+        return response
+    response.lap_time = lap_time
+    response.time_elapsed = time_elapsed
+    logging.info(f"Lap on stopwatch {request.name!r} {response.lap_time}")
+    response.success = True
+    return response
+
+  def GetStats(
+      self,
+      request: stopwatch_proto.GetStatsRequest,
+      context: grpc.ServicerContext,
+  ) -> stopwatch_proto.GetStatsResponse:
+    response = stopwatch_proto.GetStatsResponse()
+    self._registry.get_stats(
+        request.name, request.window_seconds, time.monotonic(), response
+    )
     return response
 
+  def ExportMeasurements(
+      self,
+      request: stopwatch_proto.ExportMeasurementsRequest,
+      context: grpc.ServicerContext,
+  ):
+    if self.log is None:
+        context.abort(
+            grpc.StatusCode.FAILED_PRECONDITION, "The measurement log is disabled"
+        )
+    yield from export_measurements(self.log, request)
+
+  def WatchElapsed(
+      self,
+      request: stopwatch_proto.WatchElapsedRequest,
+      context: grpc.ServicerContext,
+  ):
+    # On the threaded server this generator holds a worker until the client
+    # cancels, which is why streams are capped there. AsyncStopwatchServicer
+    # serves them without a thread each.
+    if self._watch_slots is not None and not self._watch_slots.acquire(
+        blocking=False
+    ):
+        context.abort(
+            grpc.StatusCode.RESOURCE_EXHAUSTED,
+            "Too many WatchElapsed streams; use the asyncio server mode to"
+            " serve more",
+        )
+    try:
+        yield from self._watch_elapsed(request, context)
+    finally:
+        if self._watch_slots is not None:
+            self._watch_slots.release()
+
+  def _watch_elapsed(self, request, context):
+    events = queue.Queue(maxsize=_MAX_QUEUED_WATCH_EVENTS)
+
+    def deliver(event):
+        try:
+            events.put_nowait(event)
+        except queue.Full:
+            pass
+
+    done = threading.Event()
+
+    def on_done():
+        done.set()
+        # Wakes up the loop below if it is waiting for an event.
+        deliver(None)
+
+    watcher = self.ticker.add(request.name, request.interval_seconds, deliver)
+    context.add_callback(on_done)
+    try:
+        while not done.is_set():
+            event = events.get()
+            if event is None:
+                return
+            yield event
+    finally:
+        self.ticker.remove(watcher)
+
+
+def export_measurements(log, request):
+    """Yields the records of `log` selected by `request` as Measurements."""
+    names = set(request.names)
+    limit = request.max_records or None
+    count = 0
+    for record in log.read(after_sequence=request.after_sequence):
+        if names and record.name not in names:
+            continue
+        yield stopwatch_proto.Measurement(
+            sequence=record.sequence,
+            kind=record.kind,
+            name=record.name,
+            wall_time=record.wall_time,
+            value=record.value,
+        )
+        count += 1
+        if limit is not None and count >= limit:
+            return
+
+
+class AsyncStopwatchServicer(stopwatch_grpc.StopwatchServiceServicer):
+  """Serves the RPCs of a StopwatchServicer on an asyncio event loop.
+
+  Registry operations only hold a stripe lock for a few dict operations, so
+  they run directly on the event loop.
+  """
+
+  def __init__(self, servicer=None):
+    self._servicer = servicer or StopwatchServicer()
+
+  async def Start(self, request, context):
+    return self._servicer.Start(request, context)
+
+  async def Stop(self, request, context):
+    return self._servicer.Stop(request, context)
+
+  async def StartMany(self, request, context):
+    return self._servicer.StartMany(request, context)
+
+  async def StopMany(self, request, context):
+    return self._servicer.StopMany(request, context)
+
+  async def Lap(self, request, context):
+    return self._servicer.Lap(request, context)
+
+  async def GetStats(self, request, context):
+    return self._servicer.GetStats(request, context)
+
+  async def ExportMeasurements(self, request, context):
+    if self._servicer.log is None:
+        await context.abort(
+            grpc.StatusCode.FAILED_PRECONDITION, "The measurement log is disabled"
+        )
+    for measurement in export_measurements(self._servicer.log, request):
+        yield measurement
+
+  async def WatchElapsed(self, request, context):
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue(maxsize=_MAX_QUEUED_WATCH_EVENTS)
+
+    def put(event):
+        if not events.full():
+            events.put_nowait(event)
+
+    watcher = self._servicer.ticker.add(
+        request.name,
+        request.interval_seconds,
+        lambda event: loop.call_soon_threadsafe(put, event),
+    )
+    try:
+        while True:
+            yield await events.get()
+    finally:
+        self._servicer.ticker.remove(watcher)
+
 
 def get_runtime_context():
     with open('/etc/intrinsic/runtime_config.pb', 'rb') as fin:
         return runtime_context_pb2.RuntimeContext.FromString(fin.read())
 
 
-def make_grpc_server(port):
+def get_config(context):
+    config = stopwatch_proto.StopwatchServiceConfig()
+    # Without a config, e.g. in an older deployment, the defaults apply.
+    context.config.Unpack(config)
+    return config
+
+
+def _add_port(server, port):
+    endpoint = f'[::]:{port}'
+    added_port = server.add_insecure_port(endpoint)
+    if added_port != port:
+        raise RuntimeError(f'Failed to use port {port}')
+
+
+def open_measurement_log(config):
+    if not config.measurement_log_path:
+        return None
+    capacity = config.measurement_log_capacity or _DEFAULT_MEASUREMENT_LOG_CAPACITY
+    logging.info(
+        f"Using measurement log {config.measurement_log_path} of {capacity} records"
+    )
+    return measurement_log.MeasurementLog(config.measurement_log_path, capacity)
+
+
+def make_grpc_server(port, max_concurrent_rpcs=None, max_workers=None, log=None):
+    # The ThreadPoolExecutor default.
+    max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
     server = grpc.server(
-        ThreadPoolExecutor(),
+        ThreadPoolExecutor(max_workers=max_workers),
         options=(('grpc.so_reuseport', 0),),
+        maximum_concurrent_rpcs=max_concurrent_rpcs,
     )
 
+    # Every stream holds a worker, so only some of them may serve streams.
+    max_watchers = int(max_workers * _WATCH_WORKER_SHARE)
     stopwatch_grpc.add_StopwatchServiceServicer_to_server(
-        StopwatchServicer(), server
+        StopwatchServicer(log, max_watchers=max_watchers), server
     )
-    endpoint = f'[::]:{port}'
-    added_port = server.add_insecure_port(endpoint)
-    if added_port != port:
-        raise RuntimeError(f'Failed to use port {port}')
+    _add_port(server, port)
     return server
 
 
-def main():
-    context = get_runtime_context()
+def make_aio_grpc_server(port, max_concurrent_rpcs=None, log=None):
+    """Returns a grpc.aio server; must be called with an event loop running."""
+    server = grpc.aio.server(
+        options=(('grpc.so_reuseport', 0),),
+        maximum_concurrent_rpcs=max_concurrent_rpcs,
+    )
 
-    logging.info(f"Starting Stopwatch service on port: {context.port}")
+    stopwatch_grpc.add_StopwatchServiceServicer_to_server(
+        AsyncStopwatchServicer(StopwatchServicer(log)), server
+    )
+    _add_port(server, port)
+    return server
+
+
+def serve_threaded(port, config):
+    server = make_grpc_server(
+        port,
+        config.max_concurrent_rpcs or None,
+        config.max_workers or None,
+        open_measurement_log(config),
+    )
+    grace = config.shutdown_grace_seconds or _DEFAULT_SHUTDOWN_GRACE_SECONDS
 
-    server = make_grpc_server(context.port)
+    def handle_sigterm(signum, frame):
+        logging.info(f'Received SIGTERM, stopping within {grace} seconds')
+        server.stop(grace)
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
     server.start()
+    return server
+
+
+async def serve_asyncio(port, config):
+    server = make_aio_grpc_server(
+        port, config.max_concurrent_rpcs or None, open_measurement_log(config)
+    )
+    grace = config.shutdown_grace_seconds or _DEFAULT_SHUTDOWN_GRACE_SECONDS
 
+    def handle_sigterm():
+        logging.info(f'Received SIGTERM, stopping within {grace} seconds')
+        asyncio.ensure_future(server.stop(grace))
+
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, handle_sigterm)
+    await server.start()
+    _log_listening(port)
+    await server.wait_for_termination()
+
+
+def _log_listening(port):
     logging.info('--------------------------------')
-    logging.info(f'-- Stopwatch service listening on port {context.port}')
+    logging.info(f'-- Stopwatch service listening on port {port}')
     logging.info('--------------------------------')
 
+
+def main():
+    context = get_runtime_context()
+    config = get_config(context)
+    mode = stopwatch_proto.StopwatchServiceConfig.ServerMode.Name(config.server_mode)
+
+    logging.info(f"Starting Stopwatch service on port: {context.port} ({mode})")
+
+    if config.server_mode == stopwatch_proto.StopwatchServiceConfig.SERVER_MODE_ASYNCIO:
+        asyncio.run(serve_asyncio(context.port, config))
+        return
+
+    server = serve_threaded(context.port, config)
+    _log_listening(context.port)
     server.wait_for_termination()
 
 
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""Load generator comparing the threaded and asyncio stopwatch servers.
+
+For every server mode a server is started in a child process and driven by
+--concurrency clients, each running Start/Stop pairs on its own stopwatch
+for --duration seconds. Requests per second and latency percentiles are
+printed per mode.
+
+Example:
+  bazel run //services/stopwatch:stopwatch_service_benchmark -- \\
+      --concurrency=64 --duration=10 --max_concurrent_rpcs=32
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import socket
+import sys
+import time
+
+import grpc
+
+from services.stopwatch import stopwatch_service
+from services.stopwatch import stopwatch_service_pb2 as stopwatch_proto
+from services.stopwatch import stopwatch_service_pb2_grpc as stopwatch_grpc
+
+_MODES = {
+    'threaded': stopwatch_proto.StopwatchServiceConfig.SERVER_MODE_THREADED,
+    'asyncio': stopwatch_proto.StopwatchServiceConfig.SERVER_MODE_ASYNCIO,
+}
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET6, socket.SOCK_STREAM) as s:
+        s.bind(('::', 0))
+        return s.getsockname()[1]
+
+
+def _serve(port, config_bytes):
+    # Per-RPC logging would dominate the measurement.
+    logging.basicConfig(stream=sys.stderr, level=logging.WARNING)
+    config = stopwatch_proto.StopwatchServiceConfig.FromString(config_bytes)
+    if config.server_mode == stopwatch_proto.StopwatchServiceConfig.SERVER_MODE_ASYNCIO:
+        asyncio.run(stopwatch_service.serve_asyncio(port, config))
+    else:
+        stopwatch_service.serve_threaded(port, config).wait_for_termination()
+
+
+async def _client(stub, name, deadline, latencies, errors):
+    while time.monotonic() < deadline:
+        for call, request in (
+            (stub.Start, stopwatch_proto.StartRequest(name=name)),
+            (stub.Stop, stopwatch_proto.StopRequest(name=name)),
+        ):
+            start = time.perf_counter()
+            try:
+                await call(request)
+            except grpc.aio.AioRpcError as e:
+                errors[e.code()] = errors.get(e.code(), 0) + 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+
+async def _run_load(port, concurrency, duration):
+    latencies = []
+    errors = {}
+    async with grpc.aio.insecure_channel(f'localhost:{port}') as channel:
+        await asyncio.wait_for(channel.channel_ready(), timeout=10)
+        stub = stopwatch_grpc.StopwatchServiceStub(channel)
+        start = time.monotonic()
+        deadline = start + duration
+        await asyncio.gather(*(
+            _client(stub, f'client_{i}', deadline, latencies, errors)
+            for i in range(concurrency)
+        ))
+        elapsed = time.monotonic() - start
+    return latencies, errors, elapsed
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return float('nan')
+    index = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return sorted_values[index]
+
+
+def _benchmark(mode, args):
+    config = stopwatch_proto.StopwatchServiceConfig(
+        server_mode=_MODES[mode],
+        max_concurrent_rpcs=args.max_concurrent_rpcs,
+        max_workers=args.max_workers,
+    )
+    port = _free_port()
+    server = multiprocessing.Process(
+        target=_serve, args=(port, config.SerializeToString()), daemon=True
+    )
+    server.start()
+    try:
+        latencies, errors, elapsed = asyncio.run(
+            _run_load(port, args.concurrency, args.duration)
+        )
+    finally:
+        server.terminate()
+        server.join()
+
+    latencies.sort()
+    failed = ' '.join(f'{code.name}={count}' for code, count in errors.items())
+    print(
+        f'{mode:<9} {len(latencies) / elapsed:>10.0f}'
+        f' {_percentile(latencies, 0.5) * 1e3:>9.2f}'
+        f' {_percentile(latencies, 0.99) * 1e3:>9.2f}'
+        f' {_percentile(latencies, 0.999) * 1e3:>9.2f}'
+        f'  {failed or "-"}'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', default='threaded,asyncio',
+                        help='Comma-separated server modes to compare.')
+    parser.add_argument('--concurrency', type=int, default=32,
+                        help='Number of concurrent clients.')
+    parser.add_argument('--duration', type=float, default=5.0,
+                        help='Seconds of load per mode.')
+    parser.add_argument('--max_concurrent_rpcs', type=int, default=0,
+                        help='Server limit on in-flight RPCs; 0 is unlimited.')
+    parser.add_argument('--max_workers', type=int, default=0,
+                        help='Threads of the threaded server; 0 is the default.')
+    args = parser.parse_args()
+
+    print(f'{"mode":<9} {"rps":>10} {"p50 ms":>9} {"p99 ms":>9} {"p99.9 ms":>9}  errors')
+    for mode in args.modes.split(','):
+        _benchmark(mode, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,358 @@
+import asyncio
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+import grpc
+
+from services.stopwatch import measurement_log
+from services.stopwatch import stopwatch_service
+from services.stopwatch import stopwatch_service_pb2 as stopwatch_proto
+from services.stopwatch import stopwatch_service_pb2_grpc as stopwatch_grpc
+
+
+class StopwatchServicerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.servicer = stopwatch_service.StopwatchServicer()
+
+    def test_named_stopwatches_are_independent(self):
+        self.assertTrue(self.servicer.Start(stopwatch_proto.StartRequest(name="a"), None).success)
+        self.assertTrue(self.servicer.Start(stopwatch_proto.StartRequest(name="b"), None).success)
+        self.assertTrue(self.servicer.Start(stopwatch_proto.StartRequest(), None).success)
+
+        self.assertTrue(self.servicer.Stop(stopwatch_proto.StopRequest(name="a"), None).success)
+        self.assertFalse(self.servicer.Stop(stopwatch_proto.StopRequest(name="a"), None).success)
+        self.assertTrue(self.servicer.Stop(stopwatch_proto.StopRequest(name="b"), None).success)
+        self.assertTrue(self.servicer.Stop(stopwatch_proto.StopRequest(), None).success)
+
+    def test_start_twice_fails(self):
+        self.assertTrue(self.servicer.Start(stopwatch_proto.StartRequest(name="a"), None).success)
+        response = self.servicer.Start(stopwatch_proto.StartRequest(name="a"), None)
+        self.assertFalse(response.success)
+        self.assertIn("already started", response.error)
+
+    def test_laps(self):
+        self.assertFalse(self.servicer.Lap(stopwatch_proto.LapRequest(name="a"), None).success)
+
+        self.servicer.Start(stopwatch_proto.StartRequest(name="a"), None)
+        first = self.servicer.Lap(stopwatch_proto.LapRequest(name="a"), None)
+        second = self.servicer.Lap(stopwatch_proto.LapRequest(name="a"), None)
+        self.assertTrue(first.success)
+        self.assertTrue(second.success)
+        self.assertAlmostEqual(first.lap_time + second.lap_time, second.time_elapsed)
+
+        response = self.servicer.Stop(stopwatch_proto.StopRequest(name="a"), None)
+        self.assertEqual([first.lap_time, second.lap_time], list(response.lap_times))
+        self.assertGreaterEqual(response.time_elapsed, second.time_elapsed)
+
+    def test_start_many_and_stop_many(self):
+        self.servicer.Start(stopwatch_proto.StartRequest(name="b"), None)
+
+        started = self.servicer.StartMany(
+            stopwatch_proto.StartManyRequest(names=["a", "b", "c"]), None)
+        self.assertEqual([True, False, True], [r.success for r in started.results])
+
+        stopped = self.servicer.StopMany(
+            stopwatch_proto.StopManyRequest(names=["a", "c", "d"]), None)
+        self.assertEqual([True, True, False], [r.success for r in stopped.results])
+        # Both were started and stopped with one shared timestamp.
+        self.assertEqual(stopped.results[0].time_elapsed, stopped.results[1].time_elapsed)
+        self.assertIn("not started", stopped.results[2].error)
+
+    def test_stats_percentiles(self):
+        stats = stopwatch_service.CycleTimeStats()
+        for i in range(1, 1001):
+            stats.record(i / 1000, now=100.0)
+
+        response = stopwatch_proto.GetStatsResponse()
+        stats.summarize(0, 100.0, response)
+        self.assertEqual(1000, response.count)
+        self.assertAlmostEqual(0.5005, response.mean)
+        self.assertAlmostEqual(0.001, response.min)
+        self.assertAlmostEqual(1.0, response.max)
+        self.assertAlmostEqual(0.5, response.p50, delta=0.5 * 0.03)
+        self.assertAlmostEqual(0.9, response.p90, delta=0.9 * 0.03)
+        self.assertAlmostEqual(0.99, response.p99, delta=0.99 * 0.03)
+
+    def test_stats_window(self):
+        stats = stopwatch_service.CycleTimeStats()
+        stats.record(5.0, now=0.0)
+        stats.record(1.0, now=100.0)
+
+        recent = stopwatch_proto.GetStatsResponse()
+        stats.summarize(30, 105.0, recent)
+        self.assertEqual(1, recent.count)
+        self.assertEqual(1.0, recent.max)
+        self.assertEqual(30, recent.window_seconds)
+
+        everything = stopwatch_proto.GetStatsResponse()
+        stats.summarize(0, 105.0, everything)
+        self.assertEqual(2, everything.count)
+
+        # Measurements older than the retention are dropped.
+        expired = stopwatch_proto.GetStatsResponse()
+        stats.summarize(0, 4000.0, expired)
+        self.assertEqual(0, expired.count)
+
+    def test_get_stats_counts_stops(self):
+        for _ in range(3):
+            self.servicer.Start(stopwatch_proto.StartRequest(name="a"), None)
+            self.servicer.Stop(stopwatch_proto.StopRequest(name="a"), None)
+
+        response = self.servicer.GetStats(stopwatch_proto.GetStatsRequest(name="a"), None)
+        self.assertEqual(3, response.count)
+        unknown = self.servicer.GetStats(stopwatch_proto.GetStatsRequest(name="b"), None)
+        self.assertEqual(0, unknown.count)
+
+    def test_watch_elapsed(self):
+        events = []
+        received = threading.Event()
+
+        def deliver(event):
+            events.append(event)
+            if len(events) >= 6:
+                received.set()
+
+        watcher = self.servicer.ticker.add("a", 0.01, deliver)
+        self.servicer.Start(stopwatch_proto.StartRequest(name="a"), None)
+        self.assertTrue(received.wait(timeout=5))
+        self.servicer.Stop(stopwatch_proto.StopRequest(name="a"), None)
+        self.servicer.ticker.remove(watcher)
+
+        kinds = [event.kind for event in events]
+        self.assertEqual(stopwatch_proto.ElapsedEvent.KIND_TICK, kinds[0])
+        self.assertFalse(events[0].running)
+        self.assertEqual(stopwatch_proto.ElapsedEvent.KIND_STARTED, kinds[1])
+        self.assertEqual(stopwatch_proto.ElapsedEvent.KIND_STOPPED, kinds[-1])
+        ticks = [e.time_elapsed for e in events[2:-1]]
+        self.assertGreaterEqual(len(ticks), 4)
+        self.assertEqual(sorted(ticks), ticks)
+
+    def test_concurrent_rpcs(self):
+        num_threads = 32
+        rounds = 200
+        errors = []
+        shared_starts = []
+        barrier = threading.Barrier(num_threads)
+
+        def run(index):
+            name = f"station_{index}"
+            barrier.wait()
+            # Exactly one thread may start the shared stopwatch.
+            if self.servicer.Start(stopwatch_proto.StartRequest(name="shared"), None).success:
+                shared_starts.append(index)
+            for _ in range(rounds):
+                if not self.servicer.Start(stopwatch_proto.StartRequest(name=name), None).success:
+                    errors.append(f"start {name}")
+                self.servicer.Lap(stopwatch_proto.LapRequest(name=name), None)
+                response = self.servicer.Stop(stopwatch_proto.StopRequest(name=name), None)
+                if not response.success or len(response.lap_times) != 1:
+                    errors.append(f"stop {name}")
+
+        def run_batches(index):
+            names = [f"batch_{index}_{i}" for i in range(8)]
+            barrier.wait()
+            for _ in range(rounds):
+                started = self.servicer.StartMany(
+                    stopwatch_proto.StartManyRequest(names=names), None)
+                stopped = self.servicer.StopMany(
+                    stopwatch_proto.StopManyRequest(names=list(reversed(names))), None)
+                if not all(r.success for r in list(started.results) + list(stopped.results)):
+                    errors.append(f"batch {index}")
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(num_threads // 2)]
+        threads += [
+            threading.Thread(target=run_batches, args=(i,))
+            for i in range(num_threads - len(threads))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([], errors)
+        self.assertEqual(1, len(shared_starts))
+        self.assertTrue(self.servicer.Stop(stopwatch_proto.StopRequest(name="shared"), None).success)
+
+
+class MeasurementLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "measurements.log")
+
+    def test_running_stopwatch_survives_restart(self):
+        log = measurement_log.MeasurementLog(self.path, capacity=16)
+        servicer = stopwatch_service.StopwatchServicer(log)
+        servicer.Start(stopwatch_proto.StartRequest(name="a"), None)
+        servicer.Lap(stopwatch_proto.LapRequest(name="a"), None)
+        servicer.Start(stopwatch_proto.StartRequest(name="b"), None)
+        servicer.Stop(stopwatch_proto.StopRequest(name="b"), None)
+        log.close()
+
+        restarted = stopwatch_service.StopwatchServicer(
+            measurement_log.MeasurementLog(self.path, capacity=16))
+        self.assertFalse(restarted.Start(stopwatch_proto.StartRequest(name="a"), None).success)
+        self.assertFalse(restarted.Stop(stopwatch_proto.StopRequest(name="b"), None).success)
+        stop = restarted.Stop(stopwatch_proto.StopRequest(name="a"), None)
+        self.assertTrue(stop.success)
+        self.assertEqual(1, len(stop.lap_times))
+        stats = restarted.GetStats(stopwatch_proto.GetStatsRequest(name="b"), None)
+        self.assertEqual(1, stats.count)
+
+    def test_ring_keeps_newest_records(self):
+        log = measurement_log.MeasurementLog(self.path, capacity=4)
+        for i in range(10):
+            log.append(measurement_log.START, f"s{i}")
+        log.close()
+
+        reopened = measurement_log.MeasurementLog(self.path, capacity=4)
+        self.assertEqual([7, 8, 9, 10], [r.sequence for r in reopened.records()])
+        self.assertEqual(11, reopened.append(measurement_log.STOP, "s9", 1.0))
+
+    def test_corrupted_record_is_ignored(self):
+        log = measurement_log.MeasurementLog(self.path, capacity=4)
+        log.append(measurement_log.START, "a")
+        log.append(measurement_log.START, "b")
+        log.close()
+        with open(self.path, "r+b") as f:
+            # Flip a byte in the name of the second record.
+            f.seek(measurement_log.RECORD_SIZE * 3 + 40)
+            f.write(b"x")
+
+        reopened = measurement_log.MeasurementLog(self.path, capacity=4)
+        self.assertEqual(["a"], [r.name for r in reopened.records()])
+
+    def test_export_pages_and_filters(self):
+        log = measurement_log.MeasurementLog(self.path, capacity=16)
+        servicer = stopwatch_service.StopwatchServicer(log)
+        for name in ("a", "b", "a"):
+            servicer.Start(stopwatch_proto.StartRequest(name=name), None)
+            servicer.Stop(stopwatch_proto.StopRequest(name=name), None)
+
+        first_page = list(servicer.ExportMeasurements(
+            stopwatch_proto.ExportMeasurementsRequest(names=["a"], max_records=3), None))
+        self.assertEqual(
+            [stopwatch_proto.Measurement.KIND_START, stopwatch_proto.Measurement.KIND_STOP,
+             stopwatch_proto.Measurement.KIND_START],
+            [m.kind for m in first_page])
+        second_page = list(servicer.ExportMeasurements(
+            stopwatch_proto.ExportMeasurementsRequest(
+                names=["a"], after_sequence=first_page[-1].sequence), None))
+        self.assertEqual([stopwatch_proto.Measurement.KIND_STOP], [m.kind for m in second_page])
+        self.assertTrue(all(m.name == "a" for m in first_page + second_page))
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET6, socket.SOCK_STREAM) as s:
+        s.bind(("::", 0))
+        return s.getsockname()[1]
+
+
+class ThreadedServerTest(unittest.TestCase):
+
+    def test_watchers_leave_workers_for_other_rpcs(self):
+        port = _free_port()
+        server = stopwatch_service.make_grpc_server(port, max_workers=4)
+        server.start()
+        self.addCleanup(server.stop, None)
+        channel = grpc.insecure_channel(f'localhost:{port}')
+        self.addCleanup(channel.close)
+        stub = stopwatch_grpc.StopwatchServiceStub(channel)
+        request = stopwatch_proto.WatchElapsedRequest(name="a", interval_seconds=0.01)
+
+        def watch():
+            call = stub.WatchElapsed(request, timeout=5)
+            self.addCleanup(call.cancel)
+            next(call)
+            return call
+
+        first = watch()
+        watch()
+        with self.assertRaises(grpc.RpcError) as e:
+            watch()
+        self.assertEqual(grpc.StatusCode.RESOURCE_EXHAUSTED, e.exception.code())
+
+        self.assertTrue(stub.Start(stopwatch_proto.StartRequest(name="a"), timeout=5).success)
+        self.assertTrue(stub.Stop(stopwatch_proto.StopRequest(name="a"), timeout=5).success)
+
+        # A closed stream frees its worker for the next one.
+        first.cancel()
+        deadline = time.monotonic() + 5
+        while True:
+            try:
+                watch()
+                break
+            except grpc.RpcError as e:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.01)
+
+
+class AsyncServerTest(unittest.TestCase):
+
+    def test_start_stop_over_aio_server(self):
+
+        async def run():
+            server = grpc.aio.server()
+            stopwatch_grpc.add_StopwatchServiceServicer_to_server(
+                stopwatch_service.AsyncStopwatchServicer(), server)
+            port = server.add_insecure_port('localhost:0')
+            await server.start()
+            try:
+                async with grpc.aio.insecure_channel(f'localhost:{port}') as channel:
+                    stub = stopwatch_grpc.StopwatchServiceStub(channel)
+                    start = await stub.Start(stopwatch_proto.StartRequest(name="a"))
+                    stop = await stub.Stop(stopwatch_proto.StopRequest(name="a"))
+            finally:
+                await server.stop(None)
+            return start, stop
+
+        start, stop = asyncio.run(run())
+        self.assertTrue(start.success)
+        self.assertTrue(stop.success)
+
+    def test_many_watchers_share_one_ticker(self):
+        servicer = stopwatch_service.StopwatchServicer()
+
+        async def run():
+            server = grpc.aio.server()
+            stopwatch_grpc.add_StopwatchServiceServicer_to_server(
+                stopwatch_service.AsyncStopwatchServicer(servicer), server)
+            port = server.add_insecure_port('localhost:0')
+            await server.start()
+            servicer.Start(stopwatch_proto.StartRequest(name="a"), None)
+            try:
+                async with grpc.aio.insecure_channel(f'localhost:{port}') as channel:
+                    stub = stopwatch_grpc.StopwatchServiceStub(channel)
+
+                    async def watch():
+                        call = stub.WatchElapsed(
+                            stopwatch_proto.WatchElapsedRequest(name="a", interval_seconds=0.01))
+                        events = []
+                        async for event in call:
+                            events.append(event)
+                            if len(events) == 3:
+                                call.cancel()
+                                break
+                        return events
+
+                    threads_before = threading.active_count()
+                    results = await asyncio.gather(*(watch() for _ in range(50)))
+                    threads_after = threading.active_count()
+            finally:
+                await server.stop(None)
+            return results, threads_after - threads_before
+
+        results, new_threads = asyncio.run(run())
+        for events in results:
+            self.assertEqual(3, len(events))
+            self.assertTrue(all(event.running for event in events))
+        self.assertLessEqual(new_threads, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,457 @@
+"""Process-wide cache of gRPC channels and clients shared by skills.
+
+A skill process serves many executions, and building a channel on every
+`execute` pays for name resolution and the TCP/HTTP2 handshake each time.
+The cache keeps one channel per (address, server instance, header) for the
+lifetime of the process:
+
+  stub = MyServiceStub(channel_cache.channel(resource_handle))
+
+Calls on cached channels are recorded in the process-wide `rpc_metrics`
+registry.
+
+Channels are created with keepalive enabled so that a dead connection is
+noticed while idle instead of on the next call. Every call is checked on
+completion, and a channel whose call failed with UNAVAILABLE is replaced on
+the next lookup. Entries unused for `idle_seconds` are dropped on the next
+lookup.
+
+Dropped channels and clients are not closed at once: another execution may
+still hold one and be in the middle of a call on it. They are kept in a
+retired list instead. A retired channel is closed on a later lookup once no
+calls are in flight on it. A retired client is closed once it has not been
+handed out for `idle_seconds`, since the cache cannot see its calls. `close`
+closes everything. Callers must therefore not keep a channel or client
+beyond the current execution.
+
+Clients that own their own connection, such as the ICON client, are cached
+by `client`, keyed by the factory that builds them and the same connection
+key. Call `invalidate` after such a client fails to drop it.
+
+`warm_up` connects a channel ahead of its first use, for example when a
+skill first sees a resource handle in `get_footprint`.
+
+On every reuse the cache logs the latency it saved: for a channel, the
+duration of its first successful call, which includes connection setup; for
+a client, the time its factory took.
+"""
+
+import dataclasses
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from absl import logging
+import grpc
+from intrinsic.util.grpc import connection
+from intrinsic.util.grpc import interceptor
+from skills.common import rpc_metrics
+
+_T = TypeVar("_T")
+
+DEFAULT_IDLE_SECONDS = 300.0
+
+DEFAULT_WARM_UP_SECONDS = 2.0
+
+# After a warm-up times out, further warm-ups of that channel return at once
+# for this long instead of waiting for a service that is likely still down.
+DEFAULT_WARM_UP_BACKOFF_SECONDS = 30.0
+
+_DEFAULT_HEADER = "x-resource-instance-name"
+
+KEEPALIVE_OPTIONS = (
+    ("grpc.keepalive_time_ms", 30000),
+    ("grpc.keepalive_timeout_ms", 10000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+)
+
+
+@dataclasses.dataclass
+class CacheStats:
+    """Counters of a `ChannelCache`."""
+
+    hits: int = 0
+    misses: int = 0
+    reconnects: int = 0
+    evictions: int = 0
+    # Dropped channels and clients closed so far.
+    closed: int = 0
+    # Sum of the setup time of every reused channel or client.
+    saved_seconds: float = 0.0
+
+
+def connection_key(resource_handle) -> Tuple[str, str, str]:
+    """Returns the (address, server instance, header) of a resource handle."""
+    grpc_info = resource_handle.connection_info.grpc
+    return (
+        grpc_info.address,
+        grpc_info.server_instance,
+        grpc_info.header or _DEFAULT_HEADER,
+    )
+
+
+class _HealthInterceptor(
+    grpc.UnaryUnaryClientInterceptor, grpc.UnaryStreamClientInterceptor
+):
+    """Reports the start, outcome and duration of every call to a channel entry."""
+
+    def __init__(
+        self,
+        on_start: Callable[[], None],
+        on_done: Callable[[grpc.StatusCode, float], None],
+    ):
+        self._on_start = on_start
+        self._on_done = on_done
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        return self._intercept(continuation, client_call_details, request)
+
+    def intercept_unary_stream(self, continuation, client_call_details, request):
+        return self._intercept(continuation, client_call_details, request)
+
+    def _intercept(self, continuation, client_call_details, request):
+        self._on_start()
+        start = time.monotonic()
+        try:
+            call = continuation(client_call_details, request)
+        except Exception:
+            # For example a call on a channel that was closed meanwhile.
+            self._on_done(grpc.StatusCode.UNKNOWN, time.monotonic() - start)
+            raise
+        call.add_done_callback(
+            lambda done: self._on_done(done.code(), time.monotonic() - start)
+        )
+        return call
+
+
+class _ChannelEntry:
+    """A cached channel and what is known about its health."""
+
+    def __init__(self, key, options, metrics, now):
+        address, server_instance, header = key
+        self.key = key
+        self.last_used = now
+        # Duration of the first successful call, which includes the setup.
+        self.setup_seconds = None
+        self.failed = False
+        self.warmed = False
+        # Clock time of the last warm-up that timed out.
+        self.warm_up_failed_at = None
+        # Calls are started and finish on gRPC threads.
+        self._in_flight_lock = threading.Lock()
+        self._in_flight = 0
+        self.raw_channel = grpc.insecure_channel(address, options=options)
+        connection_params = connection.ConnectionParams(
+            address, server_instance, header
+        )
+        self.channel = grpc.intercept_channel(
+            self.raw_channel,
+            interceptor.HeaderAdderInterceptor(connection_params.headers),
+            _HealthInterceptor(self._on_start, self._on_done),
+            rpc_metrics.TimingInterceptor(metrics),
+        )
+
+    def _on_start(self):
+        with self._in_flight_lock:
+            self._in_flight += 1
+
+    def _on_done(self, code, seconds):
+        with self._in_flight_lock:
+            self._in_flight -= 1
+        if code == grpc.StatusCode.UNAVAILABLE:
+            self.failed = True
+        elif code == grpc.StatusCode.OK and self.setup_seconds is None:
+            self.setup_seconds = seconds
+
+    def healthy(self) -> bool:
+        return not self.failed
+
+    def closable(self, now: float, idle_seconds: float) -> bool:
+        """Returns whether a retired entry can be closed."""
+        del now, idle_seconds  # Unused; calls in flight are known.
+        with self._in_flight_lock:
+            return self._in_flight == 0
+
+    def close(self):
+        self.raw_channel.close()
+
+
+def _close_client(client) -> None:
+    close = getattr(client, "close", None)
+    if callable(close):
+        close()
+
+
+class _ClientEntry:
+
+    def __init__(self, client, setup_seconds, now):
+        self.client = client
+        self.setup_seconds = setup_seconds
+        self.last_used = now
+
+    def closable(self, now: float, idle_seconds: float) -> bool:
+        """Returns whether a retired entry can be closed."""
+        return now - self.last_used > idle_seconds
+
+    def close(self):
+        _close_client(self.client)
+
+
+class ChannelCache:
+    """Thread-safe cache of channels and clients keyed by connection info."""
+
+    def __init__(
+        self,
+        idle_seconds: float = DEFAULT_IDLE_SECONDS,
+        warm_up_backoff_seconds: float = DEFAULT_WARM_UP_BACKOFF_SECONDS,
+        options=KEEPALIVE_OPTIONS,
+        clock: Callable[[], float] = time.monotonic,
+        metrics: Optional[rpc_metrics.MetricsRegistry] = None,
+    ):
+        self._idle_seconds = idle_seconds
+        self._warm_up_backoff_seconds = warm_up_backoff_seconds
+        self._options = list(options)
+        self._metrics = metrics
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._channels: Dict[Tuple[str, str, str], _ChannelEntry] = {}
+        self._clients: Dict[Tuple[Any, Tuple[str, str, str]], _ClientEntry] = {}
+        # Dropped entries that may still be in use.
+        self._retired: List[Any] = []
+        self.stats = CacheStats()
+
+    def channel(self, resource_handle) -> grpc.Channel:
+        """Returns a channel to the service behind `resource_handle`.
+
+        The channel adds the resource instance header to every call. It is
+        shared with other callers and must not be closed. Do not keep it
+        beyond the current execution: once the cache drops it, it is closed
+        as soon as no calls are in flight on it.
+        """
+        key = connection_key(resource_handle)
+        with self._lock:
+            entry, created = self._checkout(key)
+            if not created:
+                self._record_hit(key, entry.setup_seconds)
+            closable = self._sweep()
+        _close_all(closable)
+        return entry.channel
+
+    def warm_up(
+        self,
+        resource_handle,
+        probe: Optional[Callable[[grpc.Channel], Any]] = None,
+        timeout: float = DEFAULT_WARM_UP_SECONDS,
+    ) -> bool:
+        """Connects the channel for `resource_handle` ahead of its first use.
+
+        Waits up to `timeout` seconds for the connection and then calls
+        `probe` with the channel, if given, so that the first real call finds
+        a connection that has already carried a request. A probe that fails
+        with an RPC error is logged and ignored. Only the first warm-up of a
+        channel does any work. After a warm-up timed out, warm-ups of the
+        channel return False without waiting until the backoff has passed.
+
+        Returns:
+          Whether the channel is ready.
+        """
+        key = connection_key(resource_handle)
+        with self._lock:
+            entry, _ = self._checkout(key)
+            closable = self._sweep()
+            warm = entry.warmed
+            backing_off = (
+                entry.warm_up_failed_at is not None
+                and self._clock() - entry.warm_up_failed_at
+                < self._warm_up_backoff_seconds
+            )
+            if not warm and not backing_off:
+                entry.warmed = True
+        _close_all(closable)
+        if warm or backing_off:
+            return warm
+
+        start = time.monotonic()
+        ready = grpc.channel_ready_future(entry.raw_channel)
+        try:
+            ready.result(timeout=timeout)
+        except grpc.FutureTimeoutError:
+            # Stops watching the channel's connectivity.
+            ready.cancel()
+            with self._lock:
+                entry.warmed = False
+                entry.warm_up_failed_at = self._clock()
+            logging.warning(
+                "Channel to %s (%s) not ready after %.1f s, not warming it up"
+                " again for %.0f s",
+                key[0],
+                key[1],
+                timeout,
+                self._warm_up_backoff_seconds,
+            )
+            return False
+        if probe is not None:
+            try:
+                probe(entry.channel)
+            except grpc.RpcError as e:
+                logging.info("Warm-up call to %s failed: %s", key[0], e.code().name)
+        entry.setup_seconds = time.monotonic() - start
+        logging.info(
+            "Warmed up channel to %s (%s) in %.1f ms",
+            key[0],
+            key[1],
+            entry.setup_seconds * 1e3,
+        )
+        return True
+
+    def client(self, resource_handle, factory: Callable[[Any], _T]) -> _T:
+        """Returns `factory(resource_handle)`, built once per connection key."""
+        key = (factory, connection_key(resource_handle))
+        with self._lock:
+            now = self._clock()
+            self._evict_idle(now)
+            entry = self._clients.get(key)
+            if entry is not None:
+                self._record_hit(key[1], entry.setup_seconds)
+                entry.last_used = now
+            closable = self._sweep()
+        _close_all(closable)
+        if entry is not None:
+            return entry.client
+
+        # Building a client may block on the network; do it unlocked.
+        start = time.monotonic()
+        client = factory(resource_handle)
+        setup_seconds = time.monotonic() - start
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is None:
+                entry = _ClientEntry(client, setup_seconds, self._clock())
+                self._clients[key] = entry
+                self.stats.misses += 1
+        if entry.client is not client:
+            # Another caller built one meanwhile; nobody has seen this one.
+            _close_client(client)
+        return entry.client
+
+    def invalidate(self, resource_handle) -> None:
+        """Drops the channel and all clients for `resource_handle`.
+
+        Calls in flight on them are not cancelled; the next lookup connects
+        anew. The dropped channel and clients are retired.
+        """
+        key = connection_key(resource_handle)
+        with self._lock:
+            entry = self._channels.pop(key, None)
+            if entry is not None:
+                self._retired.append(entry)
+            for client_key in [k for k in self._clients if k[1] == key]:
+                self._retired.append(self._clients.pop(client_key))
+
+    def close(self) -> None:
+        """Closes every cached and retired channel and client."""
+        with self._lock:
+            entries = (
+                list(self._channels.values())
+                + list(self._clients.values())
+                + self._retired
+            )
+            self._channels.clear()
+            self._clients.clear()
+            self._retired = []
+        _close_all(entries)
+
+    def _checkout(self, key) -> Tuple[_ChannelEntry, bool]:
+        """Returns the healthy entry for `key` and whether it was created."""
+        now = self._clock()
+        self._evict_idle(now)
+        entry = self._channels.get(key)
+        if entry is not None and not entry.healthy():
+            logging.info("Reconnecting to %s (%s) after a failed call", key[0], key[1])
+            self._retired.append(self._channels.pop(key))
+            entry = None
+            self.stats.reconnects += 1
+        created = entry is None
+        if created:
+            entry = _ChannelEntry(key, self._options, self._metrics, now)
+            self._channels[key] = entry
+            self.stats.misses += 1
+        entry.last_used = now
+        return entry, created
+
+    def _record_hit(self, key, setup_seconds: Optional[float]) -> None:
+        self.stats.hits += 1
+        if setup_seconds is None:
+            # No call has succeeded yet, so there is nothing to report.
+            return
+        self.stats.saved_seconds += setup_seconds
+        logging.info(
+            "Reusing connection to %s (%s), saved %.1f ms of setup"
+            " (%.1f ms over %d reuses)",
+            key[0],
+            key[1],
+            setup_seconds * 1e3,
+            self.stats.saved_seconds * 1e3,
+            self.stats.hits,
+        )
+
+    def _evict_idle(self, now: float) -> None:
+        for entries in (self._channels, self._clients):
+            for key in [
+                k for k, e in entries.items()
+                if now - e.last_used > self._idle_seconds
+            ]:
+                self._retired.append(entries.pop(key))
+                self.stats.evictions += 1
+
+    def _sweep(self) -> List[Any]:
+        """Removes the retired entries that can be closed and returns them.
+
+        The caller closes them after releasing the lock.
+        """
+        now = self._clock()
+        closable = [
+            e for e in self._retired if e.closable(now, self._idle_seconds)
+        ]
+        if closable:
+            self._retired = [e for e in self._retired if e not in closable]
+            self.stats.closed += len(closable)
+        return closable
+
+
+def _close_all(entries) -> None:
+    for entry in entries:
+        entry.close()
+
+
+_cache = ChannelCache()
+
+
+def channel(resource_handle) -> grpc.Channel:
+    """Returns a shared channel to `resource_handle` from the process cache."""
+    return _cache.channel(resource_handle)
+
+
+def client(resource_handle, factory: Callable[[Any], _T]) -> _T:
+    """Returns a shared client for `resource_handle` from the process cache."""
+    return _cache.client(resource_handle, factory)
+
+
+def warm_up(
+    resource_handle,
+    probe: Optional[Callable[[grpc.Channel], Any]] = None,
+    timeout: float = DEFAULT_WARM_UP_SECONDS,
+) -> bool:
+    """Connects the process cache's channel to `resource_handle` early."""
+    return _cache.warm_up(resource_handle, probe, timeout)
+
+
+def invalidate(resource_handle) -> None:
+    """Drops everything the process cache holds for `resource_handle`."""
+    _cache.invalidate(resource_handle)
+
+
+def stats() -> CacheStats:
+    """Returns the counters of the process cache."""
+    return _cache.stats
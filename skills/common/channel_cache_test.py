@@ -0,0 +1,234 @@
+import socket
+import threading
+import time
+import unittest
+from concurrent import futures
+from unittest import mock
+
+import grpc
+
+from intrinsic.resources.proto import resource_handle_pb2
+from skills.common import channel_cache
+
+_METHOD = "/test.Echo/Echo"
+_STREAM_METHOD = "/test.Echo/Repeat"
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET6, socket.SOCK_STREAM) as s:
+        s.bind(("::", 0))
+        return s.getsockname()[1]
+
+
+def _make_handle(port, server_instance="echo"):
+    return resource_handle_pb2.ResourceHandle(
+        name=server_instance,
+        connection_info=resource_handle_pb2.ResourceConnectionInfo(
+            grpc=resource_handle_pb2.ResourceGrpcConnectionInfo(
+                address=f"localhost:{port}",
+                server_instance=server_instance,
+            )
+        ),
+    )
+
+
+def _echo(channel, payload=b"ping"):
+    return channel.unary_unary(_METHOD)(payload, timeout=5)
+
+
+def _assert_closed(test, channel):
+    with test.assertRaisesRegex(ValueError, "closed channel"):
+        _echo(channel)
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ChannelCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.instances = []
+        # Set by a test to hold "block" calls until it is set.
+        self.release = threading.Event()
+        self.release.set()
+
+        def echo(request, context):
+            self.instances.append(dict(context.invocation_metadata()).get(
+                "x-resource-instance-name"))
+            if request == b"block":
+                self.release.wait(5)
+            return request
+
+        def repeat(request, context):
+            for _ in range(3):
+                yield request
+
+        self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+        self.server.add_generic_rpc_handlers([
+            grpc.method_handlers_generic_handler("test.Echo", {
+                "Echo": grpc.unary_unary_rpc_method_handler(echo),
+                "Repeat": grpc.unary_stream_rpc_method_handler(repeat),
+            })
+        ])
+        self.port = _free_port()
+        self.server.add_insecure_port(f"[::]:{self.port}")
+        self.server.start()
+        self.clock = FakeClock()
+        self.cache = channel_cache.ChannelCache(idle_seconds=60, clock=self.clock)
+
+    def tearDown(self):
+        self.cache.close()
+        self.server.stop(grace=None)
+
+    def test_reuses_channel_per_connection_key(self):
+        handle = _make_handle(self.port)
+        channel = self.cache.channel(handle)
+        self.assertEqual(_echo(channel), b"ping")
+
+        with self.assertLogs() as log_output:
+            self.assertIs(self.cache.channel(_make_handle(self.port)), channel)
+        self.assertIn("Reusing connection", log_output.records[0].getMessage())
+        self.assertIsNot(
+            self.cache.channel(_make_handle(self.port, "other")), channel
+        )
+
+        self.assertEqual(self.cache.stats.hits, 1)
+        self.assertEqual(self.cache.stats.misses, 2)
+        self.assertGreater(self.cache.stats.saved_seconds, 0)
+
+    def sweep_until_closed(self, handle, count):
+        """Looks `handle` up until `count` dropped entries have been closed."""
+        # Calls finish on gRPC threads, shortly after the caller sees them.
+        deadline = time.monotonic() + 5
+        while self.cache.stats.closed < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+            self.cache.channel(handle)
+        self.assertEqual(self.cache.stats.closed, count)
+
+    def test_adds_server_instance_header(self):
+        _echo(self.cache.channel(_make_handle(self.port, "first")))
+        _echo(self.cache.channel(_make_handle(self.port, "second")))
+        self.assertEqual(self.instances, ["first", "second"])
+
+    def test_evicts_idle_channels(self):
+        handle = _make_handle(self.port)
+        channel = self.cache.channel(handle)
+        self.clock.now += 30
+        self.assertIs(self.cache.channel(handle), channel)
+
+        self.release.clear()
+        call = channel.unary_unary(_METHOD).future(b"block", timeout=5)
+        self.clock.now += 61
+        self.assertIsNot(self.cache.channel(handle), channel)
+        self.assertEqual(self.cache.stats.evictions, 1)
+        # The evicted channel stays open for the call still using it.
+        self.cache.channel(handle)
+        self.assertEqual(self.cache.stats.closed, 0)
+        self.release.set()
+        self.assertEqual(call.result(), b"block")
+
+        self.sweep_until_closed(handle, 1)
+        _assert_closed(self, channel)
+
+    def test_reconnects_after_unavailable(self):
+        handle = _make_handle(_free_port())
+        channel = self.cache.channel(handle)
+        with self.assertRaises(grpc.RpcError) as e:
+            _echo(channel)
+        self.assertEqual(e.exception.code(), grpc.StatusCode.UNAVAILABLE)
+
+        self.assertIsNot(self.cache.channel(handle), channel)
+        self.assertEqual(self.cache.stats.reconnects, 1)
+        self.sweep_until_closed(handle, 1)
+        _assert_closed(self, channel)
+
+    def test_reconnects_after_unavailable_stream(self):
+        handle = _make_handle(_free_port())
+        channel = self.cache.channel(handle)
+        with self.assertRaises(grpc.RpcError) as e:
+            list(channel.unary_stream(_STREAM_METHOD)(b"ping", timeout=5))
+        self.assertEqual(e.exception.code(), grpc.StatusCode.UNAVAILABLE)
+
+        self.sweep_until_closed(handle, 1)
+        self.assertEqual(self.cache.stats.reconnects, 1)
+
+    def test_warm_up_connects_once(self):
+        probed = []
+        handle = _make_handle(self.port)
+
+        def probe(channel):
+            probed.append(_echo(channel))
+
+        self.assertTrue(self.cache.warm_up(handle, probe))
+        self.assertTrue(self.cache.warm_up(handle, probe))
+        self.assertEqual(probed, [b"ping"])
+
+        with self.assertLogs() as log_output:
+            _echo(self.cache.channel(handle))
+        self.assertIn("Reusing connection", log_output.records[0].getMessage())
+
+    def test_warm_up_backs_off_after_timeout(self):
+        handle = _make_handle(_free_port())
+        with mock.patch.object(grpc, "channel_ready_future") as ready:
+            ready.return_value.result.side_effect = grpc.FutureTimeoutError
+            self.assertFalse(self.cache.warm_up(handle, timeout=0.1))
+            self.assertFalse(self.cache.warm_up(handle, timeout=0.1))
+            self.assertEqual(ready.call_count, 1)
+            ready.return_value.cancel.assert_called_once()
+
+            self.clock.now += channel_cache.DEFAULT_WARM_UP_BACKOFF_SECONDS + 1
+            self.assertFalse(self.cache.warm_up(handle, timeout=0.1))
+            self.assertEqual(ready.call_count, 2)
+
+    def test_caches_clients_until_invalidated(self):
+        built = []
+
+        def factory(handle):
+            built.append(handle.name)
+            return object()
+
+        handle = _make_handle(self.port)
+        client = self.cache.client(handle, factory)
+        self.assertIs(self.cache.client(handle, factory), client)
+        self.assertEqual(built, ["echo"])
+
+        self.cache.invalidate(handle)
+        self.assertIsNot(self.cache.client(handle, factory), client)
+        self.assertEqual(built, ["echo", "echo"])
+
+    def test_closes_invalidated_clients_once_idle(self):
+        handle = _make_handle(self.port)
+        client = self.cache.client(handle, lambda handle: mock.Mock())
+        self.cache.invalidate(handle)
+        self.cache.channel(handle)
+        client.close.assert_not_called()
+
+        self.clock.now += 61
+        self.cache.channel(handle)
+        client.close.assert_called_once()
+
+    def test_closes_client_that_lost_the_race(self):
+        handle = _make_handle(self.port)
+        clients = []
+
+        def factory(handle):
+            client = mock.Mock()
+            clients.append(client)
+            if len(clients) == 1:
+                # Another caller builds and caches its client meanwhile.
+                self.cache.client(handle, factory)
+            return client
+
+        self.assertIs(self.cache.client(handle, factory), clients[1])
+        clients[0].close.assert_called_once()
+        clients[1].close.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,325 @@
+"""Client-side RPC metrics for skills.
+
+`TimingInterceptor` records, per method, a latency histogram, the bytes sent
+and received and the count of each status code into a `MetricsRegistry`.
+Stack it on a channel next to the header interceptor:
+
+  channel = grpc.intercept_channel(
+      channel, header_interceptor, rpc_metrics.TimingInterceptor()
+  )
+
+Channels from `channel_cache` already carry it. The latency is measured from
+the call until its completion, so it is the time a skill waits on the network
+and the server. Use `span` to find out how much of a piece of skill code was
+spent waiting on RPCs:
+
+  with rpc_metrics.span() as rpc:
+      ...
+  logging.info("%.1f ms of this was in RPCs", rpc.seconds * 1e3)
+
+With a label, the span logs its total time split into RPC and other time when
+it closes, which is how skills report their `execute`:
+
+  with rpc_metrics.span("start_stopwatch"):
+      ...
+
+`dump_at_exit` logs the registry, and optionally writes it to a JSON file,
+when the skill process shuts down. Call it once at startup.
+"""
+
+import atexit
+import collections
+import contextlib
+import json
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+from absl import logging
+import grpc
+
+# Upper bounds of the latency buckets: 100 us doubling up to about 105 s. The
+# last bucket takes everything slower.
+BUCKET_BOUNDS = tuple(1e-4 * 2**i for i in range(21))
+
+
+class MethodStats:
+    """Metrics of one RPC method."""
+
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.sent_bytes = 0
+        self.received_bytes = 0
+        self.codes = collections.Counter()
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+
+    def record(self, code, seconds, sent_bytes, received_bytes):
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.sent_bytes += sent_bytes
+        self.received_bytes += received_bytes
+        self.codes[code.name] += 1
+        index = 0
+        while index < len(BUCKET_BOUNDS) and seconds > BUCKET_BOUNDS[index]:
+            index += 1
+        self.buckets[index] += 1
+
+    def percentile(self, q: float) -> float:
+        """Returns the upper bound of the bucket holding quantile `q`."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank and count:
+                if index == len(BUCKET_BOUNDS):
+                    return self.max_seconds
+                return min(BUCKET_BOUNDS[index], self.max_seconds)
+        return self.max_seconds
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total_seconds": self.total_seconds,
+            "mean_seconds": self.total_seconds / self.count if self.count else 0.0,
+            "p50_seconds": self.percentile(0.5),
+            "p99_seconds": self.percentile(0.99),
+            "max_seconds": self.max_seconds,
+            "sent_bytes": self.sent_bytes,
+            "received_bytes": self.received_bytes,
+            "codes": dict(self.codes),
+            "bucket_bounds_seconds": list(BUCKET_BOUNDS),
+            "buckets": list(self.buckets),
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe collection of `MethodStats` keyed by method name."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._methods: Dict[str, MethodStats] = {}
+
+    def record(self, method, code, seconds, sent_bytes=0, received_bytes=0):
+        with self._lock:
+            stats = self._methods.get(method)
+            if stats is None:
+                stats = self._methods[method] = MethodStats()
+            stats.record(code, seconds, sent_bytes, received_bytes)
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Returns the metrics of every method as plain dicts."""
+        with self._lock:
+            return {
+                method: stats.to_dict()
+                for method, stats in sorted(self._methods.items())
+            }
+
+    def reset(self):
+        with self._lock:
+            self._methods.clear()
+
+    def dump_to_log(self):
+        for method, stats in self.snapshot().items():
+            codes = " ".join(f"{k}={v}" for k, v in sorted(stats["codes"].items()))
+            logging.info(
+                "RPC %s: %d calls, %.1f ms total, p50 %.2f ms, p99 %.2f ms,"
+                " max %.2f ms, %d B sent, %d B received, %s",
+                method,
+                stats["count"],
+                stats["total_seconds"] * 1e3,
+                stats["p50_seconds"] * 1e3,
+                stats["p99_seconds"] * 1e3,
+                stats["max_seconds"] * 1e3,
+                stats["sent_bytes"],
+                stats["received_bytes"],
+                codes,
+            )
+
+    def dump_to_file(self, path):
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+
+_registry = MetricsRegistry()
+
+
+def registry() -> MetricsRegistry:
+    """Returns the process-wide registry used by default."""
+    return _registry
+
+
+class Span:
+    """RPC time collected by `span`."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.calls = 0
+        # Wall time of the span, set when it closes.
+        self.total_seconds = 0.0
+
+
+_spans = threading.local()
+
+
+@contextlib.contextmanager
+def span(label: Optional[str] = None) -> Iterator[Span]:
+    """Collects the RPC time of the calls the current thread starts.
+
+    A call started while the span is open counts once it completes. Spans
+    nest; a call counts towards every open span of its thread. With `label`,
+    the total, RPC and remaining time of the span are logged when it closes.
+    """
+    s = Span()
+    _open_spans().append(s)
+    start = time.monotonic()
+    try:
+        yield s
+    finally:
+        s.total_seconds = time.monotonic() - start
+        _open_spans().remove(s)
+        if label is not None:
+            logging.info(
+                "%s took %.1f ms: %.1f ms in %d RPCs, %.1f ms elsewhere",
+                label,
+                s.total_seconds * 1e3,
+                s.seconds * 1e3,
+                s.calls,
+                max(s.total_seconds - s.seconds, 0.0) * 1e3,
+            )
+
+
+def _open_spans() -> List[Span]:
+    spans = getattr(_spans, "open", None)
+    if spans is None:
+        spans = _spans.open = []
+    return spans
+
+
+def _message_size(message) -> int:
+    byte_size = getattr(message, "ByteSize", None)
+    return byte_size() if callable(byte_size) else 0
+
+
+class _CountingStream:
+    """Wraps a response-streaming call to count the received bytes.
+
+    `on_end` is called with the status code once the caller has read the
+    stream to its end or to its error, so every message has been counted.
+    A stream that is abandoned before that is not recorded.
+    """
+
+    def __init__(self, call, on_message, on_end):
+        self._call = call
+        self._on_message = on_message
+        self._on_end = on_end
+        self._ended = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            message = next(self._call)
+        except StopIteration:
+            self._end(self._call.code())
+            raise
+        except grpc.RpcError as e:
+            self._end(e.code())
+            raise
+        self._on_message(message)
+        return message
+
+    def _end(self, code):
+        if not self._ended:
+            self._ended = True
+            self._on_end(code)
+
+    def __getattr__(self, name):
+        return getattr(self._call, name)
+
+
+class TimingInterceptor(
+    grpc.UnaryUnaryClientInterceptor, grpc.UnaryStreamClientInterceptor
+):
+    """Records the latency, size and status of every call into a registry."""
+
+    def __init__(self, metrics: Optional[MetricsRegistry] = None):
+        self._metrics = metrics or _registry
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        spans = list(_open_spans())
+        sent = _message_size(request)
+        start = time.monotonic()
+        call = continuation(client_call_details, request)
+
+        def done(call):
+            seconds = time.monotonic() - start
+            code = call.code()
+            received = (
+                _message_size(call.result()) if code == grpc.StatusCode.OK else 0
+            )
+            self._record(client_call_details.method, code, seconds, sent, received)
+            for s in spans:
+                s.seconds += seconds
+                s.calls += 1
+
+        call.add_done_callback(done)
+        return call
+
+    def intercept_unary_stream(self, continuation, client_call_details, request):
+        spans = list(_open_spans())
+        sent = _message_size(request)
+        received = 0
+        start = time.monotonic()
+        call = continuation(client_call_details, request)
+
+        def on_message(message):
+            nonlocal received
+            received += _message_size(message)
+
+        def on_end(code):
+            seconds = time.monotonic() - start
+            self._record(client_call_details.method, code, seconds, sent, received)
+            for s in spans:
+                s.seconds += seconds
+                s.calls += 1
+
+        return _CountingStream(call, on_message, on_end)
+
+    def _record(self, method, code, seconds, sent, received):
+        if isinstance(method, bytes):
+            method = method.decode()
+        self._metrics.record(method, code, seconds, sent, received)
+
+
+_dump_lock = threading.Lock()
+_dump_paths: Optional[set] = None
+
+
+def dump_at_exit(path: Optional[str] = None) -> None:
+    """Dumps the process-wide registry when the process exits.
+
+    The metrics are always logged; with `path` they are also written there as
+    JSON. Calling this again with another path adds that path.
+    """
+    global _dump_paths
+    with _dump_lock:
+        if _dump_paths is None:
+            _dump_paths = set()
+            atexit.register(_dump)
+        if path:
+            _dump_paths.add(path)
+
+
+def _dump():
+    _registry.dump_to_log()
+    for path in _dump_paths:
+        try:
+            _registry.dump_to_file(path)
+        except OSError as e:
+            logging.warning("Could not write RPC metrics to %s: %s", path, e)
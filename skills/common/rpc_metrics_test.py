@@ -0,0 +1,119 @@
+import json
+import os
+import tempfile
+import unittest
+from concurrent import futures
+
+import grpc
+from google.protobuf import wrappers_pb2
+
+from skills.common import rpc_metrics
+
+_ECHO = "/test.Echo/Echo"
+_REPEAT = "/test.Echo/Repeat"
+
+
+def _echo(request, context):
+    if request.value == b"fail":
+        context.abort(grpc.StatusCode.NOT_FOUND, "no such thing")
+    return request
+
+
+def _repeat(request, context):
+    for _ in range(3):
+        yield request
+
+
+class RpcMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+        serialize = wrappers_pb2.BytesValue.SerializeToString
+        deserialize = wrappers_pb2.BytesValue.FromString
+        self.server.add_generic_rpc_handlers([
+            grpc.method_handlers_generic_handler("test.Echo", {
+                "Echo": grpc.unary_unary_rpc_method_handler(
+                    _echo, deserialize, serialize
+                ),
+                "Repeat": grpc.unary_stream_rpc_method_handler(
+                    _repeat, deserialize, serialize
+                ),
+            })
+        ])
+        port = self.server.add_insecure_port("localhost:0")
+        self.server.start()
+        self.metrics = rpc_metrics.MetricsRegistry()
+        self.channel = grpc.intercept_channel(
+            grpc.insecure_channel(f"localhost:{port}"),
+            rpc_metrics.TimingInterceptor(self.metrics),
+        )
+
+    def tearDown(self):
+        self.channel.close()
+        self.server.stop(grace=None)
+
+    def call(self, method, value, stream=False):
+        factory = self.channel.unary_stream if stream else self.channel.unary_unary
+        return factory(
+            method,
+            request_serializer=wrappers_pb2.BytesValue.SerializeToString,
+            response_deserializer=wrappers_pb2.BytesValue.FromString,
+        )(wrappers_pb2.BytesValue(value=value), timeout=5)
+
+    def test_records_unary_calls(self):
+        request_size = wrappers_pb2.BytesValue(value=b"ping").ByteSize()
+        with rpc_metrics.span() as rpc:
+            self.call(_ECHO, b"ping")
+            self.call(_ECHO, b"ping")
+            with self.assertRaises(grpc.RpcError):
+                self.call(_ECHO, b"fail")
+
+        stats = self.metrics.snapshot()[_ECHO]
+        self.assertEqual(stats["count"], 3)
+        self.assertEqual(stats["codes"], {"OK": 2, "NOT_FOUND": 1})
+        self.assertEqual(stats["received_bytes"], 2 * request_size)
+        self.assertGreater(stats["sent_bytes"], 2 * request_size)
+        self.assertGreater(stats["p50_seconds"], 0)
+        self.assertEqual(sum(stats["buckets"]), 3)
+        self.assertEqual(rpc.calls, 3)
+        self.assertAlmostEqual(rpc.seconds, stats["total_seconds"])
+
+    def test_labeled_span_logs_rpc_and_other_time(self):
+        with self.assertLogs() as log_output:
+            with rpc_metrics.span("execute") as rpc:
+                self.call(_ECHO, b"ping")
+
+        self.assertEqual(rpc.calls, 1)
+        self.assertGreaterEqual(rpc.total_seconds, rpc.seconds)
+        message = log_output.records[-1].getMessage()
+        self.assertTrue(message.startswith("execute took "), message)
+        self.assertIn("in 1 RPCs", message)
+
+    def test_records_streamed_bytes(self):
+        responses = list(self.call(_REPEAT, b"abc", stream=True))
+
+        stats = self.metrics.snapshot()[_REPEAT]
+        self.assertEqual(len(responses), 3)
+        self.assertEqual(stats["codes"], {"OK": 1})
+        self.assertEqual(stats["received_bytes"], 3 * responses[0].ByteSize())
+
+    def test_percentile_is_bucket_bound(self):
+        stats = rpc_metrics.MethodStats()
+        for seconds in (0.001, 0.001, 0.001, 0.5):
+            stats.record(grpc.StatusCode.OK, seconds, 0, 0)
+        self.assertEqual(stats.percentile(0.5), 0.0016)
+        self.assertEqual(stats.percentile(0.99), 0.5)
+
+    def test_dumps_to_file(self):
+        self.call(_ECHO, b"ping")
+        path = os.path.join(tempfile.mkdtemp(), "rpc_metrics.json")
+        self.metrics.dump_to_file(path)
+        with open(path) as f:
+            self.assertEqual(json.load(f)[_ECHO]["count"], 1)
+        with self.assertLogs() as log_output:
+            self.metrics.dump_to_log()
+        self.assertIn(_ECHO, log_output.records[0].getMessage())
+
+
+if __name__ == "__main__":
+    unittest.main()
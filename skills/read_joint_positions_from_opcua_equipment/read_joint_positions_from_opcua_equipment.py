@@ -19,12 +19,13 @@ https://developers.intrinsic.ai/guides/workcell_design/adding_new_hardware?hl=en
 """
 
 from absl import logging
-import grpc
 from intrinsic.icon.proto import joint_space_pb2
 from intrinsic.skills.python import skill_interface
 from intrinsic.util.decorators import overrides
 from intrinsic.hardware.opcua_equipment import opcua_equipment_service_pb2
 from intrinsic.hardware.opcua_equipment import opcua_equipment_service_pb2_grpc
+from skills.common import channel_cache
+from skills.common import rpc_metrics
 from skills.read_joint_positions_from_opcua_equipment import (
     read_joint_positions_from_opcua_equipment_pb2,
 )
@@ -39,6 +40,9 @@ GetStatusRequest = opcua_equipment_service_pb2.GetStatusRequest
 class ReadJointPositionsFromOpcuaEquipment(skill_interface.Skill):
     """Implementation of the read_joint_positions_from_opcua_equipment skill."""
 
+    def __init__(self) -> None:
+        rpc_metrics.dump_at_exit()
+
     @overrides(skill_interface.Skill)
     def execute(
         self,
@@ -49,36 +53,26 @@ class ReadJointPositionsFromOpcuaEquipment(skill_interface.Skill):
     ) -> (
         read_joint_positions_from_opcua_equipment_pb2.ReadJointPositionsFromOpcuaEquipmentResult
     ):
-        resource_handle = context.resource_handles[_EQUIPMENT_SLOT]
+        with rpc_metrics.span("read_joint_positions_from_opcua_equipment"):
+            resource_handle = context.resource_handles[_EQUIPMENT_SLOT]
 
-        logging.info(
-            "Connecting to equipment at %s:%s",
-            resource_handle.connection_info.grpc.address,
-            resource_handle.connection_info.grpc.server_instance,
-        )
-        with grpc.insecure_channel(
-            resource_handle.connection_info.grpc.address
-        ) as channel:
-            stub = OpcuaEquipmentServiceStub(channel)
-            connection_params = {
-                "metadata": [
-                    (
-                        "x-resource-instance-name",
-                        resource_handle.connection_info.grpc.server_instance,
-                    )
-                ]
-            }
+            logging.info(
+                "Connecting to equipment at %s:%s",
+                resource_handle.connection_info.grpc.address,
+                resource_handle.connection_info.grpc.server_instance,
+            )
+            stub = OpcuaEquipmentServiceStub(channel_cache.channel(resource_handle))
             # Send a GetStatusRequest containing a "Get" command that returns the joint position values.
             res: opcua_equipment_service_pb2.GetStatusResponse = stub.GetStatus(
-                GetStatusRequest(command="Get"), **connection_params
+                GetStatusRequest(command="Get")
             )
             logging.info("Status values: \n%s", res.status)
 
-        # Extract the axes values and package into a JointVec before returning the result.
-        output_jp = []
-        for ax in range(1, 7):
-            output_jp.append(res.status[f"lrAxis{ax}"].double_value)
+            # Extract the axes values and package into a JointVec before returning the result.
+            output_jp = []
+            for ax in range(1, 7):
+                output_jp.append(res.status[f"lrAxis{ax}"].double_value)
 
-        return read_joint_positions_from_opcua_equipment_pb2.ReadJointPositionsFromOpcuaEquipmentResult(
-            joint_positions=joint_space_pb2.JointVec(joints=output_jp)
-        )
+            return read_joint_positions_from_opcua_equipment_pb2.ReadJointPositionsFromOpcuaEquipmentResult(
+                joint_positions=joint_space_pb2.JointVec(joints=output_jp)
+            )
@@ -105,6 +105,16 @@ absl::StatusOr<std::unique_ptr<google::protobuf::Message>> ScanBarcodes::Execute
     // Need unsigned data with no const so it can implicitly cast to void*
     const_cast<unsigned char*>(reinterpret_cast<const unsigned char *>(image_buffer.data().c_str())));
 
+  std::unique_ptr<ScanBarcodesResult> result;
+  INTR_ASSIGN_OR_RETURN(result, ScanImage(img));
+
+  LOG(INFO) << "Detected " << result->barcodes_size() << " barcode(s).";
+  return result;
+}
+
+absl::StatusOr<std::unique_ptr<ScanBarcodesResult>>
+ScanBarcodes::ScanImage(const cv::Mat& img)
+{
   // Do the detection.
   std::vector<cv::Point2f> detected_corners;
   std::vector<std::string> decoded_type;
@@ -117,11 +127,7 @@ absl::StatusOr<std::unique_ptr<google::protobuf::Message>> ScanBarcodes::Execute
     return absl::UnknownError(e.what());
   }
 
-  std::unique_ptr<ScanBarcodesResult> result;
-  INTR_ASSIGN_OR_RETURN(result, ConvertToResultProto(decoded_data, decoded_type, detected_corners));
-
-  LOG(INFO) << "Detected " << decoded_data.size() << " barcode(s).";
-  return result;
+  return ConvertToResultProto(decoded_data, decoded_type, detected_corners);
 }
 
 absl::Status
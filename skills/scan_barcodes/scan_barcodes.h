@@ -36,6 +36,11 @@ class ScanBarcodes : public intrinsic::skills::SkillInterface {
   Execute(const intrinsic::skills::ExecuteRequest& request,
           intrinsic::skills::ExecuteContext& context) override;
 
+  // Detects and decodes all barcodes in an 8-bit, 3-channel image. This is
+  // the part of Execute() that runs after the frame has been captured.
+  absl::StatusOr<std::unique_ptr<::com::example::ScanBarcodesResult>>
+  ScanImage(const cv::Mat& img);
+
  private:
   absl::Status
   ConnectToCamera(
@@ -1,7 +1,15 @@
 """A skill that connects to a camera resource and scans all visible barcodes using OpenCV."""
 
+from concurrent import futures
+import collections
+import contextlib
+import os
+import queue
+import threading
+import time
+
 # [START import_typing]
-from typing import List
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
 
 # [END import_typing]
 
@@ -30,55 +38,504 @@ from skills.scan_barcodes import scan_barcodes_pb2
 CAMERA_EQUIPMENT_SLOT: str = "camera"
 # [END camera_slot_constant]
 
+# Environment variable that sets the detector pool size of skill instances
+# that are created without one, such as the one the skill service creates.
+DETECTOR_POOL_SIZE_ENV: str = "SCAN_BARCODES_DETECTOR_POOL_SIZE"
+
+# How often the continuous scan loop re-checks its stop conditions while
+# waiting for the next frame.
+_CONTINUOUS_POLL_INTERVAL_SECONDS: float = 0.05
+
+# Defaults for the coarse-to-fine pyramid pass.
+_DEFAULT_PYRAMID_SCALE_FACTOR: float = 0.25
+_DEFAULT_PYRAMID_CROP_PADDING: float = 0.25
+
+# Defaults for the frame cache.
+_DEFAULT_FRAME_CACHE_MAX_AGE_SECONDS: float = 10.0
+_DEFAULT_FRAME_CACHE_MAX_MEAN_ABS_DIFF: float = 2.0
+# Side length of the downsampled image used as a frame fingerprint.
+_FINGERPRINT_SIZE: int = 32
+
+# Defaults for the adaptive region of interest.
+_DEFAULT_ROI_HISTORY: int = 5
+_DEFAULT_ROI_PADDING: float = 0.25
+
+_T = TypeVar("_T")
+
+# Result of a detector call: (ok, decoded_data, decoded_types, detected_corners).
+Detections = Tuple[bool, Sequence[str], Sequence[str], np.ndarray]
+
 
 # [START convert_barcode_type_to_proto]
+# Maps the type strings reported by cv2 to BarcodeType.
+_BARCODE_TYPES: Dict[str, scan_barcodes_pb2.BarcodeType] = {
+    "EAN_8": scan_barcodes_pb2.BARCODE_EAN_8,
+    "EAN_13": scan_barcodes_pb2.BARCODE_EAN_13,
+    "UPC_A": scan_barcodes_pb2.BARCODE_UPC_A,
+    "UPC_E": scan_barcodes_pb2.BARCODE_UPC_E,
+    "UPC_EAN_EXTENSION": scan_barcodes_pb2.BARCODE_UPC_EAN_EXTENSION,
+}
+
+
 def convert_barcode_type_to_proto(
-    barcode_type: int,
+    barcode_type: str,
 ) -> scan_barcodes_pb2.BarcodeType:
     """Convert cv2 barcode type to BarcodeType proto."""
-    if barcode_type == "EAN_8":
-        return scan_barcodes_pb2.BARCODE_EAN_8
-    elif barcode_type == "EAN_13":
-        return scan_barcodes_pb2.BARCODE_EAN_13
-    elif barcode_type == "UPC_A":
-        return scan_barcodes_pb2.BARCODE_UPC_A
-    elif barcode_type == "UPC_E":
-        return scan_barcodes_pb2.BARCODE_UPC_E
-    elif barcode_type == "UPC_EAN_EXTENSION":
-        return scan_barcodes_pb2.BARCODE_UPC_EAN_EXTENSION
-    else:
-        return scan_barcodes_pb2.BARCODE_UNSPECIFIED
+    return _BARCODE_TYPES.get(barcode_type, scan_barcodes_pb2.BARCODE_UNSPECIFIED)
     # [END convert_barcode_type_to_proto]
 
 
+def split_into_tiles(
+    height: int, width: int, rows: int, cols: int, overlap_px: int
+) -> List[Tuple[int, int, int, int]]:
+    """Returns (y0, y1, x0, x1) bounds of an overlapping rows x cols grid."""
+    rows = max(1, rows)
+    cols = max(1, cols)
+    half_overlap = max(0, overlap_px) // 2
+    tiles = []
+    for r in range(rows):
+        y0 = max(0, r * height // rows - half_overlap)
+        y1 = min(height, (r + 1) * height // rows + half_overlap)
+        for c in range(cols):
+            x0 = max(0, c * width // cols - half_overlap)
+            x1 = min(width, (c + 1) * width // cols + half_overlap)
+            tiles.append((y0, y1, x0, x1))
+    return tiles
+
+
+def merge_detections(
+    decoded_data: Sequence[str],
+    decoded_types: Sequence[str],
+    detected_corners: np.ndarray,
+) -> Detections:
+    """Merges duplicate detections of the same barcode.
+
+    Two detections are duplicates if they decode to the same type and data and
+    their centers are closer than half the diagonal of the smaller one. Of a
+    group of duplicates the one with the largest area is kept, since a barcode
+    cut by a tile border yields a smaller quadrilateral.
+    """
+    if len(decoded_data) == 0:
+        return False, (), (), np.empty((0, 4, 2), dtype=np.float32)
+
+    corners = np.asarray(detected_corners, dtype=np.float32).reshape(-1, 4, 2)
+    centers = corners.mean(axis=1)
+    diagonals = np.linalg.norm(corners[:, 2] - corners[:, 0], axis=1)
+    x = corners[:, :, 0]
+    y = corners[:, :, 1]
+    areas = 0.5 * np.abs(
+        np.sum(x * np.roll(y, -1, axis=1) - np.roll(x, -1, axis=1) * y, axis=1)
+    )
+
+    kept: List[int] = []
+    for i in np.argsort(-areas, kind="stable"):
+        duplicate = False
+        for j in kept:
+            if (
+                decoded_data[i] == decoded_data[j]
+                and decoded_types[i] == decoded_types[j]
+                and np.linalg.norm(centers[i] - centers[j])
+                < 0.5 * min(diagonals[i], diagonals[j])
+            ):
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append(int(i))
+    kept.sort()
+
+    return (
+        True,
+        tuple(decoded_data[i] for i in kept),
+        tuple(decoded_types[i] for i in kept),
+        corners[kept],
+    )
+
+
+def frame_fingerprint(img: np.ndarray) -> np.ndarray:
+    """Returns a small grayscale thumbnail used to compare frames cheaply."""
+    thumbnail = cv2.resize(
+        img, (_FINGERPRINT_SIZE, _FINGERPRINT_SIZE), interpolation=cv2.INTER_AREA
+    ).astype(np.float32)
+    if thumbnail.ndim == 3:
+        thumbnail = thumbnail.mean(axis=2)
+    return thumbnail
+
+
+class FrameCache:
+    """Caches scan results keyed by frame fingerprint.
+
+    A lookup hits when an entry with the same key has a fingerprint whose mean
+    absolute difference from the new one is below the configured threshold.
+    Entries are evicted when they exceed the configured age, and the least
+    recently used entry is dropped when the cache is full.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # Entries of (key, fingerprint, result, stored_at), least recently
+        # used first.
+        self._entries: List[
+            Tuple[object, np.ndarray, scan_barcodes_pb2.ScanBarcodesResult, float]
+        ] = []
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(
+        self,
+        key: object,
+        fingerprint: np.ndarray,
+        options: scan_barcodes_pb2.FrameCacheOptions,
+    ) -> Optional[scan_barcodes_pb2.ScanBarcodesResult]:
+        max_diff = options.max_mean_abs_diff or _DEFAULT_FRAME_CACHE_MAX_MEAN_ABS_DIFF
+        with self._lock:
+            self._evict(options, time.monotonic())
+            for i, (entry_key, entry_fingerprint, result, stored_at) in enumerate(
+                self._entries
+            ):
+                if entry_key != key or entry_fingerprint.shape != fingerprint.shape:
+                    continue
+                if np.abs(entry_fingerprint - fingerprint).mean() < max_diff:
+                    self._entries.append(self._entries.pop(i))
+                    self.hits += 1
+                    logging.info(
+                        "Frame unchanged, reusing cached result (%d hits, %d misses).",
+                        self.hits,
+                        self.misses,
+                    )
+                    cached = scan_barcodes_pb2.ScanBarcodesResult()
+                    cached.CopyFrom(result)
+                    cached.frames_scanned = 0
+                    cached.from_cache = True
+                    return cached
+            self.misses += 1
+            return None
+
+    def store(
+        self,
+        key: object,
+        fingerprint: np.ndarray,
+        result: scan_barcodes_pb2.ScanBarcodesResult,
+        options: scan_barcodes_pb2.FrameCacheOptions,
+    ) -> None:
+        stored = scan_barcodes_pb2.ScanBarcodesResult()
+        stored.CopyFrom(result)
+        now = time.monotonic()
+        with self._lock:
+            self._entries.append((key, fingerprint, stored, now))
+            self._evict(options, now)
+
+    def _evict(
+        self, options: scan_barcodes_pb2.FrameCacheOptions, now: float
+    ) -> None:
+        max_age = options.max_age_seconds or _DEFAULT_FRAME_CACHE_MAX_AGE_SECONDS
+        self._entries = [
+            entry for entry in self._entries if now - entry[3] <= max_age
+        ]
+        if len(self._entries) > options.max_entries:
+            del self._entries[: len(self._entries) - options.max_entries]
+
+
+class RoiTracker:
+    """Remembers where barcodes were found recently, per camera.
+
+    For every camera the bounding boxes, as (x0, y0, x1, y1), of the last few
+    successful decodes are kept. The search region is their union, padded and
+    clipped to the frame.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._boxes: Dict[str, collections.deque] = {}
+
+    def search_region(
+        self,
+        camera_slot: str,
+        height: int,
+        width: int,
+        options: scan_barcodes_pb2.AdaptiveRoiOptions,
+    ) -> Optional[Tuple[int, int, int, int]]:
+        """Returns the (y0, y1, x0, x1) region to search first, if any."""
+        with self._lock:
+            boxes = list(self._boxes.get(camera_slot, ()))
+        if not boxes:
+            return None
+        x0, y0 = np.min([box[:2] for box in boxes], axis=0)
+        x1, y1 = np.max([box[2:] for box in boxes], axis=0)
+        pad = max(x1 - x0, y1 - y0) * (options.padding or _DEFAULT_ROI_PADDING)
+        return (
+            max(0, int(y0 - pad)),
+            min(height, int(np.ceil(y1 + pad))),
+            max(0, int(x0 - pad)),
+            min(width, int(np.ceil(x1 + pad))),
+        )
+
+    def record(
+        self,
+        camera_slot: str,
+        detected_corners: np.ndarray,
+        options: scan_barcodes_pb2.AdaptiveRoiOptions,
+    ) -> None:
+        """Adds the bounding box of `detected_corners` to the camera's history."""
+        points = np.asarray(detected_corners, dtype=np.float32).reshape(-1, 2)
+        box = (*points.min(axis=0), *points.max(axis=0))
+        history = options.history or _DEFAULT_ROI_HISTORY
+        with self._lock:
+            boxes = self._boxes.get(camera_slot)
+            if boxes is None or boxes.maxlen != history:
+                boxes = collections.deque(boxes or (), maxlen=history)
+                self._boxes[camera_slot] = boxes
+            boxes.append(box)
+
+
+class Deadline:
+    """Time budget and cancellation state of one execution.
+
+    Decoding stages ask the deadline how long they may run and record in
+    `incomplete` that they were cut short.
+    """
+
+    def __init__(
+        self,
+        budget_seconds: float = 0.0,
+        canceller: Optional[skill_interface.SkillCanceller] = None,
+    ) -> None:
+        self._end = time.monotonic() + budget_seconds if budget_seconds > 0 else None
+        self._canceller = canceller
+        self.incomplete = False
+
+    def remaining(self) -> Optional[float]:
+        """Returns the seconds left, or None without a budget."""
+        if self._end is None:
+            return None
+        return max(0.0, self._end - time.monotonic())
+
+    def expired(self) -> bool:
+        return self._end is not None and time.monotonic() >= self._end
+
+    @property
+    def cancelled(self) -> bool:
+        return self._canceller is not None and self._canceller.cancelled
+
+    def check_cancelled(self) -> None:
+        """Raises SkillCancelledError if the execution was cancelled."""
+        if self.cancelled:
+            raise skill_interface.SkillCancelledError("ScanBarcodes was cancelled.")
+
+
+# Creates the detectors of a DetectorPool.
+DetectorFactory = Callable[[], cv2.barcode.BarcodeDetector]
+
+
+class DetectorPool:
+    """A fixed set of detectors that are checked out for exclusive use.
+
+    A cv2 detector must not be used by two threads at once. All detectors are
+    created up front, so no scan pays the construction cost, and a caller
+    blocks until a detector is free.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        factory: DetectorFactory = cv2.barcode.BarcodeDetector,
+    ) -> None:
+        if size < 1:
+            raise ValueError(f"Detector pool size must be at least 1, got {size}")
+        self.size = size
+        self._detectors: queue.LifoQueue = queue.LifoQueue()
+        for _ in range(size):
+            self._detectors.put(factory())
+
+    @contextlib.contextmanager
+    def checkout(self) -> Iterator[cv2.barcode.BarcodeDetector]:
+        detector = self._detectors.get()
+        try:
+            yield detector
+        finally:
+            self._detectors.put(detector)
+
+
+class Preprocessor:
+    """Converts frames for detection into buffers reused across scans.
+
+    Each thread keeps one buffer per conversion step, so concurrent scans
+    never share a buffer and a steady stream of equally sized frames is
+    converted without allocating. A buffer handed out by `run` is only valid
+    until the next call to `run` on the same thread.
+    """
+
+    def __init__(self) -> None:
+        self._local = threading.local()
+
+    def run(
+        self, img: np.ndarray, options: scan_barcodes_pb2.PreprocessOptions
+    ) -> Tuple[np.ndarray, int]:
+        """Returns the converted frame and the number of bytes allocated."""
+        allocated = 0
+        owned = False
+        if options.grayscale and img.ndim == 3:
+            if img.shape[2] == 1:
+                # Mono8 with an explicit channel axis; drop it without copying.
+                img = img.reshape(img.shape[:2])
+            else:
+                gray, allocated = self._buffer("gray", img.shape[:2], img.dtype)
+                # Camera frames are RGB(A).
+                code = cv2.COLOR_RGB2GRAY
+                if img.shape[2] == 4:
+                    code = cv2.COLOR_RGBA2GRAY
+                img = cv2.cvtColor(img, code, dst=gray)
+                owned = True
+        if options.normalize_contrast:
+            if owned:
+                # The frame is already in a buffer of ours; convert in place.
+                dst = img
+            else:
+                # Never write into the camera's frame.
+                dst, allocated = self._buffer("contrast", img.shape, img.dtype)
+            img = cv2.normalize(img, dst, 0, 255, cv2.NORM_MINMAX)
+        return img, allocated
+
+    def _buffer(
+        self, name: str, shape: Tuple[int, ...], dtype: np.dtype
+    ) -> Tuple[np.ndarray, int]:
+        """Returns this thread's buffer for `name` and the bytes allocated for it."""
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        buffer = buffers.get(name)
+        if buffer is not None and buffer.shape == shape and buffer.dtype == dtype:
+            return buffer, 0
+        buffer = np.empty(shape, dtype=dtype)
+        buffers[name] = buffer
+        return buffer, buffer.nbytes
+
+
+def _detector_pool_size_from_env() -> int:
+    """Returns the pool size set in the environment, or 0 if it is unset."""
+    value = os.environ.get(DETECTOR_POOL_SIZE_ENV, "")
+    if not value:
+        return 0
+    try:
+        size = int(value)
+    except ValueError:
+        size = 0
+    if size < 1:
+        raise ValueError(
+            f"{DETECTOR_POOL_SIZE_ENV} must be a positive integer, got {value!r}"
+        )
+    return size
+
+
+def _detector_pool_size(requested: int) -> int:
+    """Returns the number of detectors shared by concurrent executions.
+
+    A `requested` size of zero reads the size from the
+    SCAN_BARCODES_DETECTOR_POOL_SIZE environment variable and, if that is
+    unset, uses the CPU count.
+    """
+    return requested or _detector_pool_size_from_env() or os.cpu_count() or 1
+
+
 # [START barcode_detector]
 class ScanBarcodes(skill_interface.Skill):
     """Skill that connects to a camera resource and scans all visible barcodes using OpenCV."""
 
-    detector: cv2.barcode.BarcodeDetector
+    detector_pool: DetectorPool
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        detector_pool_size: int = 0,
+        detector_factory: DetectorFactory = cv2.barcode.BarcodeDetector,
+    ) -> None:
         super().__init__()
-        self.detector = cv2.barcode.BarcodeDetector()
+        self.detector_pool = DetectorPool(
+            _detector_pool_size(detector_pool_size), detector_factory
+        )
         # [END barcode_detector]
+        self._worker_executors: Dict[
+            Tuple[str, int], futures.ThreadPoolExecutor
+        ] = {}
+        self._worker_executors_lock = threading.Lock()
+        self._frame_cache = FrameCache()
+        self._preprocessor = Preprocessor()
+        self._roi_tracker = RoiTracker()
 
-    # [START access_equipment]
     @overrides(skill_interface.Skill)
     def execute(
         self,
         request: skill_interface.ExecuteRequest[scan_barcodes_pb2.ScanBarcodesParams],
         context: skill_interface.ExecuteContext,
     ) -> scan_barcodes_pb2.ScanBarcodesResult:
+        context.canceller.ready()
+        deadline = Deadline(request.params.time_budget_ms / 1e3, context.canceller)
+
+        camera_slots = list(request.params.camera_slots) or [CAMERA_EQUIPMENT_SLOT]
+        if len(camera_slots) > 1:
+            if request.params.HasField("continuous"):
+                raise ValueError("Continuous scanning supports a single camera.")
+            result = self.scan_cameras(camera_slots, request.params, context, deadline)
+        else:
+            result = self.scan_camera(camera_slots[0], request.params, context, deadline)
+
+        logging.info("ScanBarcodesResult: %s", result)
+
+        # [START execute_result]
+        return result
+        # [END execute_result]
+
+    # [START access_equipment]
+    def scan_camera(
+        self,
+        camera_slot: str,
+        params: scan_barcodes_pb2.ScanBarcodesParams,
+        context: skill_interface.ExecuteContext,
+        deadline: Optional[Deadline] = None,
+    ) -> scan_barcodes_pb2.ScanBarcodesResult:
+        """Captures from the camera in `camera_slot` and decodes the frames."""
         # Get camera.
-        camera = cameras.Camera.create(context, CAMERA_EQUIPMENT_SLOT)
+        camera = cameras.Camera.create(context, camera_slot)
         # [END access_equipment]
 
+        if params.HasField("continuous"):
+            return self.scan_continuously(
+                camera, camera_slot, params, context, deadline
+            )
+
         # [START call_capture]
         # Capture from the camera and get the first sensor image as a numpy array.
         sensor_image = camera.capture()
         img = sensor_image.array
         # [END call_capture]
 
+        return self.scan_image(img, camera_slot, params, deadline)
+
+    def scan_image(
+        self,
+        img: np.ndarray,
+        camera_slot: str,
+        params: scan_barcodes_pb2.ScanBarcodesParams,
+        deadline: Optional[Deadline] = None,
+    ) -> scan_barcodes_pb2.ScanBarcodesResult:
+        """Decodes one frame into a result tagged with `camera_slot`.
+
+        If the frame cache is enabled and the frame is effectively unchanged
+        since a previous call with the same slot and parameters, the cached
+        result is returned without decoding. Incomplete results are not
+        cached.
+        """
+        deadline = deadline or Deadline()
+        cache_key = None
+        if params.HasField("frame_cache") and params.frame_cache.max_entries > 0:
+            fingerprint = frame_fingerprint(img)
+            cache_key = (camera_slot, params.SerializeToString(deterministic=True))
+            cached = self._frame_cache.lookup(cache_key, fingerprint, params.frame_cache)
+            if cached is not None:
+                return cached
+
+        deadline.check_cancelled()
+        img, allocated = self._preprocessor.run(img, params.preprocess)
+        deadline.check_cancelled()
+
         # [START run_detector]
         # Run the detector and check results.
         (
@@ -86,51 +543,520 @@ class ScanBarcodes(skill_interface.Skill):
             decoded_data,
             decoded_types,
             detected_corners,
-        ) = self.detector.detectAndDecodeWithType(img)
+        ) = self.detect_with_roi(img, camera_slot, params, deadline)
         # [END run_detector]
+        deadline.check_cancelled()
 
         # [START call_convert_to_result_proto]
         # Convert result and return.
         result = self.convert_to_result_proto(
-            ok, decoded_data, decoded_types, detected_corners
+            ok,
+            decoded_data,
+            decoded_types,
+            detected_corners,
+            params.corner_format,
         )
         # [END call_convert_to_result_proto]
+        result.frames_scanned = 1
+        result.preprocess_bytes_allocated = allocated
+        result.incomplete = deadline.incomplete
+        for barcode in result.barcodes:
+            barcode.camera_slot = camera_slot
 
-        logging.info("ScanBarcodesResult: %s", result)
+        if cache_key is not None and not result.incomplete:
+            self._frame_cache.store(cache_key, fingerprint, result, params.frame_cache)
+        return result
 
-        # [START execute_result]
+    def scan_cameras(
+        self,
+        camera_slots: Sequence[str],
+        params: scan_barcodes_pb2.ScanBarcodesParams,
+        context: skill_interface.ExecuteContext,
+        deadline: Optional[Deadline] = None,
+    ) -> scan_barcodes_pb2.ScanBarcodesResult:
+        """Captures and decodes from several cameras concurrently.
+
+        Each camera is connected to, captured from and decoded on its own
+        thread, so the total latency is close to that of the slowest camera.
+        All cameras share the time budget of `deadline`.
+
+        Raises:
+          ValueError: If a slot is not bound to a camera in this deployment.
+            No camera is connected to then.
+        """
+        unbound_slots = [
+            slot for slot in camera_slots if slot not in context.resource_handles
+        ]
+        if unbound_slots:
+            raise ValueError(
+                f"Camera slots {unbound_slots} are not bound; scanning several"
+                " cameras needs the scan_barcodes_multi_camera_py skill."
+            )
+        deadline = deadline or Deadline()
+
+        def scan_slot(slot: str) -> scan_barcodes_pb2.ScanBarcodesResult:
+            return self.scan_camera(slot, params, context, deadline)
+
+        executor = self._get_worker_executor(len(camera_slots), kind="camera")
+        result = scan_barcodes_pb2.ScanBarcodesResult(from_cache=True)
+        for camera_result in executor.map(scan_slot, camera_slots):
+            result.barcodes.extend(camera_result.barcodes)
+            result.frames_scanned += camera_result.frames_scanned
+            result.from_cache &= camera_result.from_cache
+            result.incomplete |= camera_result.incomplete
+            result.preprocess_bytes_allocated += (
+                camera_result.preprocess_bytes_allocated
+            )
         return result
-        # [END execute_result]
+
+    def scan_continuously(
+        self,
+        camera: cameras.Camera,
+        camera_slot: str,
+        params: scan_barcodes_pb2.ScanBarcodesParams,
+        context: skill_interface.ExecuteContext,
+        deadline: Optional[Deadline] = None,
+    ) -> scan_barcodes_pb2.ScanBarcodesResult:
+        """Captures and decodes frames until a stop condition is met.
+
+        A background thread captures frame N+1 while frame N is being decoded.
+        The hand-off queue holds a single frame, so at most three frames are
+        in flight: one being decoded, one queued and one that the capture
+        thread holds while it blocks because decoding falls behind.
+        Running out of the time budget of `deadline` ends the scan like a
+        timeout, but marks the result incomplete.
+        """
+        options = params.continuous
+        deadline = deadline or Deadline()
+
+        frames: queue.Queue = queue.Queue(maxsize=1)
+        stop = threading.Event()
+
+        def capture_loop() -> None:
+            while not stop.is_set():
+                try:
+                    item = camera.capture().array
+                except Exception as e:  # pylint: disable=broad-except
+                    item = e
+                while not stop.is_set():
+                    try:
+                        frames.put(item, timeout=_CONTINUOUS_POLL_INTERVAL_SECONDS)
+                        break
+                    except queue.Full:
+                        continue
+                if isinstance(item, Exception):
+                    return
+
+        timeout_at = None
+        if options.timeout_seconds > 0:
+            timeout_at = time.monotonic() + options.timeout_seconds
+
+        unique: Dict[Tuple[int, str], scan_barcodes_pb2.Barcode] = {}
+        frames_scanned = 0
+        allocated = 0
+
+        capture_thread = threading.Thread(
+            target=capture_loop, name="scan_barcodes_capture", daemon=True
+        )
+        capture_thread.start()
+        try:
+            while True:
+                if context.canceller.cancelled:
+                    logging.info("Continuous scan cancelled.")
+                    break
+                if deadline.expired():
+                    logging.info("Continuous scan ran out of its time budget.")
+                    deadline.incomplete = True
+                    break
+                if options.max_frames > 0 and frames_scanned >= options.max_frames:
+                    break
+                if (
+                    options.max_unique_barcodes > 0
+                    and len(unique) >= options.max_unique_barcodes
+                ):
+                    break
+                wait = _CONTINUOUS_POLL_INTERVAL_SECONDS
+                if timeout_at is not None:
+                    remaining = timeout_at - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    wait = min(wait, remaining)
+                budget_remaining = deadline.remaining()
+                if budget_remaining is not None:
+                    wait = min(wait, budget_remaining)
+
+                try:
+                    img = frames.get(timeout=wait)
+                except queue.Empty:
+                    continue
+                if isinstance(img, Exception):
+                    raise img
+
+                img, frame_allocated = self._preprocessor.run(img, params.preprocess)
+                allocated += frame_allocated
+                (
+                    ok,
+                    decoded_data,
+                    decoded_types,
+                    detected_corners,
+                ) = self.detect_with_roi(img, camera_slot, params, deadline)
+                frames_scanned += 1
+
+                frame_result = self.convert_to_result_proto(
+                    ok,
+                    decoded_data,
+                    decoded_types,
+                    detected_corners,
+                    params.corner_format,
+                )
+                for barcode in frame_result.barcodes:
+                    barcode.camera_slot = camera_slot
+                    unique.setdefault((barcode.type, barcode.data), barcode)
+        finally:
+            stop.set()
+            capture_thread.join()
+
+        result = scan_barcodes_pb2.ScanBarcodesResult(
+            barcodes=list(unique.values()),
+            frames_scanned=frames_scanned,
+            preprocess_bytes_allocated=allocated,
+            incomplete=deadline.incomplete,
+        )
+        logging.info(
+            "Continuous scan found %d unique barcode(s) in %d frame(s).",
+            len(result.barcodes),
+            frames_scanned,
+        )
+        return result
+
+    def detect_with_roi(
+        self,
+        img: np.ndarray,
+        camera_slot: str,
+        params: scan_barcodes_pb2.ScanBarcodesParams,
+        deadline: Optional[Deadline] = None,
+    ) -> Detections:
+        """Runs `detect` on the region of interest selected by `params`.
+
+        In adaptive mode the region around recent decodes from `camera_slot`
+        is searched first and the full frame only if that finds nothing.
+        """
+        deadline = deadline or Deadline()
+        if not params.HasField("roi"):
+            return self.detect(img, params, deadline)
+        roi = params.roi
+        height, width = img.shape[:2]
+        if roi.HasField("fixed"):
+            rect = roi.fixed
+            if rect.width <= 0 or rect.height <= 0:
+                raise ValueError(f"roi.fixed must have a positive size, got {rect}")
+            return self._detect_region(
+                img,
+                (
+                    max(0, rect.y),
+                    min(height, rect.y + rect.height),
+                    max(0, rect.x),
+                    min(width, rect.x + rect.width),
+                ),
+                params,
+                deadline,
+            )
+        if not roi.HasField("adaptive"):
+            return self.detect(img, params, deadline)
+
+        region = self._roi_tracker.search_region(
+            camera_slot, height, width, roi.adaptive
+        )
+        if region is not None:
+            detections = self._detect_region(img, region, params, deadline)
+            if detections[0]:
+                self._roi_tracker.record(camera_slot, detections[3], roi.adaptive)
+                return detections
+            if not self._continue(deadline):
+                return detections
+            logging.info("Nothing found in the adaptive ROI, scanning the full frame.")
+        detections = self.detect(img, params, deadline)
+        if detections[0]:
+            self._roi_tracker.record(camera_slot, detections[3], roi.adaptive)
+        return detections
+
+    def _detect_region(
+        self,
+        img: np.ndarray,
+        region: Tuple[int, int, int, int],
+        params: scan_barcodes_pb2.ScanBarcodesParams,
+        deadline: Deadline,
+    ) -> Detections:
+        """Runs `detect` on the (y0, y1, x0, x1) region of `img`."""
+        y0, y1, x0, x1 = region
+        if y1 <= y0 or x1 <= x0:
+            return False, (), (), np.empty((0, 4, 2), dtype=np.float32)
+        ok, data, types, corners = self.detect(img[y0:y1, x0:x1], params, deadline)
+        if not ok:
+            return False, (), (), np.empty((0, 4, 2), dtype=np.float32)
+        corners = np.asarray(corners, dtype=np.float32).reshape(-1, 4, 2)
+        return ok, data, types, corners + np.array([x0, y0], dtype=np.float32)
+
+    def detect(
+        self,
+        img: np.ndarray,
+        params: scan_barcodes_pb2.ScanBarcodesParams,
+        deadline: Optional[Deadline] = None,
+    ) -> Detections:
+        """Runs the detection strategy selected by `params` on one image.
+
+        Stages that would start after `deadline` has expired are skipped and
+        the deadline is marked incomplete.
+        """
+        deadline = deadline or Deadline()
+        if params.HasField("tiling"):
+            tiling = params.tiling
+            if max(1, tiling.rows) * max(1, tiling.cols) > 1:
+                detections = self.detect_tiled(img, tiling, deadline)
+                if detections[0] or not tiling.full_image_fallback:
+                    return detections
+                if not self._continue(deadline):
+                    return detections
+        elif params.HasField("pyramid"):
+            detections = self.detect_pyramid(img, params.pyramid, deadline)
+            if detections[0] or not params.pyramid.full_image_fallback:
+                return detections
+            if not self._continue(deadline):
+                return detections
+
+        def decode() -> Detections:
+            with self.detector_pool.checkout() as detector:
+                return detector.detectAndDecodeWithType(img)
+
+        detections = self._run_with_deadline(decode, deadline)
+        if detections is None:
+            return False, (), (), np.empty((0, 4, 2), dtype=np.float32)
+        return detections
+
+    def detect_tiled(
+        self,
+        img: np.ndarray,
+        tiling: scan_barcodes_pb2.TilingOptions,
+        deadline: Optional[Deadline] = None,
+    ) -> Detections:
+        """Decodes overlapping tiles of `img` in parallel and merges the results.
+
+        OpenCV releases the GIL while decoding, so the tiles are decoded
+        concurrently, each with a detector checked out from the pool.
+        """
+        tiles = split_into_tiles(
+            img.shape[0], img.shape[1], tiling.rows, tiling.cols, tiling.overlap_px
+        )
+        num_threads = tiling.num_threads
+        if num_threads <= 0:
+            num_threads = min(len(tiles), os.cpu_count() or 1)
+        return self._decode_regions(img, tiles, num_threads, deadline or Deadline())
+
+    def detect_pyramid(
+        self,
+        img: np.ndarray,
+        pyramid: scan_barcodes_pb2.PyramidOptions,
+        deadline: Optional[Deadline] = None,
+    ) -> Detections:
+        """Locates barcodes on a downsampled image and decodes full-res crops.
+
+        Only the coarse pass looks at the whole frame; decoding runs on padded
+        crops around each candidate, so empty background is never decoded at
+        full resolution.
+        """
+        deadline = deadline or Deadline()
+        scale = pyramid.scale_factor or _DEFAULT_PYRAMID_SCALE_FACTOR
+        if not 0 < scale < 1:
+            raise ValueError(f"pyramid.scale_factor must be in (0, 1), got {scale}")
+
+        small = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        def coarse_detect() -> Tuple[bool, np.ndarray]:
+            with self.detector_pool.checkout() as detector:
+                return detector.detect(small)
+
+        coarse = self._run_with_deadline(coarse_detect, deadline)
+        if coarse is None or not coarse[0] or coarse[1] is None:
+            return False, (), (), np.empty((0, 4, 2), dtype=np.float32)
+        coarse_corners = coarse[1]
+
+        height, width = img.shape[:2]
+        candidates = np.asarray(coarse_corners, dtype=np.float32).reshape(-1, 4, 2)
+        candidates /= scale
+        regions: List[Tuple[int, int, int, int]] = []
+        for quad in candidates:
+            x_min, y_min = quad.min(axis=0)
+            x_max, y_max = quad.max(axis=0)
+            size = max(x_max - x_min, y_max - y_min)
+            if size < pyramid.min_barcode_size_px:
+                continue
+            pad = size * (pyramid.crop_padding or _DEFAULT_PYRAMID_CROP_PADDING)
+            regions.append((
+                max(0, int(y_min - pad)),
+                min(height, int(np.ceil(y_max + pad))),
+                max(0, int(x_min - pad)),
+                min(width, int(np.ceil(x_max + pad))),
+            ))
+
+        logging.info(
+            "Pyramid pass found %d candidate(s) at scale %.3f.", len(regions), scale
+        )
+        if not regions:
+            return False, (), (), np.empty((0, 4, 2), dtype=np.float32)
+        return self._decode_regions(
+            img, regions, min(len(regions), os.cpu_count() or 1), deadline
+        )
+
+    def _decode_regions(
+        self,
+        img: np.ndarray,
+        regions: Sequence[Tuple[int, int, int, int]],
+        num_threads: int,
+        deadline: Deadline,
+    ) -> Detections:
+        """Decodes (y0, y1, x0, x1) regions of `img` in parallel.
+
+        Corners are translated back to full-image coordinates and duplicates
+        found in overlapping regions are merged. Regions that are not decoded
+        within the time budget are dropped.
+        """
+        executor = self._get_worker_executor(num_threads)
+
+        def decode_region(bounds: Tuple[int, int, int, int]) -> Detections:
+            y0, y1, x0, x1 = bounds
+            if deadline.expired() or deadline.cancelled:
+                deadline.incomplete = True
+                return False, (), (), np.empty((0, 4, 2), dtype=np.float32)
+            with self.detector_pool.checkout() as detector:
+                ok, data, types, corners = detector.detectAndDecodeWithType(
+                    img[y0:y1, x0:x1]
+                )
+            if not ok:
+                return False, (), (), np.empty((0, 4, 2), dtype=np.float32)
+            corners = np.asarray(corners, dtype=np.float32).reshape(-1, 4, 2)
+            return ok, data, types, corners + np.array([x0, y0], dtype=np.float32)
+
+        pending = [executor.submit(decode_region, region) for region in regions]
+        done, not_done = futures.wait(pending, timeout=deadline.remaining())
+        if not_done:
+            logging.info(
+                "Time budget ran out with %d of %d region(s) undecoded.",
+                len(not_done),
+                len(pending),
+            )
+            deadline.incomplete = True
+            for future in not_done:
+                future.cancel()
+
+        all_data: List[str] = []
+        all_types: List[str] = []
+        all_corners: List[np.ndarray] = []
+        for future in pending:
+            if future not in done:
+                continue
+            ok, data, types, corners = future.result()
+            if ok:
+                all_data.extend(data)
+                all_types.extend(types)
+                all_corners.append(corners)
+
+        if not all_data:
+            return False, (), (), np.empty((0, 4, 2), dtype=np.float32)
+        return merge_detections(all_data, all_types, np.concatenate(all_corners))
+
+    def _run_with_deadline(
+        self, fn: Callable[[], _T], deadline: Deadline
+    ) -> Optional[_T]:
+        """Returns fn(), or None if it does not finish within the time budget.
+
+        Without a budget `fn` runs on the calling thread. Otherwise it runs on
+        a worker thread so that the caller can stop waiting for it.
+        """
+        remaining = deadline.remaining()
+        if remaining is None:
+            return fn()
+        if remaining <= 0:
+            deadline.incomplete = True
+            return None
+        executor = self._get_worker_executor(self.detector_pool.size, kind="deadline")
+        future = executor.submit(fn)
+        try:
+            return future.result(timeout=remaining)
+        except futures.TimeoutError:
+            logging.info("Time budget ran out while decoding.")
+            future.cancel()
+            deadline.incomplete = True
+            return None
+
+    def _continue(self, deadline: Deadline) -> bool:
+        """Returns whether a further stage may start, checking for cancellation."""
+        deadline.check_cancelled()
+        if deadline.expired():
+            deadline.incomplete = True
+            return False
+        return True
+
+    def _get_worker_executor(
+        self, num_threads: int, kind: str = "region"
+    ) -> futures.ThreadPoolExecutor:
+        """Returns a shared executor with `num_threads` threads.
+
+        Executors of different kinds are kept apart so that a task running on
+        one kind can wait on tasks of another without exhausting its own pool.
+        """
+        key = (kind, num_threads)
+        with self._worker_executors_lock:
+            executor = self._worker_executors.get(key)
+            if executor is None:
+                executor = futures.ThreadPoolExecutor(
+                    max_workers=num_threads,
+                    thread_name_prefix=f"scan_barcodes_{kind}",
+                )
+                self._worker_executors[key] = executor
+            return executor
 
     # [START convert_to_result_proto]
     def convert_to_result_proto(
         self,
         ok: bool,
-        decoded_data: List[str],
-        decoded_types: List[int],
+        decoded_data: Sequence[str],
+        decoded_types: Sequence[str],
         detected_corners: np.ndarray,
+        corner_format: scan_barcodes_pb2.CornerFormat = (
+            scan_barcodes_pb2.CORNER_FORMAT_MESSAGES
+        ),
     ) -> scan_barcodes_pb2.ScanBarcodesResult:
         if not ok:
             return scan_barcodes_pb2.ScanBarcodesResult()
 
-        barcodes: List[scan_barcodes_pb2.Barcode] = []
-        for i, barcode_type in enumerate(decoded_types):
-            barcode_data = decoded_data[i]
-            barcode_corners = detected_corners[i]
-
-            corners: List[scan_barcodes_pb2.Corner] = []
-            for barcode_corner in barcode_corners:
-                corner = scan_barcodes_pb2.Corner(
-                    x=barcode_corner[0],
-                    y=barcode_corner[1],
-                )
-                corners.append(corner)
+        # Convert all corners at once. tolist() yields Python floats, so the
+        # proto setters do not convert numpy scalars one at a time.
+        corners_xy = (
+            np.asarray(detected_corners, dtype=np.float64)
+            .reshape(len(decoded_types), 8)
+            .tolist()
+        )
+        with_messages = corner_format != scan_barcodes_pb2.CORNER_FORMAT_PACKED
+        with_packed = corner_format != scan_barcodes_pb2.CORNER_FORMAT_MESSAGES
 
+        barcodes: List[scan_barcodes_pb2.Barcode] = []
+        for barcode_type, barcode_data, xy in zip(
+            decoded_types, decoded_data, corners_xy
+        ):
             barcode = scan_barcodes_pb2.Barcode(
-                type=convert_barcode_type_to_proto(barcode_type),
+                type=_BARCODE_TYPES.get(
+                    barcode_type, scan_barcodes_pb2.BARCODE_UNSPECIFIED
+                ),
                 data=barcode_data,
-                corners=corners,
             )
+            if with_messages:
+                corners = barcode.corners
+                corners.add(x=xy[0], y=xy[1])
+                corners.add(x=xy[2], y=xy[3])
+                corners.add(x=xy[4], y=xy[5])
+                corners.add(x=xy[6], y=xy[7])
+            if with_packed:
+                barcode.corners_xy.extend(xy)
             barcodes.append(barcode)
 
         return scan_barcodes_pb2.ScanBarcodesResult(barcodes=barcodes)
@@ -0,0 +1,138 @@
+// Benchmarks the C++ ScanBarcodes decode path on frames written by
+// scan_barcodes_benchmark.py.
+//
+// Every `<case>.raw` file in --image_dir holds a little-endian int32 header
+// (rows, cols, channels) followed by 8-bit pixel data. For each case one line
+// of space-separated key=value pairs is printed to stdout. decoded_data lists
+// the comma-separated texts read from the last frame; the Python side matches
+// them against the expected barcodes. A last line holds the peak RSS of the
+// whole run.
+
+#include <algorithm>
+#include <chrono>
+#include <cstdint>
+#include <filesystem>
+#include <fstream>
+#include <iostream>
+#include <limits>
+#include <string>
+#include <vector>
+
+#include "absl/flags/flag.h"
+#include "absl/flags/parse.h"
+#include "absl/status/statusor.h"
+#include "opencv2/core/mat.hpp"
+#include "skills/scan_barcodes/scan_barcodes.h"
+
+ABSL_FLAG(std::string, image_dir, "", "Directory with the .raw frames to decode.");
+ABSL_FLAG(int, frames, 20, "Number of timed decodes per case.");
+ABSL_FLAG(int, warmup, 2, "Number of untimed decodes per case.");
+
+namespace {
+
+absl::StatusOr<cv::Mat> ReadRawImage(const std::filesystem::path& path) {
+  std::ifstream in(path, std::ios::binary);
+  int32_t header[3];
+  if (!in.read(reinterpret_cast<char*>(header), sizeof(header))) {
+    return absl::InvalidArgumentError("Cannot read header of " + path.string());
+  }
+  const int rows = header[0];
+  const int cols = header[1];
+  const int channels = header[2];
+  cv::Mat img(rows, cols, CV_8UC(channels));
+  if (!in.read(reinterpret_cast<char*>(img.data),
+               static_cast<std::streamsize>(img.total() * img.elemSize()))) {
+    return absl::InvalidArgumentError("Truncated image data in " + path.string());
+  }
+  return img;
+}
+
+// Nearest-rank percentile, the same rule as _percentile() in
+// scan_barcodes_benchmark.py.
+double Percentile(std::vector<double> values, double q) {
+  std::sort(values.begin(), values.end());
+  const size_t index = std::min(
+      values.size() - 1, static_cast<size_t>(q * (values.size() - 1) + 0.5));
+  return values[index];
+}
+
+// Reads VmHWM rather than ru_maxrss, which exec() inherits from the Python
+// process that started this binary.
+double PeakRssMb() {
+  std::ifstream status("/proc/self/status");
+  std::string key;
+  while (status >> key) {
+    if (key == "VmHWM:") {
+      double kib = 0;
+      status >> kib;
+      return kib / 1024.0;
+    }
+    status.ignore(std::numeric_limits<std::streamsize>::max(), '\n');
+  }
+  return 0;
+}
+
+}  // namespace
+
+int main(int argc, char** argv) {
+  absl::ParseCommandLine(argc, argv);
+  const std::string image_dir = absl::GetFlag(FLAGS_image_dir);
+  const int frames = std::max(1, absl::GetFlag(FLAGS_frames));
+  const int warmup = absl::GetFlag(FLAGS_warmup);
+
+  std::vector<std::filesystem::path> paths;
+  for (const auto& entry : std::filesystem::directory_iterator(image_dir)) {
+    if (entry.path().extension() == ".raw") {
+      paths.push_back(entry.path());
+    }
+  }
+  std::sort(paths.begin(), paths.end());
+
+  scan_barcodes::ScanBarcodes skill;
+  for (const auto& path : paths) {
+    absl::StatusOr<cv::Mat> img = ReadRawImage(path);
+    if (!img.ok()) {
+      std::cerr << img.status() << std::endl;
+      return 1;
+    }
+
+    std::string decoded_data;
+    std::vector<double> latencies_ms;
+    for (int i = 0; i < warmup + frames; ++i) {
+      const auto start = std::chrono::steady_clock::now();
+      auto result = skill.ScanImage(*img);
+      const auto end = std::chrono::steady_clock::now();
+      if (!result.ok()) {
+        std::cerr << result.status() << std::endl;
+        return 1;
+      }
+      if (i < warmup) {
+        continue;
+      }
+      latencies_ms.push_back(
+          std::chrono::duration<double, std::milli>(end - start).count());
+      decoded_data.clear();
+      for (const auto& barcode : (*result)->barcodes()) {
+        if (barcode.data().empty()) {
+          continue;
+        }
+        if (!decoded_data.empty()) {
+          decoded_data += ",";
+        }
+        decoded_data += barcode.data();
+      }
+    }
+
+    double total_ms = 0;
+    for (double latency : latencies_ms) {
+      total_ms += latency;
+    }
+    std::cout << "case=" << path.stem().string()
+              << " fps=" << 1000.0 * latencies_ms.size() / total_ms
+              << " p50_ms=" << Percentile(latencies_ms, 0.5)
+              << " p99_ms=" << Percentile(latencies_ms, 0.99)
+              << " decoded_data=" << decoded_data << std::endl;
+  }
+  std::cout << "peak_rss_mb=" << PeakRssMb() << std::endl;
+  return 0;
+}
@@ -0,0 +1,257 @@
+"""Benchmarks the scan_barcodes skill on synthetic barcode images.
+
+Every combination of --resolutions, --counts, --rotations and --noise is
+rendered once with EAN-8, EAN-13, UPC-A and UPC-E barcodes. The Python skill
+then decodes it --frames times through a fake camera. The same frames are
+written to --image_dir and, if the C++ benchmark binary is available, decoded
+by the C++ implementation, so both are reported side by side. Both sides
+count a barcode as decoded only if its expected text was read, and use the
+same nearest-rank percentiles. Peak RSS is a process high-water mark, so it
+is reported once per implementation for the whole run.
+
+Example:
+  bazel run //skills/scan_barcodes:scan_barcodes_benchmark -- \\
+      --frames=50 --params='tiling { rows: 2 cols: 2 overlap_px: 400 }'
+"""
+
+import os
+import resource
+import subprocess
+import tempfile
+import time
+from typing import Dict, Iterable, List, Sequence, Tuple
+from unittest import mock
+
+from absl import app
+from absl import flags
+from absl import logging
+from google.protobuf import text_format
+import numpy as np
+
+from intrinsic.perception.python.camera import cameras
+from intrinsic.skills.python import skill_interface
+
+try:
+    from rules_python.python.runfiles import runfiles
+except ImportError:
+    # https://github.com/bazelbuild/rules_python/issues/1679
+    from python.runfiles import runfiles
+
+from skills.scan_barcodes import scan_barcodes
+from skills.scan_barcodes import scan_barcodes_pb2
+from skills.scan_barcodes import synthetic_barcodes
+
+_FRAMES = flags.DEFINE_integer("frames", 20, "Number of timed scans per case.")
+_WARMUP = flags.DEFINE_integer("warmup", 2, "Number of untimed scans per case.")
+_RESOLUTIONS = flags.DEFINE_list(
+    "resolutions", ["1936x1216", "4000x3000"], "Frame sizes as WIDTHxHEIGHT."
+)
+_COUNTS = flags.DEFINE_list("counts", ["1", "8"], "Barcodes per frame.")
+_ROTATIONS = flags.DEFINE_list(
+    "rotations", ["0", "15"], "Maximum barcode rotation in degrees."
+)
+_NOISE = flags.DEFINE_list("noise", ["0", "8"], "Gaussian noise sigma in gray levels.")
+_PARAMS = flags.DEFINE_string(
+    "params", "", "ScanBarcodesParams in text format used for the Python skill."
+)
+_IMAGE_DIR = flags.DEFINE_string(
+    "image_dir", "", "Where frames are written for the C++ benchmark. "
+    "Defaults to a temporary directory."
+)
+_CC_BENCHMARK = flags.DEFINE_string(
+    "cc_benchmark", "", "Path to scan_barcodes_benchmark_cc. Defaults to the "
+    "binary in the runfiles; the C++ comparison is skipped if it is missing."
+)
+
+_CC_BENCHMARK_RUNFILE = "examples/skills/scan_barcodes/scan_barcodes_benchmark_cc"
+
+
+class _FakeCamera:
+    """Camera that returns the same frame on every capture."""
+
+    def __init__(self, img: np.ndarray) -> None:
+        self._sensor_image = mock.NonCallableMock(array=img)
+
+    def capture(self, *args, **kwargs):
+        return self._sensor_image
+
+
+def _normalize(text: str) -> str:
+    # cv2 reports an EAN-13 with a leading zero as UPC-A without that zero.
+    return text[1:] if len(text) == 13 and text.startswith("0") else text
+
+
+def _count_decoded(expected: List[Tuple[str, str]], data: Iterable[str]) -> int:
+    """Returns how many of the expected barcodes were read correctly."""
+    decoded = {_normalize(text) for text in data}
+    return sum(_normalize(text) in decoded for _, text in expected)
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is the high-water mark of the whole process, in KiB on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def _percentile(latencies: Sequence[float], q: float) -> float:
+    # Same nearest-rank rule as Percentile() in scan_barcodes_benchmark.cc.
+    values = sorted(latencies)
+    return values[min(len(values) - 1, int(q * (len(values) - 1) + 0.5))]
+
+
+def _write_raw(path: str, img: np.ndarray) -> None:
+    """Writes `img` in the format read by scan_barcodes_benchmark.cc."""
+    channels = img.shape[2] if img.ndim == 3 else 1
+    with open(path, "wb") as f:
+        f.write(np.array([img.shape[0], img.shape[1], channels], "<i4").tobytes())
+        f.write(np.ascontiguousarray(img).tobytes())
+
+
+def _benchmark_python(
+    skill: scan_barcodes.ScanBarcodes,
+    params: scan_barcodes_pb2.ScanBarcodesParams,
+    img: np.ndarray,
+    expected: List[Tuple[str, str]],
+) -> Dict[str, float]:
+    context = mock.create_autospec(
+        spec=skill_interface.ExecuteContext, instance=True
+    )
+    # An autospecced attribute is truthy; the skill would see a cancellation.
+    context.canceller.cancelled = False
+    request = skill_interface.ExecuteRequest(params=params)
+    latencies_ms: List[float] = []
+    # The skill logs every result; keep that out of the timings.
+    verbosity = logging.get_verbosity()
+    logging.set_verbosity(logging.WARNING)
+    try:
+        with mock.patch.object(
+            cameras.Camera, "create", return_value=_FakeCamera(img)
+        ):
+            for i in range(_WARMUP.value + _FRAMES.value):
+                start = time.perf_counter()
+                result = skill.execute(request, context)
+                if i >= _WARMUP.value:
+                    latencies_ms.append((time.perf_counter() - start) * 1e3)
+    finally:
+        logging.set_verbosity(verbosity)
+
+    return {
+        "fps": 1e3 * len(latencies_ms) / sum(latencies_ms),
+        "p50_ms": _percentile(latencies_ms, 0.5),
+        "p99_ms": _percentile(latencies_ms, 0.99),
+        "decoded": _count_decoded(
+            expected, (barcode.data for barcode in result.barcodes)
+        ),
+    }
+
+
+def _benchmark_cc(
+    binary: str, image_dir: str, expected: Dict[str, List[Tuple[str, str]]]
+) -> Tuple[Dict[str, Dict[str, float]], float]:
+    """Returns the stats per case and the peak RSS in MB of the C++ run."""
+    output = subprocess.run(
+        [
+            binary,
+            f"--image_dir={image_dir}",
+            f"--frames={_FRAMES.value}",
+            f"--warmup={_WARMUP.value}",
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    results = {}
+    peak_rss_mb = 0.0
+    for line in output.splitlines():
+        fields = dict(field.split("=", 1) for field in line.split())
+        if "case" not in fields:
+            peak_rss_mb = float(fields["peak_rss_mb"])
+            continue
+        name = fields.pop("case")
+        data = fields.pop("decoded_data")
+        results[name] = {key: float(value) for key, value in fields.items()}
+        results[name]["decoded"] = _count_decoded(
+            expected.get(name, []), data.split(",") if data else []
+        )
+    return results, peak_rss_mb
+
+
+def _find_cc_benchmark() -> str:
+    if _CC_BENCHMARK.value:
+        return _CC_BENCHMARK.value
+    try:
+        path = runfiles.Create().Rlocation(_CC_BENCHMARK_RUNFILE)
+    except Exception:  # pylint: disable=broad-except
+        return ""
+    return path if path and os.path.exists(path) else ""
+
+
+def _format_row(name: str, impl: str, stats: Dict[str, float], expected: int) -> str:
+    return (
+        f"{name:<34} {impl:<6} {stats['fps']:>8.1f} {stats['p50_ms']:>9.1f}"
+        f" {stats['p99_ms']:>9.1f}"
+        f" {int(stats['decoded']):>4}/{expected:<4}"
+    )
+
+
+def main(argv: Sequence[str]) -> None:
+    del argv  # Unused.
+
+    params = text_format.Parse(_PARAMS.value, scan_barcodes_pb2.ScanBarcodesParams())
+    image_dir = _IMAGE_DIR.value or tempfile.mkdtemp(prefix="scan_barcodes_benchmark_")
+    os.makedirs(image_dir, exist_ok=True)
+
+    specs = []
+    for resolution in _RESOLUTIONS.value:
+        width, height = (int(v) for v in resolution.split("x"))
+        for count in _COUNTS.value:
+            for rotation in _ROTATIONS.value:
+                for noise in _NOISE.value:
+                    specs.append(synthetic_barcodes.SceneSpec(
+                        height=height,
+                        width=width,
+                        count=int(count),
+                        max_rotation_deg=float(rotation),
+                        noise_sigma=float(noise),
+                    ))
+
+    skill = scan_barcodes.ScanBarcodes()
+    python_results = {}
+    expected_barcodes = {}
+    for spec in specs:
+        img, expected = synthetic_barcodes.make_scene(spec)
+        _write_raw(os.path.join(image_dir, spec.name + ".raw"), img)
+        python_results[spec.name] = _benchmark_python(skill, params, img, expected)
+        expected_barcodes[spec.name] = expected
+    python_rss_mb = _peak_rss_mb()
+
+    cc_results = {}
+    cc_rss_mb = 0.0
+    cc_benchmark = _find_cc_benchmark()
+    if cc_benchmark:
+        cc_results, cc_rss_mb = _benchmark_cc(
+            cc_benchmark, image_dir, expected_barcodes
+        )
+    else:
+        print("C++ benchmark binary not found, reporting Python only.")
+
+    print(
+        f"{'case':<34} {'impl':<6} {'fps':>8} {'p50 ms':>9} {'p99 ms':>9}"
+        f" {'decoded':>9}"
+    )
+    for spec in specs:
+        expected_count = len(expected_barcodes[spec.name])
+        print(_format_row(
+            spec.name, "python", python_results[spec.name], expected_count
+        ))
+        if spec.name in cc_results:
+            print(_format_row(
+                spec.name, "c++", cc_results[spec.name], expected_count
+            ))
+    print(f"Peak RSS of the whole run: python {python_rss_mb:.0f} MB", end="")
+    if cc_results:
+        print(f", c++ {cc_rss_mb:.0f} MB", end="")
+    print(f". Frames are in {image_dir}.")
+
+
+if __name__ == "__main__":
+    app.run(main)
@@ -1,3 +1,6 @@
+from concurrent import futures
+import os
+import time
 import unittest
 from unittest.mock import create_autospec
 from unittest.mock import patch
@@ -15,7 +18,10 @@ from intrinsic.perception.python.camera.cameras import Camera
 from intrinsic.perception.python.camera.data_classes import SensorImage
 from intrinsic.skills.python import skill_interface
 
+from skills.scan_barcodes.scan_barcodes import DETECTOR_POOL_SIZE_ENV
+from skills.scan_barcodes.scan_barcodes import Preprocessor
 from skills.scan_barcodes.scan_barcodes import ScanBarcodes
+from skills.scan_barcodes.scan_barcodes import split_into_tiles
 from skills.scan_barcodes import scan_barcodes_pb2
 
 
@@ -26,6 +32,7 @@ class ScanBarcodesTest(unittest.TestCase):
             spec=skill_interface.ExecuteContext,
             spec_set=True,
             instance=True)
+        mock_context.canceller.cancelled = False
 
         return mock_context
     
@@ -83,6 +90,439 @@ class ScanBarcodesTest(unittest.TestCase):
         self.assertEqual(1, len(result.barcodes))
         self.assertEqual(scan_barcodes_pb2.BARCODE_EAN_8, result.barcodes[0].type)
         self.assertEqual("01234565", result.barcodes[0].data)
+        self.assertEqual(1, result.frames_scanned)
+
+    def test_frame_cache_reuses_result_for_unchanged_frame(self):
+        dut_skill = ScanBarcodes()
+        params = scan_barcodes_pb2.ScanBarcodesParams(
+            frame_cache=scan_barcodes_pb2.FrameCacheOptions(max_entries=4))
+        mock_request = skill_interface.ExecuteRequest(params=params)
+
+        mock_context = self.make_execute_context()
+
+        barcode_image = self.load_test_image("EAN-8_0123456.png")
+        test_image = create_autospec(spec=SensorImage, spec_set=True, instance=True)
+        test_image.array = barcode_image
+        self.mock_camera.capture.return_value = test_image
+
+        first = dut_skill.execute(mock_request, mock_context)
+        self.assertFalse(first.from_cache)
+        self.assertEqual(1, first.frames_scanned)
+
+        # Sensor noise alone does not count as a change.
+        noisy = barcode_image.astype(np.int16) + np.random.randint(
+            -3, 4, barcode_image.shape)
+        test_image.array = np.clip(noisy, 0, 255).astype(np.uint8)
+        with patch.object(dut_skill, 'detect', autospec=True) as mock_detect:
+            second = dut_skill.execute(mock_request, mock_context)
+            mock_detect.assert_not_called()
+        self.assertTrue(second.from_cache)
+        self.assertEqual(0, second.frames_scanned)
+        self.assertEqual(first.barcodes, second.barcodes)
+
+        # A different scene is decoded again.
+        test_image.array = np.zeros_like(barcode_image)
+        third = dut_skill.execute(mock_request, mock_context)
+        self.assertFalse(third.from_cache)
+        self.assertEqual(0, len(third.barcodes))
+
+    def test_preprocessing_reuses_buffers(self):
+        dut_skill = ScanBarcodes()
+        params = scan_barcodes_pb2.ScanBarcodesParams(
+            preprocess=scan_barcodes_pb2.PreprocessOptions(
+                grayscale=True, normalize_contrast=True))
+        mock_request = skill_interface.ExecuteRequest(params=params)
+
+        mock_context = self.make_execute_context()
+
+        # A low contrast color frame; preprocessing must keep it decodable.
+        barcode_image = self.load_test_image("EAN-8_0123456.png")
+        test_image = create_autospec(spec=SensorImage, spec_set=True, instance=True)
+        test_image.array = (barcode_image // 4 + 96).astype(np.uint8)
+        self.mock_camera.capture.return_value = test_image
+
+        first = dut_skill.execute(mock_request, mock_context)
+        self.assertEqual(["01234565"], [barcode.data for barcode in first.barcodes])
+        self.assertEqual(
+            barcode_image.shape[0] * barcode_image.shape[1],
+            first.preprocess_bytes_allocated)
+
+        second = dut_skill.execute(mock_request, mock_context)
+        self.assertEqual(first.barcodes, second.barcodes)
+        self.assertEqual(0, second.preprocess_bytes_allocated)
+
+    def test_preprocessing_does_not_copy_mono8(self):
+        preprocessor = Preprocessor()
+        mono8 = np.zeros((8, 8, 1), dtype=np.uint8)
+
+        img, allocated = preprocessor.run(
+            mono8, scan_barcodes_pb2.PreprocessOptions(grayscale=True))
+        self.assertEqual((8, 8), img.shape)
+        self.assertTrue(np.shares_memory(img, mono8))
+        self.assertEqual(0, allocated)
+
+        img, allocated = preprocessor.run(
+            mono8, scan_barcodes_pb2.PreprocessOptions())
+        self.assertIs(mono8, img)
+        self.assertEqual(0, allocated)
+
+    def test_tiled_detection_merges_overlapping_tiles(self):
+        dut_skill = ScanBarcodes()
+        params = scan_barcodes_pb2.ScanBarcodesParams(
+            tiling=scan_barcodes_pb2.TilingOptions(
+                rows=2, cols=2, overlap_px=200))
+        mock_request = skill_interface.ExecuteRequest(params=params)
+
+        mock_context = self.make_execute_context()
+
+        # Place the barcode where it is fully contained in two tiles.
+        canvas = np.full((400, 800, 3), 255, dtype=np.uint8)
+        canvas[200:350, 450:750] = self.load_test_image("EAN-8_0123456.png")
+        test_image = create_autospec(spec=SensorImage, spec_set=True, instance=True)
+        test_image.array = canvas
+        self.mock_camera.capture.return_value = test_image
+
+        result = dut_skill.execute(mock_request, mock_context)
+        self.assertEqual(1, len(result.barcodes))
+        self.assertEqual("01234565", result.barcodes[0].data)
+
+        # Corners are reported in full-image coordinates.
+        _, _, _, expected_corners = cv2.barcode.BarcodeDetector().detectAndDecodeWithType(
+            canvas)
+        for corner, expected in zip(result.barcodes[0].corners, expected_corners[0]):
+            self.assertAlmostEqual(expected[0], corner.x, delta=10.0)
+            self.assertAlmostEqual(expected[1], corner.y, delta=10.0)
+
+    def test_fixed_roi_limits_search(self):
+        dut_skill = ScanBarcodes()
+        mock_context = self.make_execute_context()
+
+        canvas = np.full((400, 800, 3), 255, dtype=np.uint8)
+        canvas[200:350, 450:750] = self.load_test_image("EAN-8_0123456.png")
+        test_image = create_autospec(spec=SensorImage, spec_set=True, instance=True)
+        test_image.array = canvas
+        self.mock_camera.capture.return_value = test_image
+
+        def scan(x, y, width, height):
+            params = scan_barcodes_pb2.ScanBarcodesParams(
+                roi=scan_barcodes_pb2.RoiOptions(
+                    fixed=scan_barcodes_pb2.Rectangle(
+                        x=x, y=y, width=width, height=height)))
+            return dut_skill.execute(
+                skill_interface.ExecuteRequest(params=params), mock_context)
+
+        self.assertEqual(0, len(scan(0, 0, 400, 200).barcodes))
+        result = scan(300, 100, 500, 300)
+        self.assertEqual(1, len(result.barcodes))
+        # Corners are reported in full-image coordinates.
+        for corner in result.barcodes[0].corners:
+            self.assertGreaterEqual(corner.x, 300)
+            self.assertGreaterEqual(corner.y, 100)
+
+    def test_adaptive_roi_searches_recent_region_first(self):
+        dut_skill = ScanBarcodes()
+        params = scan_barcodes_pb2.ScanBarcodesParams(
+            roi=scan_barcodes_pb2.RoiOptions(
+                adaptive=scan_barcodes_pb2.AdaptiveRoiOptions()))
+        mock_request = skill_interface.ExecuteRequest(params=params)
+        mock_context = self.make_execute_context()
+
+        canvas = np.full((400, 800, 3), 255, dtype=np.uint8)
+        canvas[200:350, 450:750] = self.load_test_image("EAN-8_0123456.png")
+        test_image = create_autospec(spec=SensorImage, spec_set=True, instance=True)
+        test_image.array = canvas
+        self.mock_camera.capture.return_value = test_image
+
+        searched_shapes = []
+        detect = dut_skill.detect
+
+        def record_detect(img, detect_params, deadline=None):
+            searched_shapes.append(img.shape[:2])
+            return detect(img, detect_params, deadline)
+
+        with patch.object(dut_skill, 'detect', side_effect=record_detect):
+            first = dut_skill.execute(mock_request, mock_context)
+            second = dut_skill.execute(mock_request, mock_context)
+            # The barcode moved away from the remembered region.
+            test_image.array = np.roll(canvas, -300, axis=1)
+            third = dut_skill.execute(mock_request, mock_context)
+
+        for result in (first, second, third):
+            self.assertEqual(["01234565"], [barcode.data for barcode in result.barcodes])
+        self.assertEqual((400, 800), searched_shapes[0])
+        self.assertLess(
+            searched_shapes[1][0] * searched_shapes[1][1], 400 * 800 / 2)
+        # The miss in the old region falls back to the full frame.
+        self.assertEqual((400, 800), searched_shapes[-1])
+        self.assertEqual(4, len(searched_shapes))
+
+    def test_pyramid_detection_reports_full_image_corners(self):
+        dut_skill = ScanBarcodes()
+        params = scan_barcodes_pb2.ScanBarcodesParams(
+            pyramid=scan_barcodes_pb2.PyramidOptions(
+                scale_factor=0.5, min_barcode_size_px=100))
+        mock_request = skill_interface.ExecuteRequest(params=params)
+
+        mock_context = self.make_execute_context()
+
+        # A large, mostly empty frame with a single barcode in it.
+        barcode = cv2.resize(
+            self.load_test_image("EAN-8_0123456.png"), None, fx=2, fy=2)
+        height, width = barcode.shape[:2]
+        canvas = np.full((4 * height, 3 * width, 3), 255, dtype=np.uint8)
+        canvas[2 * height:3 * height, width:2 * width] = barcode
+        test_image = create_autospec(spec=SensorImage, spec_set=True, instance=True)
+        test_image.array = canvas
+        self.mock_camera.capture.return_value = test_image
+
+        result = dut_skill.execute(mock_request, mock_context)
+        self.assertEqual(1, len(result.barcodes))
+        self.assertEqual("01234565", result.barcodes[0].data)
+        for corner in result.barcodes[0].corners:
+            self.assertGreaterEqual(corner.x, width)
+            self.assertLessEqual(corner.x, 2 * width)
+            self.assertGreaterEqual(corner.y, 2 * height)
+            self.assertLessEqual(corner.y, 3 * height)
+
+    def test_convert_to_result_proto_corner_formats(self):
+        dut_skill = ScanBarcodes()
+        corners = np.arange(3 * 4 * 2, dtype=np.float32).reshape(3, 4, 2)
+        data = ("1", "2", "3")
+        types = ("EAN_8", "UPC_E", "unknown")
+
+        messages = dut_skill.convert_to_result_proto(True, data, types, corners)
+        packed = dut_skill.convert_to_result_proto(
+            True, data, types, corners, scan_barcodes_pb2.CORNER_FORMAT_PACKED)
+        both = dut_skill.convert_to_result_proto(
+            True, data, types, corners, scan_barcodes_pb2.CORNER_FORMAT_BOTH)
+
+        self.assertEqual(
+            [scan_barcodes_pb2.BARCODE_EAN_8, scan_barcodes_pb2.BARCODE_UPC_E,
+             scan_barcodes_pb2.BARCODE_UNSPECIFIED],
+            [barcode.type for barcode in messages.barcodes])
+        for i in range(3):
+            expected = corners[i].reshape(-1).tolist()
+            self.assertEqual(
+                expected,
+                [v for c in messages.barcodes[i].corners for v in (c.x, c.y)])
+            self.assertEqual(0, len(messages.barcodes[i].corners_xy))
+            self.assertEqual(expected, list(packed.barcodes[i].corners_xy))
+            self.assertEqual(0, len(packed.barcodes[i].corners))
+            self.assertEqual(messages.barcodes[i].corners, both.barcodes[i].corners)
+            self.assertEqual(expected, list(both.barcodes[i].corners_xy))
+
+    def test_split_into_tiles_covers_image(self):
+        tiles = split_into_tiles(100, 200, rows=2, cols=3, overlap_px=10)
+        self.assertEqual(6, len(tiles))
+        self.assertEqual((0, 55, 0, 71), tiles[0])
+        self.assertEqual((45, 100, 128, 200), tiles[-1])
+
+    def test_multiple_cameras_are_scanned_concurrently(self):
+        dut_skill = ScanBarcodes()
+        params = scan_barcodes_pb2.ScanBarcodesParams(
+            camera_slots=["camera", "camera_2"])
+        mock_request = skill_interface.ExecuteRequest(params=params)
+
+        mock_context = self.make_execute_context()
+        mock_context.resource_handles = {"camera": None, "camera_2": None}
+
+        capture_seconds = 0.1
+        captures = []
+        barcode_image = create_autospec(spec=SensorImage, spec_set=True, instance=True)
+        barcode_image.array = self.load_test_image("EAN-8_0123456.png")
+        black_image = create_autospec(spec=SensorImage, spec_set=True, instance=True)
+        black_image.array = np.zeros((1216, 1936, 3), dtype=np.uint8)
+
+        def make_camera(image):
+            camera = create_autospec(spec=Camera, spec_set=True, instance=True)
+            def slow_capture(*args, **kwargs):
+                start = time.monotonic()
+                time.sleep(capture_seconds)
+                captures.append((start, time.monotonic()))
+                return image
+            camera.capture.side_effect = slow_capture
+            return camera
+
+        slot_cameras = {
+            "camera": make_camera(black_image),
+            "camera_2": make_camera(barcode_image),
+        }
+        self.mock_camera_class.create.side_effect = (
+            lambda context, slot: slot_cameras[slot])
+
+        result = dut_skill.execute(mock_request, mock_context)
+
+        self.assertEqual(2, result.frames_scanned)
+        self.assertEqual(1, len(result.barcodes))
+        self.assertEqual("01234565", result.barcodes[0].data)
+        self.assertEqual("camera_2", result.barcodes[0].camera_slot)
+        # Both captures overlap instead of running back to back.
+        self.assertEqual(2, len(captures))
+        self.assertLess(max(start for start, _ in captures),
+                        min(end for _, end in captures))
+
+    def test_unbound_camera_slot_is_rejected(self):
+        dut_skill = ScanBarcodes()
+        params = scan_barcodes_pb2.ScanBarcodesParams(
+            camera_slots=["camera", "camera_2"])
+        mock_request = skill_interface.ExecuteRequest(params=params)
+        mock_context = self.make_execute_context()
+        mock_context.resource_handles = {"camera": None}
+
+        with self.assertRaisesRegex(ValueError, "camera_2"):
+            dut_skill.execute(mock_request, mock_context)
+        self.mock_camera_class.create.assert_not_called()
+
+    def test_throughput_scales_with_detector_pool_size(self):
+        pool_size = 4
+        decode_seconds = 0.05
+
+        class SlowDetector:
+            """Stands in for a detector; sleeping releases the GIL like cv2."""
+
+            def detectAndDecodeWithType(self, img):
+                time.sleep(decode_seconds)
+                return False, (), (), None
+
+        dut_skill = ScanBarcodes(
+            detector_pool_size=pool_size, detector_factory=SlowDetector)
+        mock_request = skill_interface.ExecuteRequest(
+            params=scan_barcodes_pb2.ScanBarcodesParams())
+        mock_context = self.make_execute_context()
+        black_image = create_autospec(spec=SensorImage, spec_set=True, instance=True)
+        black_image.array = np.zeros((16, 16, 3), dtype=np.uint8)
+        self.mock_camera.capture.return_value = black_image
+
+        def throughput(concurrency):
+            executions = 4 * concurrency
+            with futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+                start = time.monotonic()
+                list(executor.map(
+                    lambda _: dut_skill.execute(mock_request, mock_context),
+                    range(executions)))
+                return executions / (time.monotonic() - start)
+
+        single = throughput(1)
+        for concurrency in (2, pool_size):
+            self.assertGreater(throughput(concurrency), 0.75 * concurrency * single)
+        # Beyond the pool size, executions queue for a detector.
+        self.assertLess(throughput(2 * pool_size), 1.5 * pool_size * single)
+
+    def test_detector_pool_size_from_environment(self):
+        with patch.dict(os.environ, {DETECTOR_POOL_SIZE_ENV: "3"}):
+            self.assertEqual(3, ScanBarcodes().detector_pool.size)
+            self.assertEqual(
+                2, ScanBarcodes(detector_pool_size=2).detector_pool.size)
+        with patch.dict(os.environ, {DETECTOR_POOL_SIZE_ENV: "zero"}):
+            with self.assertRaises(ValueError):
+                ScanBarcodes()
+
+    def test_time_budget_abandons_slow_decode(self):
+
+        class StuckDetector:
+
+            def detectAndDecodeWithType(self, img):
+                time.sleep(1.0)
+                return False, (), (), None
+
+        dut_skill = ScanBarcodes(
+            detector_pool_size=1, detector_factory=StuckDetector)
+        mock_request = skill_interface.ExecuteRequest(
+            params=scan_barcodes_pb2.ScanBarcodesParams(time_budget_ms=100))
+        mock_context = self.make_execute_context()
+        black_image = create_autospec(spec=SensorImage, spec_set=True, instance=True)
+        black_image.array = np.zeros((16, 16, 3), dtype=np.uint8)
+        self.mock_camera.capture.return_value = black_image
+
+        start = time.monotonic()
+        result = dut_skill.execute(mock_request, mock_context)
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertTrue(result.incomplete)
+        self.assertEqual(0, len(result.barcodes))
+
+    def test_time_budget_returns_tiles_decoded_so_far(self):
+        corners = np.array(
+            [[[1, 9], [1, 1], [9, 1], [9, 9]]], dtype=np.float32)
+
+        class HalfStuckDetector:
+            """Decodes the left tile at once and gets stuck on the right one."""
+
+            def detectAndDecodeWithType(self, img):
+                if img[0, 0, 0] == 0:
+                    return True, ("left",), ("EAN_8",), corners
+                time.sleep(1.0)
+                return True, ("right",), ("EAN_8",), corners
+
+        dut_skill = ScanBarcodes(
+            detector_pool_size=2, detector_factory=HalfStuckDetector)
+        params = scan_barcodes_pb2.ScanBarcodesParams(
+            tiling=scan_barcodes_pb2.TilingOptions(rows=1, cols=2, num_threads=2),
+            time_budget_ms=200)
+        mock_request = skill_interface.ExecuteRequest(params=params)
+        mock_context = self.make_execute_context()
+        frame = np.zeros((20, 40, 3), dtype=np.uint8)
+        frame[:, 20:] = 255
+        test_image = create_autospec(spec=SensorImage, spec_set=True, instance=True)
+        test_image.array = frame
+        self.mock_camera.capture.return_value = test_image
+
+        start = time.monotonic()
+        result = dut_skill.execute(mock_request, mock_context)
+        self.assertLess(time.monotonic() - start, 0.6)
+        self.assertTrue(result.incomplete)
+        self.assertEqual(["left"], [barcode.data for barcode in result.barcodes])
+
+    def test_cancelled_before_decoding(self):
+        dut_skill = ScanBarcodes()
+        mock_request = skill_interface.ExecuteRequest(
+            params=scan_barcodes_pb2.ScanBarcodesParams())
+        mock_context = self.make_execute_context()
+        mock_context.canceller.cancelled = True
+        test_image = create_autospec(spec=SensorImage, spec_set=True, instance=True)
+        test_image.array = self.load_test_image("EAN-8_0123456.png")
+        self.mock_camera.capture.return_value = test_image
+
+        with patch.object(dut_skill, 'detect', autospec=True) as mock_detect:
+            with self.assertRaises(skill_interface.SkillCancelledError):
+                dut_skill.execute(mock_request, mock_context)
+            mock_detect.assert_not_called()
+
+    def test_continuous_stops_after_max_frames(self):
+        dut_skill = ScanBarcodes()
+        params = scan_barcodes_pb2.ScanBarcodesParams(
+            continuous=scan_barcodes_pb2.ContinuousScanOptions(max_frames=3))
+        mock_request = skill_interface.ExecuteRequest(params=params)
+
+        mock_context = self.make_execute_context()
+        mock_context.canceller.cancelled = False
+
+        test_image = create_autospec(spec=SensorImage, spec_set=True, instance=True)
+        test_image.array = self.load_test_image("EAN-8_0123456.png")
+        self.mock_camera.capture.return_value = test_image
+
+        result = dut_skill.execute(mock_request, mock_context)
+        self.assertEqual(3, result.frames_scanned)
+        # The same barcode in every frame is only reported once.
+        self.assertEqual(1, len(result.barcodes))
+        self.assertEqual("01234565", result.barcodes[0].data)
+        mock_context.canceller.ready.assert_called_once()
+
+    def test_continuous_stops_when_cancelled(self):
+        dut_skill = ScanBarcodes()
+        params = scan_barcodes_pb2.ScanBarcodesParams(
+            continuous=scan_barcodes_pb2.ContinuousScanOptions())
+        mock_request = skill_interface.ExecuteRequest(params=params)
+
+        mock_context = self.make_execute_context()
+        mock_context.canceller.cancelled = True
+
+        test_image = create_autospec(spec=SensorImage, spec_set=True, instance=True)
+        test_image.array = self.load_test_image("EAN-8_0123456.png")
+        self.mock_camera.capture.return_value = test_image
+
+        result = dut_skill.execute(mock_request, mock_context)
+        self.assertEqual(0, result.frames_scanned)
+        self.assertEqual(0, len(result.barcodes))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,178 @@
+"""Generates synthetic EAN/UPC barcode images for tests and benchmarks."""
+
+import dataclasses
+from typing import List, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+# Supported symbologies, named as cv2 reports them.
+EAN_8 = "EAN_8"
+EAN_13 = "EAN_13"
+UPC_A = "UPC_A"
+UPC_E = "UPC_E"
+SYMBOLOGIES: Tuple[str, ...] = (EAN_8, EAN_13, UPC_A, UPC_E)
+
+# Number of data digits, without the check digit.
+_DATA_DIGITS = {EAN_8: 7, EAN_13: 12, UPC_A: 11, UPC_E: 6}
+
+# Left-hand odd parity (L) patterns. Right-hand (R) patterns are their
+# complement and even parity (G) patterns are R reversed.
+_L_CODES = (
+    "0001101", "0011001", "0010011", "0111101", "0100011",
+    "0110001", "0101111", "0111011", "0110111", "0001011",
+)
+_R_CODES = tuple(code.translate(str.maketrans("01", "10")) for code in _L_CODES)
+_G_CODES = tuple(code[::-1] for code in _R_CODES)
+
+# Parity of the left-hand digits of EAN-13, selected by the first digit.
+_EAN_13_PARITY = (
+    "LLLLLL", "LLGLGG", "LLGGLG", "LLGGGL", "LGLLGG",
+    "LGGLLG", "LGGGLL", "LGLGLG", "LGLGGL", "LGGLGL",
+)
+# Parity of the UPC-E digits for number system 0, selected by the check
+# digit. Number system 1 uses the inverse.
+_UPC_E_PARITY = (
+    "GGGLLL", "GGLGLL", "GGLLGL", "GGLLLG", "GLGGLL",
+    "GLLGGL", "GLLLGG", "GLGLGL", "GLGLLG", "GLLGLG",
+)
+
+# Width of the quiet zone on each side, in modules.
+_QUIET_ZONE_MODULES = 10
+
+
+def check_digit(digits: str) -> str:
+    """Returns the EAN/UPC check digit for `digits`."""
+    total = 0
+    for i, digit in enumerate(reversed(digits)):
+        total += int(digit) * (3 if i % 2 == 0 else 1)
+    return str((10 - total % 10) % 10)
+
+
+def _expand_upc_e(digits: str) -> str:
+    """Expands a 6-digit UPC-E body to the 10 digits of the UPC-A it encodes."""
+    last = digits[5]
+    if last in "012":
+        return digits[0:2] + last + "0000" + digits[2:5]
+    if last == "3":
+        return digits[0:3] + "00000" + digits[3:5]
+    if last == "4":
+        return digits[0:4] + "00000" + digits[4]
+    return digits[0:5] + "0000" + last
+
+
+def _encode_digits(digits: str, parity: str) -> str:
+    codes = {"L": _L_CODES, "G": _G_CODES, "R": _R_CODES}
+    return "".join(codes[p][int(d)] for d, p in zip(digits, parity))
+
+
+def encode(symbology: str, data: str) -> Tuple[str, str]:
+    """Encodes `data` as a module string of '1' (bar) and '0' (space).
+
+    `data` holds the data digits without the check digit; for UPC-E these are
+    the six digits of number system 0. Returns (modules, decoded text), where
+    the decoded text is what a reader reports, check digit included.
+    """
+    if len(data) != _DATA_DIGITS[symbology] or not data.isdigit():
+        raise ValueError(f"{symbology} needs {_DATA_DIGITS[symbology]} digits, got {data!r}")
+
+    if symbology == UPC_E:
+        check = check_digit("0" + _expand_upc_e(data))
+        parity = _UPC_E_PARITY[int(check)]
+        return "101" + _encode_digits(data, parity) + "010101", "0" + data + check
+
+    full = data + check_digit(data)
+    if symbology == EAN_8:
+        left, right, parity = full[:4], full[4:], "LLLL"
+    elif symbology == EAN_13:
+        left, right, parity = full[1:7], full[7:], _EAN_13_PARITY[int(full[0])]
+    else:
+        left, right, parity = full[:6], full[6:], "LLLLLL"
+    modules = (
+        "101"
+        + _encode_digits(left, parity)
+        + "01010"
+        + _encode_digits(right, "R" * len(right))
+        + "101"
+    )
+    return modules, full
+
+
+def render(modules: str, module_px: int = 3, height_px: int = 120) -> np.ndarray:
+    """Renders a module string as a grayscale image with quiet zones."""
+    quiet = "0" * _QUIET_ZONE_MODULES
+    row = np.array([0 if m == "1" else 255 for m in quiet + modules + quiet], np.uint8)
+    row = np.repeat(row, module_px)
+    margin = module_px * _QUIET_ZONE_MODULES // 2
+    img = np.full((height_px + 2 * margin, row.size), 255, dtype=np.uint8)
+    img[margin:margin + height_px] = row
+    return img
+
+
+@dataclasses.dataclass(frozen=True)
+class SceneSpec:
+    """Describes a synthetic scene."""
+
+    height: int = 1216
+    width: int = 1936
+    count: int = 1
+    # Barcodes are rotated by a random angle in [-max_rotation_deg, max_rotation_deg].
+    max_rotation_deg: float = 0.0
+    # Standard deviation of additive Gaussian noise, in gray levels.
+    noise_sigma: float = 0.0
+    symbologies: Sequence[str] = SYMBOLOGIES
+    module_px: int = 3
+    seed: int = 0
+
+    @property
+    def name(self) -> str:
+        return (
+            f"{self.width}x{self.height}_n{self.count}"
+            f"_rot{self.max_rotation_deg:g}_noise{self.noise_sigma:g}"
+        )
+
+
+def make_scene(spec: SceneSpec) -> Tuple[np.ndarray, List[Tuple[str, str]]]:
+    """Renders `spec` as a BGR image.
+
+    Barcodes are placed one per cell of a near-square grid. Returns the image
+    and the (type, decoded text) of every barcode in it.
+    """
+    rng = np.random.default_rng(spec.seed)
+    canvas = np.full((spec.height, spec.width), 255, dtype=np.uint8)
+    cols = int(np.ceil(np.sqrt(spec.count)))
+    rows = int(np.ceil(spec.count / cols)) if spec.count else 0
+    cell_h = spec.height // max(rows, 1)
+    cell_w = spec.width // max(cols, 1)
+
+    expected: List[Tuple[str, str]] = []
+    for i in range(spec.count):
+        symbology = spec.symbologies[i % len(spec.symbologies)]
+        data = "".join(str(d) for d in rng.integers(0, 10, _DATA_DIGITS[symbology]))
+        modules, text = encode(symbology, data)
+        barcode = render(modules, spec.module_px, height_px=40 * spec.module_px)
+
+        angle = rng.uniform(-spec.max_rotation_deg, spec.max_rotation_deg)
+        h, w = barcode.shape
+        cos, sin = abs(np.cos(np.radians(angle))), abs(np.sin(np.radians(angle)))
+        patch_w = int(np.ceil(w * cos + h * sin))
+        patch_h = int(np.ceil(w * sin + h * cos))
+        rotation = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+        rotation[:, 2] += ((patch_w - w) / 2, (patch_h - h) / 2)
+        patch = cv2.warpAffine(
+            barcode, rotation, (patch_w, patch_h), flags=cv2.INTER_LINEAR,
+            borderValue=255,
+        )
+
+        if patch_h > cell_h or patch_w > cell_w:
+            raise ValueError(f"Scene {spec.name} is too small for {spec.count} barcodes")
+        row, col = divmod(i, cols)
+        y = row * cell_h + (cell_h - patch_h) // 2
+        x = col * cell_w + (cell_w - patch_w) // 2
+        canvas[y:y + patch_h, x:x + patch_w] = patch
+        expected.append((symbology, text))
+
+    if spec.noise_sigma > 0:
+        noise = rng.normal(0.0, spec.noise_sigma, canvas.shape)
+        canvas = np.clip(canvas + noise, 0, 255).astype(np.uint8)
+    return cv2.cvtColor(canvas, cv2.COLOR_GRAY2BGR), expected
@@ -2,14 +2,14 @@
 
 from absl import logging
 
+from intrinsic.skills.proto import footprint_pb2
 from intrinsic.skills.python import proto_utils
 from intrinsic.skills.python import skill_interface
 from intrinsic.util.decorators import overrides
 
 from skills.start_stopwatch import start_stopwatch_pb2
-import grpc
-from intrinsic.util.grpc import connection
-from intrinsic.util.grpc import interceptor
+from skills.common import channel_cache
+from skills.common import rpc_metrics
 from services.stopwatch import stopwatch_service_pb2 as stopwatch_proto
 from services.stopwatch import stopwatch_service_pb2_grpc as stopwatch_grpc
 
@@ -19,35 +19,67 @@ def make_grpc_stub(resource_handle):
     logging.info(f"Server Instance: {resource_handle.connection_info.grpc.server_instance}")
     logging.info(f"Header: {resource_handle.connection_info.grpc.header}")
 
-    # Create a gRPC channel without using TLS
-    grpc_info = resource_handle.connection_info.grpc
-    grpc_channel = grpc.insecure_channel(grpc_info.address)
-    connection_params = connection.ConnectionParams(
-        grpc_info.address, grpc_info.server_instance, grpc_info.header
+    # Channels are shared across executions, see channel_cache.
+    return stopwatch_grpc.StopwatchServiceStub(
+        channel_cache.channel(resource_handle)
     )
 
-    intercepted_channel = grpc.intercept_channel(
-        grpc_channel,
-        interceptor.HeaderAdderInterceptor(connection_params.headers),
-    )
-    return stopwatch_grpc.StopwatchServiceStub(
-        intercepted_channel
+
+def warm_up_connection(resource_handle):
+    """Connects to the stopwatch service ahead of the first execution.
+
+    A GetStats call for the unnamed stopwatch serves as the no-op request.
+    """
+    channel_cache.warm_up(
+        resource_handle,
+        probe=lambda channel: stopwatch_grpc.StopwatchServiceStub(channel).GetStats(
+            stopwatch_proto.GetStatsRequest(),
+            timeout=channel_cache.DEFAULT_WARM_UP_SECONDS,
+        ),
     )
 
 
 class StartStopwatch(skill_interface.Skill):
     """Implementation of the start_stopwatch skill."""
 
+    def __init__(self, warm_up: bool = True) -> None:
+        # Connect in get_footprint, which runs before execute, so that the
+        # measured execution does not pay for the connection setup.
+        self._warm_up = warm_up
+        rpc_metrics.dump_at_exit()
+
+    @overrides(skill_interface.Skill)
+    def get_footprint(
+        self,
+        request: skill_interface.GetFootprintRequest[start_stopwatch_pb2.StartStopwatchParams],
+        context: skill_interface.GetFootprintContext,
+    ) -> footprint_pb2.Footprint:
+        if self._warm_up:
+            warm_up_connection(context.resource_handles["stopwatch_service"])
+        return super().get_footprint(request, context)
+
     @overrides(skill_interface.Skill)
     def execute(
         self,
         request: skill_interface.ExecuteRequest[start_stopwatch_pb2.StartStopwatchParams],
         context: skill_interface.ExecuteContext
     ) -> None:
-        stub = make_grpc_stub(context.resource_handles["stopwatch_service"])
+        with rpc_metrics.span("start_stopwatch"):
+            stub = make_grpc_stub(context.resource_handles["stopwatch_service"])
+
+            if request.params.names:
+                response = stub.StartMany(
+                    stopwatch_proto.StartManyRequest(names=request.params.names)
+                )
+                for name, result in zip(request.params.names, response.results):
+                    if result.success:
+                        logging.info(f"Successfully started stopwatch {name!r}")
+                    else:
+                        logging.error(f"Failed to start stopwatch {name!r}: {result.error}")
+                return
 
-        response = stub.Start(stopwatch_proto.StartRequest())
-        if response.success:
-            logging.info("Successfully started the stopwatch")
-        else:
-            logging.error(f"Failed to start the stopwatch: {response.error}")
+            response = stub.Start(stopwatch_proto.StartRequest(name=request.params.name))
+            if response.success:
+                logging.info("Successfully started the stopwatch")
+            else:
+                logging.error(f"Failed to start the stopwatch: {response.error}")
@@ -2,11 +2,14 @@
 
 #include <memory>
 #include <string>
+#include <vector>
 
 #include "absl/container/flat_hash_map.h"
 #include "absl/log/log.h"
 #include "absl/status/status.h"
 #include "absl/status/statusor.h"
+#include "absl/strings/str_cat.h"
+#include "absl/strings/str_join.h"
 #include "skills/stop_stopwatch/stop_stopwatch.pb.h"
 #include "google/protobuf/message.h"
 #include "intrinsic/skills/cc/skill_utils.h"
@@ -44,6 +47,37 @@ std::unique_ptr<::grpc::ClientContext> MakeClientContext(intrinsic_proto::resour
   return ctx;
 }
 
+absl::StatusOr<std::unique_ptr<google::protobuf::Message>> StopMany(
+    ::stopwatch::StopwatchService::Stub& stub, ::grpc::ClientContext* ctx,
+    const StopStopwatchParams& params) {
+  ::stopwatch::StopManyRequest stop_request;
+  *stop_request.mutable_names() = params.names();
+  ::stopwatch::StopManyResponse stop_response;
+  INTR_RETURN_IF_ERROR_GRPC(stub.StopMany(ctx, stop_request, &stop_response));
+
+  auto return_value = std::make_unique<com::example::StopStopwatchResult>();
+  std::vector<std::string> errors;
+  for (int i = 0; i < stop_response.results_size(); ++i) {
+    const ::stopwatch::StopResponse& result = stop_response.results(i);
+    if (!result.success()) {
+      errors.push_back(absl::StrCat("'", params.names(i), "': ", result.error()));
+      continue;
+    }
+    LOG(INFO) << "Time elapsed for " << params.names(i) << ": "
+              << result.time_elapsed();
+    com::example::StoppedStopwatch* stopped = return_value->add_stopwatches();
+    stopped->set_name(params.names(i));
+    stopped->set_time_elapsed(result.time_elapsed());
+    stopped->mutable_lap_times()->Add(result.lap_times().begin(),
+                                      result.lap_times().end());
+  }
+  if (!errors.empty()) {
+    return absl::FailedPreconditionError(absl::StrCat(
+        "Failed to stop stopwatches ", absl::StrJoin(errors, ", ")));
+  }
+  return return_value;
+}
+
 std::unique_ptr<SkillInterface> StopStopwatch::CreateSkill() {
   return std::make_unique<StopStopwatch>();
 }
@@ -63,12 +97,17 @@ absl::StatusOr<std::unique_ptr<::google::protobuf::Message>> StopStopwatch::Prev
 absl::StatusOr<std::unique_ptr<google::protobuf::Message>> StopStopwatch::Execute(
     const ExecuteRequest& request, ExecuteContext& context) {
 
+  INTR_ASSIGN_OR_RETURN(auto params, request.params<StopStopwatchParams>());
   INTR_ASSIGN_OR_RETURN(intrinsic_proto::resources::ResourceHandle handle,
                         context.equipment().GetHandle("stopwatch_service"));
 
   auto stub = MakeGrpcStub(handle);
   auto ctx = MakeClientContext(handle);
+  if (!params.names().empty()) {
+    return StopMany(*stub, ctx.get(), params);
+  }
   ::stopwatch::StopRequest stop_request;
+  stop_request.set_name(params.name());
   ::stopwatch::StopResponse stop_response;
   INTR_RETURN_IF_ERROR_GRPC(stub->Stop(ctx.get(), stop_request, &stop_response));
 
@@ -76,6 +115,8 @@ absl::StatusOr<std::unique_ptr<google::protobuf::Message>> StopStopwatch::Execut
 
   auto return_value = std::make_unique<com::example::StopStopwatchResult>();
   return_value->set_time_elapsed(stop_response.time_elapsed());
+  return_value->mutable_lap_times()->Add(stop_response.lap_times().begin(),
+                                         stop_response.lap_times().end());
   return return_value;
 }
 
@@ -10,12 +10,29 @@ from services.stopwatch import stopwatch_service_pb2_grpc as stopwatch_grpc
 
 class FakeStopwatchServicer(stopwatch_grpc.StopwatchServiceServicer):
 
+  def __init__(self):
+    self.stopped_names = []
+    self.get_stats_calls = 0
+
+  def GetStats(self, request, context):
+    self.get_stats_calls += 1
+    return stopwatch_proto.GetStatsResponse()
+
   def Stop(self, request, context):
+    self.stopped_names.append(request.name)
     response = stopwatch_proto.StopResponse()
     response.time_elapsed = 42
+    response.lap_times.extend([20, 22])
     response.success = True
     return response
 
+  def StopMany(self, request, context):
+    response = stopwatch_proto.StopManyResponse()
+    for i, name in enumerate(request.names):
+      self.stopped_names.append(name)
+      response.results.add(success=True, time_elapsed=i + 1)
+    return response
+
 
 class StopStopwatchTest(unittest.TestCase):
 
@@ -35,6 +52,23 @@ class StopStopwatchTest(unittest.TestCase):
         result = skill.get_footprint(request, context)
         self.assertTrue(result.lock_the_universe)
 
+    def test_get_footprint_warms_up_connection(self):
+        skill = StopStopwatch()
+        server, handle = stu.make_grpc_server_with_resource_handle("stopwatch_service")
+        servicer = FakeStopwatchServicer()
+        stopwatch_grpc.add_StopwatchServiceServicer_to_server(servicer, server)
+        server.start()
+
+        context = stu.make_test_get_footprint_context(
+            resource_handles={handle.name: handle},
+        )
+        request = stu.make_test_get_footprint_request(StopStopwatchParams())
+
+        skill.get_footprint(request, context)
+        skill.get_footprint(request, context)
+
+        self.assertEqual(servicer.get_stats_calls, 1)
+
     def test_preview(self):
         skill = StopStopwatch()
         server, handle = stu.make_grpc_server_with_resource_handle("stopwatch_service")
@@ -69,6 +103,47 @@ class StopStopwatchTest(unittest.TestCase):
 
         self.assertEqual(result.time_elapsed, 42)
 
+    def test_execute_named_stopwatch(self):
+        skill = StopStopwatch()
+        server, handle = stu.make_grpc_server_with_resource_handle("stopwatch_service")
+        servicer = FakeStopwatchServicer()
+        stopwatch_grpc.add_StopwatchServiceServicer_to_server(servicer, server)
+        server.start()
+
+        params = StopStopwatchParams(name="station_1")
+
+        context = stu.make_test_execute_context(
+            resource_handles={handle.name: handle},
+        )
+        request = stu.make_test_execute_request(params)
+
+        result = skill.execute(request, context)
+
+        self.assertEqual(servicer.stopped_names, ["station_1"])
+        self.assertEqual(list(result.lap_times), [20, 22])
+
+    def test_execute_many(self):
+        skill = StopStopwatch()
+        server, handle = stu.make_grpc_server_with_resource_handle("stopwatch_service")
+        servicer = FakeStopwatchServicer()
+        stopwatch_grpc.add_StopwatchServiceServicer_to_server(servicer, server)
+        server.start()
+
+        params = StopStopwatchParams(names=["left", "right"])
+
+        context = stu.make_test_execute_context(
+            resource_handles={handle.name: handle},
+        )
+        request = stu.make_test_execute_request(params)
+
+        result = skill.execute(request, context)
+
+        self.assertEqual(servicer.stopped_names, ["left", "right"])
+        self.assertEqual(
+            [(s.name, s.time_elapsed) for s in result.stopwatches],
+            [("left", 1), ("right", 2)],
+        )
+
 
 if __name__ == '__main__':
     unittest.main()
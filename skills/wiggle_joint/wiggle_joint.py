@@ -1,4 +1,5 @@
 from absl import logging
+import grpc
 
 from intrinsic.icon.actions import point_to_point_move_pb2
 from intrinsic.icon.equipment import equipment_utils
@@ -10,6 +11,7 @@ from intrinsic.skills.python import proto_utils
 from intrinsic.skills.python import skill_interface
 from intrinsic.util.decorators import overrides
 
+from skills.common import channel_cache
 from skills.wiggle_joint import wiggle_joint_pb2
 
 ROBOT_EQUIPMENT_SLOT: str = "robot"
@@ -35,10 +37,16 @@ class WiggleJoint(skill_interface.Skill):
             context.resource_handles[ROBOT_EQUIPMENT_SLOT]
         )
 
-        icon_client = equipment_utils.init_icon_client(icon_equipment)
+        icon_client = channel_cache.client(
+            icon_equipment, equipment_utils.init_icon_client
+        )
 
         part_name = equipment_utils.get_position_part_name(icon_equipment)
-        part_status = get_single_part_status(icon_client.get_status(), part_name)
+        try:
+            part_status = get_single_part_status(icon_client.get_status(), part_name)
+        except grpc.RpcError:
+            channel_cache.invalidate(icon_equipment)
+            raise
 
         if part_status is None:
             raise ValueError(f"Could not get status for {part_name}")
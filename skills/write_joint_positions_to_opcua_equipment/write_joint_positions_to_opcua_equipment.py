@@ -27,6 +27,8 @@ from intrinsic.util.decorators import overrides
 from intrinsic.hardware.opcua_equipment import opcua_equipment_service_pb2
 from intrinsic.hardware.opcua_equipment import opcua_equipment_service_pb2_grpc
 from intrinsic.hardware.gpio.signal_pb2 import SignalValue
+from skills.common import channel_cache
+from skills.common import rpc_metrics
 from skills.write_joint_positions_to_opcua_equipment import (
     write_joint_positions_to_opcua_equipment_pb2,
 )
@@ -42,6 +44,9 @@ GetStatusRequest = opcua_equipment_service_pb2.GetStatusRequest
 class WriteJointPositionsToOpcuaEquipment(skill_interface.Skill):
     """Implementation of the write_joint_positions_to_opcua_equipment skill."""
 
+    def __init__(self) -> None:
+        rpc_metrics.dump_at_exit()
+
     @overrides(skill_interface.Skill)
     def execute(
         self,
@@ -50,38 +55,34 @@ class WriteJointPositionsToOpcuaEquipment(skill_interface.Skill):
         ],
         context: skill_interface.ExecuteContext,
     ) -> None:
-        resource_handle = context.resource_handles[_EQUIPMENT_SLOT]
-
-        # Get the current sensed robot joint positions from ICON.
-        icon_equipment = context.resource_handles[_ROBOT_SLOT]
-        icon_client = equipment_utils.init_icon_client(icon_equipment)
-
-        part_name = equipment_utils.get_position_part_name(icon_equipment)
-        part_status = icon_client.get_status().part_status[part_name]
-
-        current_joint_positions = [
-            joint_state.position_sensed for joint_state in part_status.joint_states
-        ]
-
-        logging.info(f"Current joint positions: {current_joint_positions}")
-
-        logging.info(
-            "Connecting to equipment at %s:%s",
-            resource_handle.connection_info.grpc.address,
-            resource_handle.connection_info.grpc.server_instance,
-        )
-        with grpc.insecure_channel(
-            resource_handle.connection_info.grpc.address
-        ) as channel:
-            stub = OpcuaEquipmentServiceStub(channel)
-            connection_params = {
-                "metadata": [
-                    (
-                        "x-resource-instance-name",
-                        resource_handle.connection_info.grpc.server_instance,
-                    )
-                ]
-            }
+        with rpc_metrics.span("write_joint_positions_to_opcua_equipment"):
+            resource_handle = context.resource_handles[_EQUIPMENT_SLOT]
+
+            # Get the current sensed robot joint positions from ICON.
+            icon_equipment = context.resource_handles[_ROBOT_SLOT]
+            icon_client = channel_cache.client(
+                icon_equipment, equipment_utils.init_icon_client
+            )
+
+            part_name = equipment_utils.get_position_part_name(icon_equipment)
+            try:
+                part_status = icon_client.get_status().part_status[part_name]
+            except grpc.RpcError:
+                channel_cache.invalidate(icon_equipment)
+                raise
+
+            current_joint_positions = [
+                joint_state.position_sensed for joint_state in part_status.joint_states
+            ]
+
+            logging.info(f"Current joint positions: {current_joint_positions}")
+
+            logging.info(
+                "Connecting to equipment at %s:%s",
+                resource_handle.connection_info.grpc.address,
+                resource_handle.connection_info.grpc.server_instance,
+            )
+            stub = OpcuaEquipmentServiceStub(channel_cache.channel(resource_handle))
 
             # Store the sensed joint positions in a dict and send a "Write" control request
             # to the opcua_equipment.
@@ -95,10 +96,9 @@ class WriteJointPositionsToOpcuaEquipment(skill_interface.Skill):
                 ControlRequest(
                     command="Write",
                     user_input=joint_position_map,
-                ),
-                **connection_params,
+                )
             )
             logging.info("Status: \n%s", res.success)
 
-        if not res.success:
-            raise RuntimeError("Failed to write joint positions.")
+            if not res.success:
+                raise RuntimeError("Failed to write joint positions.")